@@ -1,10 +1,18 @@
+import asyncio
 
-from langchain_core.exceptions import OutputParserException
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
 
 from classes.AdaptiveDecision import AdaptiveDecision
 from utils.logger import logger
-from utils.Models import _get_deepseek, _get_llm
+from utils.Models import Priority, _get_llm
+from utils.response_cache import get_response_cache, prompt_fingerprint
+from utils.structured_output import (
+    StructuredOutput,
+    StructuredOutputError,
+    ainvoke_structured,
+    invoke_structured,
+)
 
 ADAPTIVE_RAG_DECISION_PROMPT = """
 
@@ -25,57 +33,82 @@ Answer format:
 3. If "require_extra_re" is False, response 'NA' for 'knowledge_base'.
 """
 
+DECISION_PROMPT_HASH = prompt_fingerprint(ADAPTIVE_RAG_DECISION_PROMPT, AdaptiveDecision)
 
-def adaptive_rag_decision(
-    query: str,
-    model: str = "qwen3:4b",
-    temperature: float = 0.3,
-    latest_conversation_pair: str = "",
-) -> AdaptiveDecision:
-    """Decide whether extra retrieval step is necessary for a given query.
+# Decision when the router fails, retrieving from the research knowledge base is the safe default for a health question
+FALLBACK_DECISION = AdaptiveDecision(require_extra_re=True, knowledge_base="research")
 
-    Args:
-        query (str): The user's input query
-        model (str, optional): The model name to use. Defaults to "qwen2.5-coder:7b"
-        temperature (float, optional): The sampling temperature. Defaults to 0.1
-        latest_conversation_pair (str, optional): The latest conversation pair between user and assistant. Defaults to ""
 
-    Returns:
-        AdaptiveDecision: A structured decision object containing require_extra_re and knowledge_base
+def _cached_decision(model: str, temperature: float, inputs: dict) -> AdaptiveDecision | None:
+    """Look up a decision for the same inputs in the response cache."""
+    cache = get_response_cache()
+    cached = cache.get("adaptive_decision", model, temperature, DECISION_PROMPT_HASH, inputs) if cache else None
+    if cached is None:
+        return None
+    logger.info(f"Adaptive decision | response cache hit | {inputs['question']}")
+    return AdaptiveDecision.model_validate(cached)
 
-    Raises:
-        ValueError: If query is empty or temperature is invalid
-        OutputParserException: If output parsing fails
 
-    """
-    logger.info(f"Adaptive decision | {query} | {latest_conversation_pair}")
+def _cache_decision(model: str, temperature: float, inputs: dict, output: StructuredOutput) -> None:
+    """Store a decision of the requested model, fallback and hedge answers are not stored under its key."""
+    cache = get_response_cache()
+    if cache is not None and output.model == model:
+        cache.put("adaptive_decision", model, temperature, DECISION_PROMPT_HASH, inputs, output.value)
 
+
+def _build_decision_chain(model: str, temperature: float) -> Runnable:
+    """Build the structured adaptive decision chain."""
     prompt = PromptTemplate(
         template=ADAPTIVE_RAG_DECISION_PROMPT,
         input_variables=["question", "latest_conversation_pair"],
     )
 
-
     # NOTE: Temparary use deepseek-chat due to ollama server issue.
     llm = _get_llm(model, temperature)
     # llm = _get_deepseek(model="deepseek-chat", temperature=temperature)
 
-    structured_llm = prompt | llm.with_structured_output(schema=AdaptiveDecision, method="function_calling", include_raw=False)
+    return prompt | llm.with_structured_output(schema=AdaptiveDecision, method="function_calling", include_raw=False)
 
-    res = structured_llm.invoke({"question": query, "latest_conversation_pair": latest_conversation_pair})
 
-    # Retry
-    while not isinstance(res, AdaptiveDecision):
-        logger.warning(f"Adaptive decision | {query} | Invalid response type: {type(res)} | Retrying with strict mode")
+def adaptive_rag_decision(
+    query: str,
+    model: str = "qwen3:4b",
+    temperature: float = 0.3,
+    latest_conversation_pair: str = "",
+) -> AdaptiveDecision:
+    """Decide whether extra retrieval step is necessary for a given query.
 
-        # Retry with strict mode if the response is not of type AdaptiveDecision
-        # This is to ensure that we get a valid structured output
-        res = structured_llm.invoke({"question": query, "latest_conversation_pair": latest_conversation_pair})
+    Args:
+        query (str): The user's input query
+        model (str, optional): The model name to use. Defaults to "qwen2.5-coder:7b"
+        temperature (float, optional): The sampling temperature. Defaults to 0.1
+        latest_conversation_pair (str, optional): The latest conversation pair between user and assistant. Defaults to ""
 
-        if isinstance(res, AdaptiveDecision):
-            return res
+    Returns:
+        AdaptiveDecision: A structured decision object containing require_extra_re and knowledge_base,
+        `FALLBACK_DECISION` when no attempt within the retry budget produced a valid decision
+
+    """
+    logger.info(f"Adaptive decision | {query} | {latest_conversation_pair}")
 
-    return res
+    inputs = {"question": query, "latest_conversation_pair": latest_conversation_pair}
+    if (cached := _cached_decision(model, temperature, inputs)) is not None:
+        return cached
+
+    try:
+        output = invoke_structured(
+            "adaptive_decision",
+            lambda attempt_model: _build_decision_chain(attempt_model, temperature),
+            inputs,
+            model,
+            is_valid=lambda r: isinstance(r, AdaptiveDecision),
+        )
+    except StructuredOutputError as e:
+        logger.error(f"Error in adaptive decision, for user query: {query}, retrieving from research | {e!s}")
+        return FALLBACK_DECISION.model_copy()
+
+    _cache_decision(model, temperature, inputs, output)
+    return output.value
 
     # try:
     #     res = structured_llm.invoke({"question": query, "latest_conversation_pair": latest_conversation_pair})
@@ -89,6 +122,50 @@ def adaptive_rag_decision(
     # else:
     #     return res
 
+
+async def aadaptive_rag_decision(
+    query: str,
+    model: str = "qwen3:4b",
+    temperature: float = 0.3,
+    latest_conversation_pair: str = "",
+) -> AdaptiveDecision:
+    """Asynchronous version of adaptive_rag_decision, awaits the LLM instead of blocking the event loop.
+
+    Args:
+        query (str): The user's input query
+        model (str, optional): The model name to use. Defaults to "qwen3:4b"
+        temperature (float, optional): The sampling temperature. Defaults to 0.3
+        latest_conversation_pair (str, optional): The latest conversation pair between user and assistant. Defaults to ""
+
+    Returns:
+        AdaptiveDecision: A structured decision object containing require_extra_re and knowledge_base,
+        `FALLBACK_DECISION` when no attempt within the retry budget produced a valid decision
+
+    """
+    logger.info(f"Adaptive decision | {query} | {latest_conversation_pair}")
+
+    inputs = {"question": query, "latest_conversation_pair": latest_conversation_pair}
+    # The response cache is SQLite, its reads and writes run in a worker thread
+    if (cached := await asyncio.to_thread(_cached_decision, model, temperature, inputs)) is not None:
+        return cached
+
+    try:
+        output = await ainvoke_structured(
+            "adaptive_decision",
+            lambda attempt_model: _build_decision_chain(attempt_model, temperature),
+            inputs,
+            model,
+            is_valid=lambda r: isinstance(r, AdaptiveDecision),
+            priority=Priority.DECISION,
+        )
+    except StructuredOutputError as e:
+        logger.error(f"Error in adaptive decision, for user query: {query}, retrieving from research | {e!s}")
+        return FALLBACK_DECISION.model_copy()
+
+    await asyncio.to_thread(_cache_decision, model, temperature, inputs, output)
+    return output.value
+
+
 if __name__ == "__main__":
     res = adaptive_rag_decision("how's the whether today ?", model="qwen2.5-coder:7b")
     print(type(res))
@@ -1,43 +1,85 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+
+from langchain_core.output_parsers import StrOutputParser
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
 
 from classes.ChatSession import ChatSessionFactory
 from classes.DocumentAssessment import AnnotatedDocumentEvl
-from classes.Generation import AIGeneration, Generation
+from classes.Generation import AIGeneration, FollowUpQuestions, Generation, Source
 from utils.logger import logger
-from utils.Models import _get_deepseek, _get_llm
-from utils.PROMPT import BASIC_PROMPT, CALM_ADRD_PROMPT
+from utils.metrics import LLM_LATENCY
+from utils.Models import Priority, _get_llm, llm_scheduler
+from utils.PROMPT import BASIC_PROMPT, CALM_ADRD_PROMPT, CALM_ADRD_STREAMING_PROMPT
 
+GENERATION_FAILED_ANSWER = "Sorry, I couldn't generate an answer to your question. Please try again."
 
-def generate_answer(
-    question: str,
-    context_chunks: list[AnnotatedDocumentEvl] | None = None,
-    work_memory: ChatSessionFactory | None = None,
-    temperature: float = 0.3,
-    model: str = "qwen3:30b-a3b",
-    *,
-    isInformal: bool = False,
-) -> Generation:
-    """Generate answer from context documents using LLM.
+FOLLOW_UP_PROMPT = """
+A caregiver of a person living with Alzheimer's disease or a related dementia asked: {question}
 
-    Args:
-        question: User's question
-        context_chunks: List of Langchain Document objects
-        work_memory: User conversation history
-        temperature: Model temperature
-        isInformal: Whether the question is Alezhimer's disease related, yes if it is related and vise versa.
+They received the following answer:
+{answer}
 
-    Returns:
-        Generation: Generated answer
+Suggest up to 3 short questions the caregiver might naturally ask next after reading this answer. Return an empty list if there are no sensible follow up questions.
+"""
+
+# Marks the end of the answer deltas in the queue between the model stream and the consumer
+_STREAM_END = object()
 
+
+class _ReasoningFilter:
+    """Drop `<think>...</think>` blocks from streamed model output, tags may be split across deltas.
+
+    Reasoning models such as qwen3 emit their thinking inline, it must never reach the caregiver.
     """
-    # Validation
-    if context_chunks is None:
-        context_chunks = []
-    if not question:
-        raise ValueError("Question and context required")
 
-    # Craft context in RAG
-    working_memory_content = work_memory.get_formatted_conversation("messages")
+    OPEN_TAG = "<think>"
+    CLOSE_TAG = "</think>"
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._thinking = False
+        self._emitted = False
+
+    def feed(self, delta: str) -> str:
+        """Consume a delta, returns the answer text that is certain to lie outside a reasoning block."""
+        self._buffer += delta
+        text = ""
+        while True:
+            tag = self.CLOSE_TAG if self._thinking else self.OPEN_TAG
+            index = self._buffer.find(tag)
+            if index < 0:
+                break
+            if not self._thinking:
+                text += self._buffer[:index]
+            self._buffer = self._buffer[index + len(tag):]
+            self._thinking = not self._thinking
+
+        # A trailing partial tag is held back until the next delta completes or rules it out
+        held = next((n for n in range(min(len(tag) - 1, len(self._buffer)), 0, -1) if self._buffer.endswith(tag[:n])), 0)
+        if not self._thinking:
+            text += self._buffer[:len(self._buffer) - held]
+        self._buffer = self._buffer[len(self._buffer) - held:]
+        return self._emit(text)
+
+    def flush(self) -> str:
+        """Return the held back text once the stream ended, an unterminated reasoning block is dropped."""
+        text = "" if self._thinking else self._buffer
+        self._buffer = ""
+        return self._emit(text)
+
+    def _emit(self, text: str) -> str:
+        # Whitespace left between a reasoning block and the answer is not part of the answer
+        if not self._emitted:
+            text = text.lstrip()
+            self._emitted = bool(text)
+        return text
+
+
+def _build_context(context_chunks: list[AnnotatedDocumentEvl]) -> tuple[str, list[dict]]:
+    """Craft the RAG context string and the deduplicated source list from graded documents."""
     context_page_content: str = ""
     source_list = []
     seen_urls = set()
@@ -55,30 +97,77 @@ def generate_answer(
             })
             context_page_content += (f"Index: {i + 1}; Title: {title}; Content: {content} \n")
 
-    # Initialize LLM
-    llm = _get_llm(model, temperature)
+    return context_page_content, source_list
+
 
+def _build_generation_chain(model: str, temperature: float, *, isInformal: bool) -> Runnable:
+    """Build the structured answer generation chain."""
     prompt = PromptTemplate(
         input_variables=["context", "question", "work_memory"],
         template=BASIC_PROMPT if isInformal else CALM_ADRD_PROMPT,
     )
 
-    structured_llm = prompt | llm.with_structured_output(
+    return prompt | _get_llm(model, temperature).with_structured_output(
         schema=AIGeneration,
         method="function_calling",
         include_raw=False,
     )
 
 
+def _generation_failed(e: Exception) -> Generation:
+    logger.error(f"Answer generation failed: {e!s}")
+    return Generation(
+        answer=f"{GENERATION_FAILED_ANSWER} Error: {e!s}",
+        follow_up_questions=[],
+        sources=[],
+    )
+
+
+def generate_answer(
+    question: str,
+    context_chunks: list[AnnotatedDocumentEvl] | None = None,
+    work_memory: ChatSessionFactory | None = None,
+    temperature: float = 0.3,
+    model: str = "qwen3:30b-a3b",
+    *,
+    isInformal: bool = False,
+) -> Generation:
+    """Generate answer from context documents using LLM.
+
+    Args:
+        question: User's question
+        context_chunks: List of Langchain Document objects
+        work_memory: User conversation history
+        temperature: Model temperature
+        model: Model used for answer generation
+        isInformal: Whether the question is Alezhimer's disease related, yes if it is related and vise versa.
+
+    Returns:
+        Generation: Generated answer
+
+    """
+    # Validation
+    if context_chunks is None:
+        context_chunks = []
+    if not question:
+        raise ValueError("Question and context required")
+
+    # Craft context in RAG
+    working_memory_content = work_memory.get_formatted_conversation("messages")
+    context_page_content, source_list = _build_context(context_chunks)
+
+    structured_llm = _build_generation_chain(model, temperature, isInformal=isInformal)
+
     # Generate answer
     try:
-        response = structured_llm.invoke(
-            {
-                "context": context_page_content,
-                "question": question,
-                "work_memory": working_memory_content,
-            },
-        )
+        with LLM_LATENCY.time(task="answer_generation", model=model):
+            response = structured_llm.invoke(
+                {
+                    "context": context_page_content,
+                    "question": question,
+                    "work_memory": working_memory_content,
+                },
+            )
 
         assert isinstance(response, AIGeneration), "Response is not a Generation object"
 
@@ -96,11 +185,173 @@ def generate_answer(
         logger.info(f"Appendix documents: \n {context_page_content}")
         logger.info(f"Work memory: {work_memory}")
     except Exception as e:
-        logger.error(f"Answer generation failed: {e!s}")
-        return Generation(
-            answer="Sorry, I couldn't generate an answer to your question. Please try again. Error: {e!s}",
-            follow_up_questions=[],
-            sources=[],
+        return _generation_failed(e)
+    else:
+        return response
+
+
+async def agenerate_answer(
+    question: str,
+    context_chunks: list[AnnotatedDocumentEvl] | None = None,
+    work_memory: ChatSessionFactory | None = None,
+    temperature: float = 0.3,
+    model: str = "qwen3:30b-a3b",
+    *,
+    isInformal: bool = False,
+) -> Generation:
+    """Asynchronous version of generate_answer, does not block the event loop while the LLM is generating.
+
+    Args:
+        question: User's question
+        context_chunks: List of Langchain Document objects
+        work_memory: User conversation history
+        temperature: Model temperature
+        model: Model used for answer generation
+        isInformal: Whether the question is Alezhimer's disease related, yes if it is related and vise versa.
+
+    Returns:
+        Generation: Generated answer
+
+    """
+    if context_chunks is None:
+        context_chunks = []
+    if not question:
+        raise ValueError("Question and context required")
+
+    working_memory_content = work_memory.get_formatted_conversation("messages") if work_memory else ""
+    context_page_content, source_list = _build_context(context_chunks)
+
+    structured_llm = _build_generation_chain(model, temperature, isInformal=isInformal)
+
+    try:
+        async with llm_scheduler.slot(model, Priority.GENERATION):
+            with LLM_LATENCY.time(task="answer_generation", model=model):
+                response = await structured_llm.ainvoke(
+                    {
+                        "context": context_page_content,
+                        "question": question,
+                        "work_memory": working_memory_content,
+                    },
+                )
+
+        assert isinstance(response, AIGeneration), "Response is not a Generation object"
+
+        response = Generation(
+            **response.model_dump(),
+            sources=source_list,
         )
+
+        logger.info(f"Answer generation completed for question: {question}, using model: {model}, temperature: {temperature}")
+        logger.info(f"Appendix documents: \n {context_page_content}")
+    except Exception as e:
+        return _generation_failed(e)
     else:
         return response
+
+
+async def _produce_answer(answer_chain: Runnable, inputs: dict, model: str, queue: asyncio.Queue) -> None:
+    """Stream the answer into `queue` within a generation slot, reasoning blocks are dropped."""
+    reasoning = _ReasoningFilter()
+    async with llm_scheduler.slot(model, Priority.GENERATION):
+        start = time.perf_counter()
+        async for delta in answer_chain.astream(inputs):
+            if text := reasoning.feed(delta):
+                queue.put_nowait(text)
+        LLM_LATENCY.observe(time.perf_counter() - start, task="answer_streaming", model=model)
+    if text := reasoning.flush():
+        queue.put_nowait(text)
+
+
+async def astream_answer(
+    question: str,
+    context_chunks: list[AnnotatedDocumentEvl] | None = None,
+    work_memory: ChatSessionFactory | None = None,
+    temperature: float = 0.3,
+    model: str = "qwen3:30b-a3b",
+    follow_up_model: str | None = None,
+    *,
+    isInformal: bool = False,
+) -> AsyncIterator[str | Generation]:
+    """Stream answer tokens from the LLM, then yield the complete Generation.
+
+    The answer is streamed as plain text so tokens reach the user as soon as the model emits them,
+    follow up questions are produced by a short structured call once the answer is complete. The prompt
+    asks for the answer only and inline reasoning blocks are dropped, so no thinking reaches the user.
+
+    Args:
+        question: User's question
+        context_chunks: List of graded documents used as context
+        work_memory: User conversation history
+        temperature: Model temperature
+        model: Model used for answer generation
+        follow_up_model: Model used for follow up questions, defaults to `model`
+        isInformal: Whether the question is Alezhimer's disease related, yes if it is related and vise versa.
+
+    Yields:
+        str | Generation: Answer text deltas, followed by exactly one Generation as the last item
+
+    Raises:
+        Exception: The error of the model stream when it fails, possibly after some deltas were yielded.
+
+    """
+    if context_chunks is None:
+        context_chunks = []
+    if not question:
+        raise ValueError("Question and context required")
+
+    working_memory_content = work_memory.get_formatted_conversation("messages") if work_memory else ""
+    context_page_content, source_list = _build_context(context_chunks)
+
+    prompt = PromptTemplate(
+        input_variables=["context", "question", "work_memory"],
+        template=BASIC_PROMPT if isInformal else CALM_ADRD_STREAMING_PROMPT,
+    )
+    answer_chain = prompt | _get_llm(model, temperature) | StrOutputParser()
+    inputs = {
+        "context": context_page_content,
+        "question": question,
+        "work_memory": working_memory_content,
+    }
+
+    # The model streams into a queue, so a slow client never holds the generation slot
+    queue: asyncio.Queue = asyncio.Queue()
+    producer = asyncio.create_task(_produce_answer(answer_chain, inputs, model, queue))
+    producer.add_done_callback(lambda _: queue.put_nowait(_STREAM_END))
+
+    answer = ""
+    try:
+        while (delta := await queue.get()) is not _STREAM_END:
+            answer += delta
+            yield delta
+        await producer
+    except Exception as e:
+        logger.error(f"Answer streaming failed: {e!s}")
+        raise
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+
+    follow_up_questions: list[str] = []
+    try:
+        follow_up_prompt = PromptTemplate(input_variables=["question", "answer"], template=FOLLOW_UP_PROMPT)
+        follow_up_chain = follow_up_prompt | _get_llm(follow_up_model or model, temperature).with_structured_output(
+            schema=FollowUpQuestions,
+            method="function_calling",
+            include_raw=False,
+        )
+        async with llm_scheduler.slot(follow_up_model or model, Priority.GENERATION):
+            with LLM_LATENCY.time(task="follow_up", model=follow_up_model or model):
+                res = await follow_up_chain.ainvoke({"question": question, "answer": answer})
+        if isinstance(res, FollowUpQuestions):
+            follow_up_questions = res.follow_up_questions
+    except Exception as e:
+        # Follow up questions are optional, never fail an already streamed answer because of them
+        logger.warning(f"Follow up question generation failed: {e!s}")
+
+    logger.info(f"Answer streaming completed for question: {question}, using model: {model}, temperature: {temperature}")
+
+    yield Generation(
+        answer=answer,
+        follow_up_questions=follow_up_questions,
+        sources=[Source(**source) for source in source_list],
+    )
@@ -1,9 +1,17 @@
-from typing import List
-
-from utils.logger import logger
-from utils.Models import _get_llm
+import asyncio
 
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
+
+from utils.logger import logger
+from utils.Models import Priority, _get_llm
+from utils.response_cache import get_response_cache, prompt_fingerprint
+from utils.structured_output import (
+    StructuredOutput,
+    StructuredOutputError,
+    ainvoke_structured,
+    invoke_structured,
+)
 
 QUERY_EXTAND_PROMPT = """
 Exatnd the query below to get more information about the topic:
@@ -18,24 +26,58 @@ return a string of the extended query only, do not assume other information.
 query_json_schema = {
     "title": "QueryExtander",
     "description": "The extended query string",
-    "properties": { 
+    "properties": {
         "query": {
             "type": "string",
-            "description": "The extended query string"
-        }
+            "description": "The extended query string",
+        },
     },
-    "required": ["query"]
+    "required": ["query"],
 }
-    
+
+EXTANDER_PROMPT_HASH = prompt_fingerprint(QUERY_EXTAND_PROMPT, query_json_schema)
+
+
+def _cached_query(model: str, temperature: float, inputs: dict) -> str | None:
+    """Look up an expansion of the same query and topics in the response cache."""
+    cache = get_response_cache()
+    cached = cache.get("query_expansion", model, temperature, EXTANDER_PROMPT_HASH, inputs) if cache else None
+    if cached is None:
+        return None
+    logger.info(f"Query expansion | response cache hit | {inputs['original_query']}")
+    return cached["query"]
+
+
+def _is_query(res: object) -> bool:
+    return isinstance(res, dict) and isinstance(res.get("query"), str)
+
+
+def _cache_query(model: str, temperature: float, inputs: dict, output: StructuredOutput) -> None:
+    """Store an expansion of the requested model, fallback and hedge answers are not stored under its key."""
+    cache = get_response_cache()
+    if cache is not None and output.model == model:
+        cache.put("query_expansion", model, temperature, EXTANDER_PROMPT_HASH, inputs, {"query": output.value["query"]})
+
+
+def _build_extander_chain(model: str, temperature: float) -> Runnable:
+    """Build the structured query expansion chain."""
+    prompt = PromptTemplate(
+        template=QUERY_EXTAND_PROMPT,
+        input_variables=["original_query", "missing_topics"],
+    )
+
+    llm = _get_llm(model, temperature)
+
+    return prompt | llm.with_structured_output(schema=query_json_schema, method="function_calling", include_raw=False)
+
 
 def query_extander(
     original_query: str,
-    missing_topics: List[str],
+    missing_topics: list[str],
     model: str = "qwen3:4b",
     temperature: float = 0,
 ) -> str:
-    """
-    Extends query by incorporating missing topics for comprehensive search.
+    """Extends query by incorporating missing topics for comprehensive search.
     
     Args:
         original_query (str): User's initial query
@@ -44,25 +86,69 @@ def query_extander(
         temperature (float, optional): Generation temperature. Defaults to 0
         
     Returns:
-        str: The extended query string
+        str: The extended query string, the original query when expansion failed within the retry budget
+
     """
-    
-    prompt = PromptTemplate(
-        template=QUERY_EXTAND_PROMPT,
-        input_variables=["original_query", "missing_topics"]
-    )
+    inputs = {"original_query": original_query, "missing_topics": missing_topics}
+    if (cached := _cached_query(model, temperature, inputs)) is not None:
+        return cached
 
-    llm = _get_llm(model, temperature)
-    
-    structured_llm = prompt | llm.with_structured_output(schema=query_json_schema, method="function_calling", include_raw=False)
+    try:
+        output = invoke_structured(
+            "query_expansion",
+            lambda attempt_model: _build_extander_chain(attempt_model, temperature),
+            inputs,
+            model,
+            is_valid=_is_query,
+        )
+    except StructuredOutputError as e:
+        logger.error(f"Error in query extander, for user query: {original_query}, keeping the original query | {e!s}")
+        return original_query
+    logger.success(f"Query expanded to --> {output.value['query']}")
+
+    _cache_query(model, temperature, inputs, output)
+    return output.value["query"]
+
+
+async def aquery_extander(
+    original_query: str,
+    missing_topics: list[str],
+    model: str = "qwen3:4b",
+    temperature: float = 0,
+) -> str:
+    """Asynchronous version of query_extander, awaits the LLM instead of blocking the event loop.
+
+    Args:
+        original_query (str): User's initial query
+        missing_topics (List[str]): Topics missing from retrieved documents
+        model (str, optional): Model name. Defaults to "qwen3:4b"
+        temperature (float, optional): Generation temperature. Defaults to 0
+
+    Returns:
+        str: The extended query string, the original query when expansion failed within the retry budget
+
+    """
+    inputs = {"original_query": original_query, "missing_topics": missing_topics}
+    # The response cache is SQLite, its reads and writes run in a worker thread
+    if (cached := await asyncio.to_thread(_cached_query, model, temperature, inputs)) is not None:
+        return cached
 
     try:
-        res = structured_llm.invoke({"original_query":original_query, "missing_topics":missing_topics})
-        logger.success(f"Query expanded to --> {res['query']}")
-        return res['query']
-    except Exception:
-        logger.error(f"Error in query extander, for user query: {original_query}, retry with strict mode")
-        return structured_llm.invoke({"original_query":original_query, "missing_topics":missing_topics}, strict=True)['query']
+        output = await ainvoke_structured(
+            "query_expansion",
+            lambda attempt_model: _build_extander_chain(attempt_model, temperature),
+            inputs,
+            model,
+            is_valid=_is_query,
+            priority=Priority.EXPANSION,
+        )
+    except StructuredOutputError as e:
+        logger.error(f"Error in query extander, for user query: {original_query}, keeping the original query | {e!s}")
+        return original_query
+    logger.success(f"Query expanded to --> {output.value['query']}")
+
+    await asyncio.to_thread(_cache_query, model, temperature, inputs, output)
+    return output.value["query"]
 
 if __name__ == "__main__":
     original_query = "What is the capital of France?"
@@ -74,7 +160,7 @@ if __name__ == "__main__":
     # })
     
     res = query_extander(
-        original_query, missing_topics, model="qwen2.5"
+        original_query, missing_topics, model="qwen2.5",
     )
 
     print(res)
@@ -1,12 +1,15 @@
 import asyncio
 
 from langchain_core.documents import Document
-from langchain_core.exceptions import OutputParserException
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import Runnable
 
 from classes.DocumentAssessment import AnnotatedDocumentEvl, DocumentAssessment
 from utils.logger import logger
-from utils.Models import _get_llm
+from utils.Models import Priority, _get_llm
+from utils.response_cache import get_response_cache, prompt_fingerprint
+from utils.structured_output import StructuredOutputError, ainvoke_structured
+from utils.tools import document_id
 
 GRADING_PROMPT = """
 You are an expert document relevance evaluator specializing in healthcare and caregiving content. Your task is to analyze how relevant the given document is to a user's query about Alzheimer's disease and dementia caregiving: ({question}). Provide a detailed assessment with a numeric score between from 1 to 5 as the relevance score, a sentence of why you give this score as the reasoning and 3 words summarization of the document is missing from user's question as the missing topics.
@@ -26,6 +29,20 @@ Scoring Rubric:
 Follow the schema of DocumentAssessment to structure your response.
 """
 
+GRADING_PROMPT_HASH = prompt_fingerprint(GRADING_PROMPT, DocumentAssessment)
+
+
+def _build_grading_chain(model: str, temperature: float) -> Runnable:
+    """Build the structured document grading chain."""
+    prompt = PromptTemplate(
+        template=GRADING_PROMPT,
+        input_variables=["question", "document"],
+    )
+
+    llm = _get_llm(model, temperature)
+
+    return prompt | llm.with_structured_output(schema=DocumentAssessment, method="function_calling", include_raw=False)
+
 
 async def grade_retrieval(
     question: str,
@@ -50,38 +67,24 @@ async def grade_retrieval(
     """
     logger.info("Grading retrieved document relevance")
 
-    prompt = PromptTemplate(
-        template=GRADING_PROMPT,
-        input_variables=["question", "document"],
-    )
-
-    llm = _get_llm(model, temperature)
-
-    structured_llm = prompt | llm.with_structured_output(schema=DocumentAssessment, method="function_calling", include_raw=False)
+    # Keyed on the document text, the same article graded against the same question is graded once
+    inputs = {"question": question, "document": retrieved_doc.page_content}
+    # The response cache is SQLite, its reads and writes run in a worker thread
+    cache = await asyncio.to_thread(get_response_cache)
+    cached = await asyncio.to_thread(cache.get, "retrieval_grading", model, temperature, GRADING_PROMPT_HASH, inputs) if cache else None
+    if cached is not None:
+        return AnnotatedDocumentEvl(document=retrieved_doc, **DocumentAssessment.model_validate(cached).model_dump())
 
     try:
-        document_assessment: DocumentAssessment = await structured_llm.ainvoke(
-            {
-                "question": question,
-                "document": retrieved_doc.page_content,
-            },
-        )
-
-        return AnnotatedDocumentEvl(
-            document=retrieved_doc,
-            **document_assessment.model_dump(),
+        output = await ainvoke_structured(
+            "retrieval_grading",
+            lambda attempt_model: _build_grading_chain(attempt_model, temperature),
+            inputs,
+            model,
+            is_valid=lambda r: isinstance(r, DocumentAssessment),
+            priority=Priority.GRADING,
         )
-
-    except OutputParserException as ope_err:
-        logger.error(f"Output parser exception: {ope_err}")
-        document_assessment = structured_llm.invoke({"question": question, "document": retrieved_doc.page_content}, strict=True)
-
-        return AnnotatedDocumentEvl(
-            document=retrieved_doc,
-            **document_assessment.model_dump(),
-        )
-
-    except Exception as e:
+    except StructuredOutputError as e:
         logger.error(f"Error: {e}, with document: {retrieved_doc.page_content}")
         return AnnotatedDocumentEvl(
             document=retrieved_doc,
@@ -90,7 +93,14 @@ async def grade_retrieval(
             missing_topics=["Error in evaluation"],
         )
 
-
+    document_assessment: DocumentAssessment = output.value
+    # Grades of a fallback or hedge model are not stored under the requested model
+    if cache is not None and output.model == model:
+        await asyncio.to_thread(cache.put, "retrieval_grading", model, temperature, GRADING_PROMPT_HASH, inputs, document_assessment)
+    return AnnotatedDocumentEvl(
+        document=retrieved_doc,
+        **document_assessment.model_dump(),
+    )
 
 
 async def grade_retrieval_batch(
@@ -115,6 +125,103 @@ async def grade_retrieval_batch(
     ])
 
 
+def gate_by_similarity(
+    retrieved_docs: list[Document],
+    scores: dict[str, float],
+    accept_above: float | None = None,
+    reject_below: float | None = None,
+) -> tuple[list[AnnotatedDocumentEvl], list[Document]]:
+    """Decide clear-cut documents by their retrieval similarity score, without an LLM grader.
+
+    Documents scoring at or above `accept_above` are accepted with the top relevance score, documents
+    scoring below `reject_below` are rejected with the lowest one. Documents in between, or without a
+    score, are left for LLM grading.
+
+    Args:
+        retrieved_docs: Retrieved documents
+        scores: Similarity score per document id
+        accept_above: [Optional] Similarity at or above which a document is accepted
+        reject_below: [Optional] Similarity below which a document is rejected
+
+    Returns:
+        tuple: Documents decided by score, and uncertain documents that need LLM grading
+
+    """
+    decided: list[AnnotatedDocumentEvl] = []
+    uncertain: list[Document] = []
+    for doc in retrieved_docs:
+        score = scores.get(document_id(doc))
+        if score is not None and accept_above is not None and score >= accept_above:
+            decided.append(AnnotatedDocumentEvl(
+                document=doc,
+                relevance_score=5,
+                reasoning=f"Accepted without LLM grading, similarity {score:.3f} >= {accept_above}",
+                missing_topics=[],
+            ))
+        elif score is not None and reject_below is not None and score < reject_below:
+            decided.append(AnnotatedDocumentEvl(
+                document=doc,
+                relevance_score=1,
+                reasoning=f"Rejected without LLM grading, similarity {score:.3f} < {reject_below}",
+                missing_topics=[],
+            ))
+        else:
+            uncertain.append(doc)
+
+    if decided:
+        logger.info(f"Similarity gate | {len(decided)} documents decided by score | {len(uncertain)} left for grading")
+
+    return decided, uncertain
+
+
+async def grade_retrieval_until(
+    question: str,
+    retrieved_docs: list[Document],
+    required: int,
+    threshold: int,
+    **kwargs,
+) -> list[AnnotatedDocumentEvl]:
+    """Grade documents as their results complete and stop early once enough are relevant.
+
+    Grading stops as soon as `required` documents reach `threshold`, the remaining grader calls are cancelled.
+
+    Args:
+        question: User's question
+        retrieved_docs: List of documents to grade
+        required: Number of relevant documents needed
+        threshold: Minimum relevance score of a relevant document
+        **kwargs: Additional arguments for grade_retrieval
+
+    Returns:
+        List[AnnotatedDocumentEvl]: Documents graded before stopping, ordered by relevance score
+
+    """
+    if required <= 0:
+        return []
+
+    tasks = [asyncio.create_task(grade_retrieval(question, doc, **kwargs)) for doc in retrieved_docs]
+    graded: list[AnnotatedDocumentEvl] = []
+    relevant = 0
+    try:
+        for next_graded in asyncio.as_completed(tasks):
+            doc = await next_graded
+            graded.append(doc)
+            if doc.relevance_score >= threshold:
+                relevant += 1
+                if relevant >= required:
+                    break
+    finally:
+        cancelled = [task for task in tasks if not task.done()]
+        for task in cancelled:
+            task.cancel()
+        # Cancelled grader calls release their scheduler slots and connections before the node moves on
+        await asyncio.gather(*cancelled, return_exceptions=True)
+        if cancelled:
+            logger.info(f"Early exit grading | {relevant} relevant documents found | cancelled {len(cancelled)} grader calls")
+
+    return sorted(graded, key=lambda x: x.relevance_score, reverse=True)
+
+
 # def grade_retrieval_batch_sync(
 #     question: str,
 #     retrieved_docs: list[Document],
@@ -0,0 +1,267 @@
+import hashlib
+from abc import ABC, abstractmethod
+from collections.abc import Collection
+from typing import Literal
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores.utils import maximal_marginal_relevance
+
+from utils.embedding_cache import CachedQueryEmbeddings
+from utils.tools import diversify_by_source, document_id
+
+RetrievalMode = Literal["vector", "hybrid"]
+Diversity = Literal["none", "mmr", "source"]
+
+
+class BaseVectorStore(ABC):
+    """Interface shared by the vector store backends.
+
+    Backends implement the scored vector and hybrid searches and `add_documents`, the plain searches are derived from them.
+    """
+
+    _collection_name: str
+    _embedding_model: Embeddings
+
+    @property
+    def collection_name(self) -> str:
+        """The name of the collection."""
+        return self._collection_name
+
+    @abstractmethod
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Search for similar documents along with their cosine similarity to the query, most similar first."""
+
+    @abstractmethod
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Asynchronously search for similar documents along with their cosine similarity to the query, most similar first."""
+
+    @abstractmethod
+    def similarity_search_batch_with_score(self, queries: list[str], k: int = 10) -> list[list[tuple[Document, float]]]:
+        """Search for similar documents for several queries, returns scored results per query in query order."""
+
+    @abstractmethod
+    async def asimilarity_search_batch_with_score(self, queries: list[str], k: int = 10) -> list[list[tuple[Document, float]]]:
+        """Asynchronously search for similar documents for several queries, returns scored results per query in query order."""
+
+    @abstractmethod
+    def hybrid_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Search with full-text and vector search fused by reciprocal rank, scores are the cosine similarity to the query."""
+
+    @abstractmethod
+    async def ahybrid_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Asynchronously search with full-text and vector search fused by reciprocal rank, scores are the cosine similarity to the query."""
+
+    @abstractmethod
+    def _stored_embeddings(self, scored_docs: list[tuple[Document, float]]) -> list[list[float]]:
+        """Stored embedding of every retrieved document, in order."""
+
+    @abstractmethod
+    async def _astored_embeddings(self, scored_docs: list[tuple[Document, float]]) -> list[list[float]]:
+        """Asynchronously get the stored embedding of every retrieved document, in order."""
+
+    @abstractmethod
+    def add_documents(self, documents: list[Document]) -> list[str]:
+        """Add documents to the vector store, returns their ids."""
+
+    @abstractmethod
+    def get_stats(self) -> dict:
+        """Return the precomputed collection statistics: document count, size in bytes and documents per source domain."""
+
+    @abstractmethod
+    def rebuild_stats(self) -> dict:
+        """Recompute the collection statistics from the stored documents, returns them."""
+
+    @abstractmethod
+    def add_embeddings(self, documents: list[Document], embeddings: list[list[float]], ids: list[str]) -> list[str]:
+        """Upsert already embedded documents by id, returns their ids."""
+
+    def stored_id(self, document: Document) -> str:
+        """Id of a document in this collection, its content id hashed with the collection name.
+
+        PGVector keys embeddings by id across all collections, the same document ingested into two collections needs two ids.
+        """
+        return hashlib.sha256(f"{self._collection_name}\n{document_id(document)}".encode()).hexdigest()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed document texts with the embedding model of this store."""
+        return self._embedding_model.embed_documents(texts)
+
+    async def aping(self) -> None:
+        """Check the backend answers, raises when it does not. In-process stores have nothing to check."""
+
+    def search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+        mode: RetrievalMode = "vector",
+        diversity: Diversity = "none",
+        fetch_k: int | None = None,
+        lambda_mult: float = 0.5,
+    ) -> list[tuple[Document, float]]:
+        """Search for documents with the given retrieval mode and diversity.
+
+        With diversity enabled `fetch_k` candidates are retrieved and `k` of them are kept: the best one per
+        source URL (`source`) or a maximal marginal relevance selection over their stored embeddings (`mmr`).
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+            mode: `vector` for pure similarity search, `hybrid` to fuse it with full-text search.
+            diversity: `none`, `source` for one document per source URL, or `mmr`.
+            fetch_k: [Optional] Number of candidates to diversify, defaults to 4 * k.
+            lambda_mult: MMR trade-off between relevance (1) and diversity (0).
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their cosine similarity to the query, best first.
+
+        """
+        search = self.hybrid_search_with_score if mode == "hybrid" else self.similarity_search_with_score
+        if diversity == "none":
+            return search(query, k, exclude_ids=exclude_ids)
+
+        candidates = search(query, max(fetch_k or 4 * k, k), exclude_ids=exclude_ids)
+        if diversity == "source" or len(candidates) <= k:
+            return diversify_by_source(candidates, k)
+        return self._select_mmr(self._embed_queries([query])[0], candidates, self._stored_embeddings(candidates), k, lambda_mult)
+
+    async def asearch_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+        mode: RetrievalMode = "vector",
+        diversity: Diversity = "none",
+        fetch_k: int | None = None,
+        lambda_mult: float = 0.5,
+    ) -> list[tuple[Document, float]]:
+        """Asynchronously search for documents with the given retrieval mode and diversity.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+            mode: `vector` for pure similarity search, `hybrid` to fuse it with full-text search.
+            diversity: `none`, `source` for one document per source URL, or `mmr`.
+            fetch_k: [Optional] Number of candidates to diversify, defaults to 4 * k.
+            lambda_mult: MMR trade-off between relevance (1) and diversity (0).
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their cosine similarity to the query, best first.
+
+        """
+        search = self.ahybrid_search_with_score if mode == "hybrid" else self.asimilarity_search_with_score
+        if diversity == "none":
+            return await search(query, k, exclude_ids=exclude_ids)
+
+        candidates = await search(query, max(fetch_k or 4 * k, k), exclude_ids=exclude_ids)
+        if diversity == "source" or len(candidates) <= k:
+            return diversify_by_source(candidates, k)
+        # The query embedding is served from the query embedding cache, the search just computed it
+        query_embedding = (await self._aembed_queries([query]))[0]
+        return self._select_mmr(query_embedding, candidates, await self._astored_embeddings(candidates), k, lambda_mult)
+
+    @staticmethod
+    def _select_mmr(
+        query_embedding: list[float],
+        candidates: list[tuple[Document, float]],
+        embeddings: list[list[float]],
+        k: int,
+        lambda_mult: float,
+    ) -> list[tuple[Document, float]]:
+        selected = maximal_marginal_relevance(np.asarray(query_embedding), embeddings, lambda_mult=lambda_mult, k=k)
+        return [candidates[i] for i in selected]
+
+    def similarity_search(self, query: str, k: int = 10, *, exclude_ids: Collection[str] | None = None) -> list[Document]:
+        """Search for similar documents in the vector store.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[Document]: The list of documents found.
+
+        """
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, exclude_ids=exclude_ids)]
+
+    async def asimilarity_search(self, query: str, k: int = 10, *, exclude_ids: Collection[str] | None = None) -> list[Document]:
+        """Asynchronously search for similar documents in the vector store.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[Document]: The list of documents found.
+
+        """
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k, exclude_ids=exclude_ids)]
+
+    def similarity_search_batch(self, queries: list[str], k: int = 10) -> list[list[Document]]:
+        """Search for similar documents for several queries at once.
+
+        Args:
+            queries: The queries to search for.
+            k: The number of results to return per query.
+
+        Returns:
+            list[list[Document]]: The list of documents found for each query, in query order.
+
+        """
+        return [[doc for doc, _ in results] for results in self.similarity_search_batch_with_score(queries, k)]
+
+    async def asimilarity_search_batch(self, queries: list[str], k: int = 10) -> list[list[Document]]:
+        """Asynchronously search for similar documents for several queries at once.
+
+        Args:
+            queries: The queries to search for.
+            k: The number of results to return per query.
+
+        Returns:
+            list[list[Document]]: The list of documents found for each query, in query order.
+
+        """
+        return [[doc for doc, _ in results] for results in await self.asimilarity_search_batch_with_score(queries, k)]
+
+    def _embed_queries(self, queries: list[str]) -> list[list[float]]:
+        """Embed queries in one call, through the query embedding cache when the model has one."""
+        if isinstance(self._embedding_model, CachedQueryEmbeddings):
+            return self._embedding_model.embed_queries(queries)
+        return self._embedding_model.embed_documents(queries)
+
+    async def _aembed_queries(self, queries: list[str]) -> list[list[float]]:
+        if isinstance(self._embedding_model, CachedQueryEmbeddings):
+            return await self._embedding_model.aembed_queries(queries)
+        return await self._embedding_model.aembed_documents(queries)
@@ -11,5 +11,8 @@ class AIGeneration(BaseModel):
     answer: str = Field(description="answer for user's question, use your best knowledge and judgement to answer the question, say 'I'm sorry, I don't know' if you don't know the answer")
     follow_up_questions: list[str] = Field(description="possible questions that user might ask after reading the answer, if there are no follow up questions, return an empty list")
 
+class FollowUpQuestions(BaseModel):
+    follow_up_questions: list[str] = Field(description="up to 3 questions that user might ask after reading the answer, return an empty list if there are none")
+
 class Generation(AIGeneration):
     sources: list[Source] = Field(description="list of sources that we use to generate answer")
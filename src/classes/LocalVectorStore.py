@@ -0,0 +1,621 @@
+import json
+import os
+import re
+import shutil
+import time
+from collections import Counter
+from collections.abc import Callable, Collection, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from classes.BaseVectorStore import BaseVectorStore
+from utils.logger import logger
+from utils.metrics import VECTORSTORE_LATENCY
+from utils.Models import get_nomic_embedding
+from utils.quantization import (
+    Quantization,
+    hamming_distances,
+    int8_similarities,
+    quantize_binary,
+    quantize_int8,
+    shortlist,
+)
+from utils.tools import document_stats, exclude_documents, reciprocal_rank_fusion, summarize_stats
+
+if TYPE_CHECKING:
+    from classes.VectorStore import VectorStore
+
+try:
+    import fcntl
+except ImportError:  # Windows, snapshots are then only safe with a single writer
+    fcntl = None
+
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+HNSW_FILE = "hnsw.bin"
+STATS_FILE = "stats.json"
+INT8_FILE = "embeddings.int8.npy"
+INT8_SCALE_FILE = "embeddings.int8.scale.npy"
+BINARY_FILE = "embeddings.binary.npy"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+
+
+def default_snapshot_dir() -> Path:
+    """Directory holding local collection snapshots, `CALM_LOCAL_INDEX_DIR` or `<project>/index`."""
+    return Path(os.environ.get("CALM_LOCAL_INDEX_DIR", Path(__file__).resolve().parent.parent.parent / "index"))
+
+
+@contextmanager
+def _snapshot_lock(path: Path) -> Iterator[None]:
+    """Exclusive lock of a collection snapshot across processes, held while writing the snapshot or its derived files."""
+    path.mkdir(parents=True, exist_ok=True)
+    with (path / LOCK_FILE).open("a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _current_version(path: Path) -> Path:
+    """Directory of the current version of a snapshot, the snapshot directory itself when written without a manifest."""
+    manifest = path / MANIFEST_FILE
+    if manifest.exists():
+        return path / json.loads(manifest.read_text())["version"]
+    return path
+
+
+def _save_atomic(path: Path, save: Callable[[Path], object]) -> None:
+    """Write a file through `save(tmp_path)` and move it in place, readers never see a partial file."""
+    tmp = path.with_name(f"{path.stem}.tmp{path.suffix}")
+    save(tmp)
+    os.replace(tmp, path)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+
+def _tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+class _BM25Index:
+    """Okapi BM25 over an in-memory list of documents, the full-text side of local hybrid search."""
+
+    def __init__(self, documents: list[Document], k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        postings: dict[str, tuple[list[int], list[int]]] = {}
+        lengths = []
+        for i, doc in enumerate(documents):
+            tokens = _tokenize(doc.page_content)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                indices, tfs = postings.setdefault(term, ([], []))
+                indices.append(i)
+                tfs.append(tf)
+        self._postings = {term: (np.asarray(indices), np.asarray(tfs, dtype=np.float32)) for term, (indices, tfs) in postings.items()}
+        self._lengths = np.asarray(lengths, dtype=np.float32)
+        self._avg_length = float(self._lengths.mean()) if lengths else 0.0
+
+    def search(self, query: str, k: int) -> list[int]:
+        """Indices of the `k` best matching documents, documents sharing no term with the query are left out."""
+        scores = np.zeros(len(self._lengths), dtype=np.float32)
+        for term in set(_tokenize(query)):
+            if term not in self._postings:
+                continue
+            indices, tfs = self._postings[term]
+            idf = np.log(1.0 + (len(self._lengths) - len(indices) + 0.5) / (len(indices) + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self._lengths[indices] / self._avg_length)
+            scores[indices] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+        matches = np.flatnonzero(scores)
+        top = matches[np.argsort(-scores[matches])[:k]]
+        return top.tolist()
+
+
+class LocalVectorStore(BaseVectorStore):
+    """In-process vector store serving similarity search from a memory-mapped collection snapshot.
+
+    A snapshot is a directory with the L2-normalized embeddings matrix (`embeddings.npy`), the documents
+    with their ids and metadata (`documents.jsonl`) and per-source statistics (`stats.json`). The matrix
+    is memory-mapped read-only, so worker processes on the same host share one copy through the page cache.
+    Search is an exact vectorized cosine top-k in NumPy, or an approximate HNSW index (requires `hnswlib`)
+    for large collections. With int8 or binary quantization the first pass scans compact codes only and
+    the shortlisted candidates are re-scored exactly, so just their rows of the full matrix are paged in.
+
+    Every write creates a new version directory next to the current one and publishes it by replacing
+    `manifest.json`, readers see either the old or the new snapshot and never a mix of both. Derived files
+    (HNSW index, quantized codes) are built under a file lock so concurrent workers build them only once.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        snapshot_dir: str | Path | None = None,
+        embedding_model: Embeddings | None = None,
+        *,
+        approximate: bool = False,
+        ef_search: int = 64,
+        quantization: Quantization = "none",
+        rescore_factor: int = 4,
+    ) -> None:
+        """Initialize the local vector store from its snapshot, an empty store when the collection has no snapshot yet.
+
+        Args:
+            collection_name: The name of the collection to use.
+            snapshot_dir: [Optional] Directory holding collection snapshots, defaults to `default_snapshot_dir()`.
+            embedding_model: [Optional] The embedding model to use.
+            approximate: Whether to search with an HNSW index instead of the exact top-k.
+            ef_search: HNSW search breadth, higher values trade latency for recall.
+            quantization: Compact codes scanned in the first pass of the exact search, `none`, `int8` or `binary`.
+            rescore_factor: Candidates re-scored with the full vectors per requested result when quantized.
+
+        Raises:
+            ValueError: If collection_name is empty or None, or quantization is combined with approximate search.
+
+        """
+        if not collection_name:
+            raise ValueError("Collection name cannot be empty or None")
+        if approximate and quantization != "none":
+            raise ValueError("Quantization applies to the exact search, it can not be combined with approximate search")
+
+        self._collection_name = collection_name
+        self._embedding_model = embedding_model or get_nomic_embedding()
+        self._path = Path(snapshot_dir or default_snapshot_dir()) / collection_name
+        self._approximate = approximate
+        self._ef_search = ef_search
+        self._quantization = quantization
+        self._rescore_factor = max(rescore_factor, 1)
+        self._hnsw = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    @property
+    def index_nbytes(self) -> int:
+        """Size in bytes of the matrix scanned for every query, the compact codes when quantized."""
+        if self._quantization == "int8":
+            return self._codes.nbytes + self._scale.nbytes
+        if self._quantization == "binary":
+            return self._codes.nbytes
+        return self._embeddings.nbytes
+
+    def similarity_search_by_vectors(self, query_embeddings: np.ndarray, k: int = 10) -> list[list[tuple[Document, float]]]:
+        """Search for similar documents for already embedded queries.
+
+        Args:
+            query_embeddings: Query embeddings, one per row.
+            k: The number of results to return per query.
+
+        Returns:
+            list[list[tuple[Document, float]]]: Documents with their similarity score for each query, in query order.
+
+        """
+        return self._search(np.atleast_2d(query_embeddings), k)
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Search for similar documents along with their cosine similarity to the query.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their similarity score, most similar first.
+
+        """
+        exclude_ids = set(exclude_ids or ())
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="similarity_search"):
+            results = self._search(np.asarray([self._embed_queries([query])[0]]), k + len(exclude_ids))[0]
+        return exclude_documents(results, exclude_ids, k)
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Asynchronously search for similar documents along with their cosine similarity to the query.
+
+        Only the query embedding is awaited, the in-memory search itself takes well under a millisecond.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their similarity score, most similar first.
+
+        """
+        exclude_ids = set(exclude_ids or ())
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="similarity_search"):
+            results = self._search(np.asarray(await self._aembed_queries([query])), k + len(exclude_ids))[0]
+        return exclude_documents(results, exclude_ids, k)
+
+    def similarity_search_batch_with_score(self, queries: list[str], k: int = 10) -> list[list[tuple[Document, float]]]:
+        """Search for similar documents for several queries with one embedding call and one matrix product.
+
+        Args:
+            queries: The queries to search for.
+            k: The number of results to return per query.
+
+        Returns:
+            list[list[tuple[Document, float]]]: Documents with their similarity score for each query, in query order.
+
+        """
+        if not queries:
+            return []
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="similarity_search_batch"):
+            return self._search(np.asarray(self._embed_queries(queries)), k)
+
+    async def asimilarity_search_batch_with_score(self, queries: list[str], k: int = 10) -> list[list[tuple[Document, float]]]:
+        """Asynchronously search for similar documents for several queries with one embedding call and one matrix product.
+
+        Args:
+            queries: The queries to search for.
+            k: The number of results to return per query.
+
+        Returns:
+            list[list[tuple[Document, float]]]: Documents with their similarity score for each query, in query order.
+
+        """
+        if not queries:
+            return []
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="similarity_search_batch"):
+            return self._search(np.asarray(await self._aembed_queries(queries)), k)
+
+    def hybrid_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Search with BM25 and vector search fused by reciprocal rank.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their cosine similarity to the query, best first after fusion.
+
+        """
+        exclude_ids = set(exclude_ids or ())
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="hybrid_search"):
+            results = self._hybrid_search(query, np.asarray(self._embed_queries([query])[0]), k + len(exclude_ids))
+        return exclude_documents(results, exclude_ids, k)
+
+    async def ahybrid_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Asynchronously search with BM25 and vector search fused by reciprocal rank.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their cosine similarity to the query, best first after fusion.
+
+        """
+        exclude_ids = set(exclude_ids or ())
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="hybrid_search"):
+            results = self._hybrid_search(query, np.asarray((await self._aembed_queries([query]))[0]), k + len(exclude_ids))
+        return exclude_documents(results, exclude_ids, k)
+
+    def add_documents(self, documents: list[Document]) -> list[str]:
+        """Embed documents and append them to the snapshot.
+
+        The snapshot is rewritten and re-mapped, fine for a read-mostly collection but not meant for frequent small writes.
+
+        Args:
+            documents: List of documents to add.
+
+        Returns:
+            list[str]: List of document IDs that were added.
+
+        """
+        if not documents:
+            return []
+
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="add_documents"):
+            embeddings = self._embedding_model.embed_documents([doc.page_content for doc in documents])
+            return self.add_embeddings(documents, embeddings, [self.stored_id(doc) for doc in documents])
+
+    def add_embeddings(self, documents: list[Document], embeddings: list[list[float]], ids: list[str]) -> list[str]:
+        """Upsert already embedded documents by id and rewrite the snapshot.
+
+        Args:
+            documents: List of documents to add.
+            embeddings: Embedding of each document.
+            ids: Id of each document, existing documents with the same id are replaced.
+
+        Returns:
+            list[str]: List of document IDs that were upserted.
+
+        """
+        if not documents:
+            return []
+
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="add_embeddings"):
+            upserts = {
+                doc_id: (Document(id=doc_id, page_content=doc.page_content, metadata=doc.metadata), embedding)
+                for doc, embedding, doc_id in zip(documents, embeddings, ids)
+            }
+            kept = [(doc, embedding) for doc, embedding in zip(self._documents, self._embeddings) if doc.id not in upserts]
+            self.write_snapshot(self._path, [*kept, *upserts.values()])
+            self._load()
+
+        return list(ids)
+
+    def _stored_embeddings(self, scored_docs: list[tuple[Document, float]]) -> list[list[float]]:
+        """Embedding row of every retrieved document, in order."""
+        return [self._embeddings[self._rows[doc.id]] for doc, _ in scored_docs]
+
+    async def _astored_embeddings(self, scored_docs: list[tuple[Document, float]]) -> list[list[float]]:
+        """Embedding row of every retrieved document, in order, the matrix is in memory already."""
+        return self._stored_embeddings(scored_docs)
+
+    def get_stats(self) -> dict:
+        """Return the collection statistics stored with the snapshot.
+
+        Returns:
+            dict: Document count, content and embedding size in bytes, and documents per source domain.
+
+        """
+        return summarize_stats(self._collection_name, self._stats)
+
+    def rebuild_stats(self) -> dict:
+        """Recompute the collection statistics from the loaded snapshot and store them with it.
+
+        Returns:
+            dict: The rebuilt collection statistics, see `get_stats`.
+
+        """
+        self._stats = document_stats(self._documents, self._embeddings)
+        with _snapshot_lock(self._path):
+            _save_atomic(self._version / STATS_FILE, lambda tmp: tmp.write_text(json.dumps(self._stats)))
+        return self.get_stats()
+
+    def _search(self, query_embeddings: np.ndarray, k: int) -> list[list[tuple[Document, float]]]:
+        """Top-k cosine search of every row of `query_embeddings`."""
+        k = min(k, len(self._documents))
+        if k <= 0:
+            return [[] for _ in range(len(query_embeddings))]
+
+        queries = _normalize(query_embeddings)
+        if self._hnsw is not None:
+            self._hnsw.set_ef(max(self._ef_search, k))
+            labels, distances = self._hnsw.knn_query(queries, k=k)
+            return [
+                [(self._documents[i], float(1.0 - d)) for i, d in zip(row_labels, row_distances)]
+                for row_labels, row_distances in zip(labels, distances)
+            ]
+
+        if self._quantization != "none":
+            return self._rescore(queries, self._shortlist(queries, k * self._rescore_factor), k)
+
+        similarities = queries @ self._embeddings.T
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in zip(similarities, top):
+            ranked = candidates[np.argsort(-row[candidates])]
+            results.append([(self._documents[i], float(row[i])) for i in ranked])
+        return results
+
+    def _shortlist(self, queries: np.ndarray, n: int) -> np.ndarray:
+        """First pass over the quantized codes, returns `n` candidate rows per query."""
+        if self._quantization == "int8":
+            return shortlist(int8_similarities(self._codes, self._scale, queries), n)
+        return shortlist(hamming_distances(self._codes, queries), n, largest=False)
+
+    def _rescore(self, queries: np.ndarray, candidates: np.ndarray, k: int) -> list[list[tuple[Document, float]]]:
+        """Exact cosine top-k among the candidates, only their rows of the full matrix are read."""
+        results = []
+        for query, rows in zip(queries, candidates):
+            rows = np.sort(rows)  # Ascending rows read the memory map sequentially
+            similarities = np.asarray(self._embeddings[rows]) @ query
+            top = np.argsort(-similarities)[:k]
+            results.append([(self._documents[rows[i]], float(similarities[i])) for i in top])
+        return results
+
+    def _hybrid_search(self, query: str, query_embedding: np.ndarray, k: int) -> list[tuple[Document, float]]:
+        if self._bm25 is None:
+            # Built on first use, the vector-only path never pays for the inverted index
+            self._bm25 = _BM25Index(self._documents)
+
+        lexical = self._bm25.search(query, k)
+        similarities = np.asarray(self._embeddings[lexical]) @ _normalize(query_embedding) if lexical else []
+        lexical_results = [(self._documents[i], float(similarity)) for i, similarity in zip(lexical, similarities)]
+        return reciprocal_rank_fusion([self._search(query_embedding[np.newaxis], k)[0], lexical_results], k)
+
+    def _load(self) -> None:
+        self._version = _current_version(self._path)
+        embeddings_path = self._version / EMBEDDINGS_FILE
+        documents_path = self._version / DOCUMENTS_FILE
+        if embeddings_path.exists() and documents_path.exists():
+            self._embeddings: np.ndarray = np.load(embeddings_path, mmap_mode="r")
+            with documents_path.open(encoding="utf-8") as f:
+                self._documents: list[Document] = [
+                    Document(id=record["id"], page_content=record["page_content"], metadata=record["metadata"])
+                    for record in map(json.loads, f)
+                ]
+        else:
+            logger.warning(f"Local vector store | {self._collection_name} | no snapshot in {self._path}, starting empty")
+            self._embeddings = np.zeros((0, 0), dtype=np.float32)
+            self._documents = []
+        self._rows = {doc.id: i for i, doc in enumerate(self._documents)}
+        if len(self._documents) != len(self._embeddings):
+            raise ValueError(f"Snapshot of collection {self._collection_name} is inconsistent: {len(self._documents)} documents, {len(self._embeddings)} embeddings")
+
+        stats_path = self._version / STATS_FILE
+        if stats_path.exists():
+            self._stats: dict[str, dict[str, int]] = json.loads(stats_path.read_text())
+        elif self._documents:
+            # Snapshot written before statistics were tracked
+            self.rebuild_stats()
+        else:
+            self._stats = {}
+        self._bm25: _BM25Index | None = None
+        self._hnsw = self._load_hnsw() if self._approximate and len(self._documents) else None
+        if self._quantization != "none" and len(self._documents):
+            self._load_codes()
+        logger.info(f"Local vector store | {self._collection_name} | {len(self._documents)} documents loaded")
+
+    def _load_hnsw(self):  # noqa: ANN202
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise ImportError("Approximate search requires hnswlib, install it with `pip install hnswlib`") from e
+
+        index_path = self._version / HNSW_FILE
+
+        def load():  # noqa: ANN202
+            index = hnswlib.Index(space="ip", dim=self._embeddings.shape[1])
+            if index_path.exists():
+                index.load_index(str(index_path), max_elements=len(self._documents))
+                if index.get_current_count() == len(self._documents):
+                    return index
+            return None
+
+        if (index := load()) is not None:
+            return index
+
+        with _snapshot_lock(self._path):
+            # Another worker may have built the index while this one waited for the lock
+            if (index := load()) is not None:
+                return index
+
+            # Missing or stale index, rebuild it from the embeddings matrix
+            index = hnswlib.Index(space="ip", dim=self._embeddings.shape[1])
+            index.init_index(max_elements=len(self._documents), ef_construction=200, M=16)
+            index.add_items(np.asarray(self._embeddings), np.arange(len(self._documents)))
+            _save_atomic(index_path, lambda tmp: index.save_index(str(tmp)))
+        return index
+
+    def _load_codes(self) -> None:
+        """Memory-map the quantized codes of the snapshot, they are computed and saved on first use."""
+        files = [self._version / INT8_FILE, self._version / INT8_SCALE_FILE] if self._quantization == "int8" else [self._version / BINARY_FILE]
+
+        def stale() -> bool:
+            return not all(path.exists() for path in files) or len(np.load(files[0], mmap_mode="r")) != len(self._documents)
+
+        if stale():
+            with _snapshot_lock(self._path):
+                # Another worker may have saved the codes while this one waited for the lock
+                if stale():
+                    # Missing or stale codes, quantize the embeddings matrix
+                    arrays = quantize_int8(np.asarray(self._embeddings)) if self._quantization == "int8" else (quantize_binary(np.asarray(self._embeddings)),)
+                    # The scale is written before the codes, the length check of the codes then covers both
+                    for path, array in reversed(list(zip(files, arrays))):
+                        _save_atomic(path, lambda tmp, array=array: np.save(tmp, array))
+
+        self._codes: np.ndarray = np.load(files[0], mmap_mode="r")
+        if self._quantization == "int8":
+            self._scale: np.ndarray = np.load(files[1])
+
+    @staticmethod
+    def write_snapshot(path: str | Path, records: Iterable[tuple[Document, list[float]]]) -> int:
+        """Write a new version of a collection snapshot and publish it with a single `os.replace` of the manifest.
+
+        The previous version is kept for readers still mapping it, older versions are removed.
+
+        Args:
+            path: Directory of the collection snapshot.
+            records: Documents with their embeddings.
+
+        Returns:
+            int: Number of documents written.
+
+        """
+        path = Path(path)
+        with _snapshot_lock(path):
+            previous = _current_version(path)
+            version = path / f"v{time.time_ns()}"
+            version.mkdir()
+            try:
+                documents, embeddings = [], []
+                with (version / DOCUMENTS_FILE).open("w", encoding="utf-8") as f:
+                    for doc, embedding in records:
+                        f.write(json.dumps({"id": doc.id, "page_content": doc.page_content, "metadata": doc.metadata}) + "\n")
+                        documents.append(doc)
+                        embeddings.append(embedding)
+
+                matrix = _normalize(np.asarray(embeddings, dtype=np.float32)) if embeddings else np.zeros((0, 0), dtype=np.float32)
+                np.save(version / EMBEDDINGS_FILE, matrix)
+                (version / STATS_FILE).write_text(json.dumps(document_stats(documents, embeddings)))
+            except BaseException:
+                shutil.rmtree(version, ignore_errors=True)
+                raise
+
+            _save_atomic(path / MANIFEST_FILE, lambda tmp: tmp.write_text(json.dumps({"version": version.name, "documents": len(embeddings)})))
+
+            for stale in path.glob("v*"):
+                if stale.is_dir() and stale not in (version, previous):
+                    shutil.rmtree(stale, ignore_errors=True)
+            if previous != path:
+                # Files of a snapshot written before manifests, kept as the previous version by the first versioned write
+                for legacy in (EMBEDDINGS_FILE, DOCUMENTS_FILE, STATS_FILE, HNSW_FILE, INT8_FILE, INT8_SCALE_FILE, BINARY_FILE):
+                    (path / legacy).unlink(missing_ok=True)
+
+        return len(embeddings)
+
+    @classmethod
+    def from_vector_store(cls, source: "VectorStore", snapshot_dir: str | Path | None = None, **kwargs) -> "LocalVectorStore":
+        """Snapshot a PGVector collection to disk and open it as a local vector store.
+
+        Args:
+            source: The PGVector backed vector store to snapshot.
+            snapshot_dir: [Optional] Directory holding collection snapshots, defaults to `default_snapshot_dir()`.
+            **kwargs: Additional arguments for LocalVectorStore.
+
+        Returns:
+            LocalVectorStore: The local vector store serving the snapshot.
+
+        """
+        path = Path(snapshot_dir or default_snapshot_dir()) / source.collection_name
+        count = cls.write_snapshot(path, source.iter_documents_with_embeddings())
+        logger.success(f"Snapshot of collection {source.collection_name} written to {path} | {count} documents")
+        return cls(source.collection_name, snapshot_dir=snapshot_dir, **kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from classes.VectorStore import VectorStore
+
+    parser = argparse.ArgumentParser(description="Snapshot PGVector collections for the local vector store backend.")
+    parser.add_argument("collections", nargs="+", help="Names of the collections to snapshot")
+    parser.add_argument("--snapshot-dir", default=None, help="Directory holding collection snapshots")
+    args = parser.parse_args()
+
+    for collection in args.collections:
+        LocalVectorStore.from_vector_store(VectorStore(collection_name=collection), snapshot_dir=args.snapshot_dir)
@@ -1,4 +1,4 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 from pydantic import BaseModel, Field
 from classes.ChatSession import BaseChatMessage
 
@@ -69,6 +69,54 @@ class RequestBody(BaseModel):
         default="qwen2.5:latest",
         description="Intermediate decision model selection"
     )
+    speculative_retrieval: bool = Field(
+        default=False,
+        description="Search both knowledge bases while the intention is being detected"
+    )
+    early_exit_grading: bool = Field(
+        default=False,
+        description="Stop grading once enough documents pass the relevance threshold"
+    )
+    accept_similarity: Optional[float] = Field(
+        default=None,
+        ge=-1.0,
+        le=1.0,
+        description="Retrieval similarity at or above which documents skip LLM grading and are accepted"
+    )
+    reject_similarity: Optional[float] = Field(
+        default=None,
+        ge=-1.0,
+        le=1.0,
+        description="Retrieval similarity below which documents skip LLM grading and are rejected"
+    )
+    retrieval_mode: Literal["vector", "hybrid"] = Field(
+        default="vector",
+        description="Retrieval mode, hybrid fuses full-text search with vector search to catch exact terms such as drug names"
+    )
+    diversity: Literal["none", "mmr", "source"] = Field(
+        default="none",
+        description="Diversify retrieved documents before grading, one per source URL or maximal marginal relevance"
+    )
+    fetch_k: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=100,
+        description="Number of candidates retrieved for diversification, defaults to 4 * doc_number"
+    )
+    merge_knowledge_bases: bool = Field(
+        default=False,
+        description="Search both knowledge bases concurrently and merge the results, the routed one weighs the most"
+    )
+    secondary_kb_weight: float = Field(
+        default=0.5,
+        ge=0.0,
+        le=1.0,
+        description="Weight of the knowledge base not chosen by the router when merging knowledge bases"
+    )
+    bypass_cache: bool = Field(
+        default=False,
+        description="Skip the semantic answer cache and always run the agent"
+    )
     chat_session: List[BaseChatMessage] = Field(
         default=[],
         description="Communication history"
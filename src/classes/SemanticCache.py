@@ -0,0 +1,145 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from classes.Generation import Generation
+from utils.Models import get_nomic_embedding
+
+
+@dataclass
+class _CacheEntry:
+    context_key: str
+    embedding: np.ndarray
+    generation: Generation
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """Semantic cache of final answers, placed in front of the CaLM ADRD agent.
+
+    Entries are keyed by the normalized query embedding plus a context key, which captures the model
+    settings and the conversation history. A lookup hits when an entry with the same context key has
+    a cosine similarity to the query at or above `similarity_threshold`. Entries are evicted in LRU
+    order once `max_size` is exceeded and expire after `ttl_seconds`.
+    """
+
+    def __init__(
+        self,
+        embedding_model: Embeddings | None = None,
+        similarity_threshold: float = 0.95,
+        max_size: int = 1024,
+        ttl_seconds: float = 3600,
+    ) -> None:
+        """Initialize the semantic answer cache.
+
+        Args:
+            embedding_model: [Optional] The embedding model used to embed queries, defaults to the Nomic embedding.
+            similarity_threshold: Minimum cosine similarity for a cache hit.
+            max_size: Maximum number of cached answers.
+            ttl_seconds: Time to live of a cached answer in seconds.
+
+        Raises:
+            ValueError: If similarity_threshold is not in (0, 1] or max_size is not positive.
+
+        """
+        if not 0 < similarity_threshold <= 1:
+            raise ValueError("Similarity threshold must be in (0, 1]")
+        if max_size < 1:
+            raise ValueError("Max size must be positive")
+
+        self._embedding_model = embedding_model or get_nomic_embedding()
+        self.similarity_threshold = similarity_threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: OrderedDict[int, _CacheEntry] = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_context_key(settings: dict, conversation: str) -> str:
+        """Build the context key from the model settings and the conversation history.
+
+        Args:
+            settings: Settings that influence the answer, e.g. models, temperature and retrieval parameters.
+            conversation: The formatted conversation history the answer is generated from.
+
+        Returns:
+            str: A stable hash of settings and conversation.
+
+        """
+        payload = json.dumps(settings, sort_keys=True, default=str) + "\n" + conversation
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def aembed(self, query: str) -> np.ndarray:
+        """Embed and L2-normalize a query."""
+        embedding = np.asarray(await self._embedding_model.aembed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def lookup(self, embedding: np.ndarray, context_key: str) -> Generation | None:
+        """Return the cached answer most similar to the query embedding, if any passes the threshold."""
+        with self._lock:
+            self._evict_expired()
+
+            candidates = [(entry_id, entry) for entry_id, entry in self._entries.items() if entry.context_key == context_key]
+            if candidates:
+                similarities = np.stack([entry.embedding for _, entry in candidates]) @ embedding
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    entry_id, entry = candidates[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return entry.generation.model_copy(deep=True)
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: np.ndarray, context_key: str, generation: Generation) -> None:
+        """Store a final answer for the query embedding and context key."""
+        with self._lock:
+            self._entries[self._next_id] = _CacheEntry(
+                context_key=context_key,
+                embedding=embedding,
+                generation=generation.model_copy(deep=True),
+                created_at=time.monotonic(),
+            )
+            self._next_id += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all cached answers and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _evict_expired(self) -> None:
+        if self.ttl_seconds is None:
+            return
+        deadline = time.monotonic() - self.ttl_seconds
+        # Entries are ordered by last use, expired ones can still sit behind fresher ones after a hit
+        expired = [entry_id for entry_id, entry in self._entries.items() if entry.created_at < deadline]
+        for entry_id in expired:
+            del self._entries[entry_id]
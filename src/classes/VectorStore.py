@@ -1,24 +1,62 @@
 #!/usr/bin/env python3
 
 import os
+import uuid
+from collections.abc import Collection, Iterator
 
 from langchain.schema import Document
 from langchain_core.embeddings import Embeddings
 from langchain_postgres import PGVector
 from pydantic import PrivateAttr
+from sqlalchemy import BigInteger, Column, CompoundSelect, Index, MetaData, Select, String, Table, delete, func, literal, literal_column, select, text, union_all
+from sqlalchemy.dialects.postgresql import BIT, insert
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.schema import CreateIndex
 
+from classes.BaseVectorStore import BaseVectorStore
+from utils.logger import logger
+from utils.metrics import VECTORSTORE_LATENCY
 from utils.Models import get_nomic_embedding
-from utils.tools import get_connection
+from utils.tools import (
+    document_stats,
+    exclude_documents,
+    get_connection,
+    reciprocal_rank_fusion,
+    summarize_stats,
+)
 
+# Text search configuration of the full-text side of hybrid search, inlined so the GIN expression index matches
+FTS_CONFIG = literal_column("'english'::regconfig")
 
-class VectorStore:
+STAT_COLUMNS = ("documents", "content_bytes", "embedding_bytes")
+
+# Per-collection counters kept up to date at ingest, so reporting never scans the embedding table
+COLLECTION_STATS = Table(
+    "calm_collection_stats",
+    MetaData(),
+    Column("collection_name", String, primary_key=True),
+    Column("domain", String, primary_key=True),
+    *(Column(name, BigInteger, nullable=False, default=0) for name in STAT_COLUMNS),
+)
+
+
+class VectorStore(BaseVectorStore):
     """A vector store wrapper for PGVector with embedding capabilities.
 
     This class encapsulates the PGVector connection and provides a clean interface
     for vector operations using the Facade and Factory Method patterns.
     """
 
-    def __init__(self, collection_name: str, connection: str | None = None, embedding_model: Embeddings | None = None, _kb: PGVector | None = None) -> None:
+    def __init__(
+        self,
+        collection_name: str,
+        connection: str | None = None,
+        embedding_model: Embeddings | None = None,
+        _kb: PGVector | None = None,
+        *,
+        binary_quantization: bool = False,
+        rescore_factor: int = 4,
+    ) -> None:
         """Initialize the vector store.
 
         Args:
@@ -26,6 +64,9 @@ class VectorStore:
             connection: [Optional] The connection string for the vector store.
             embedding_model: [Optional] The embedding model to use.
             _kb: [Optional] The PGVector connection to use.
+            binary_quantization: Whether to shortlist candidates by Hamming distance of the binary quantized
+                embeddings before the exact cosine ranking, see `create_binary_quantization_index`.
+            rescore_factor: Candidates re-ranked exactly per requested result with binary quantization.
 
         Raises:
             ValueError: If collection_name is empty or None.
@@ -38,23 +79,357 @@ class VectorStore:
         self._embedding_model = embedding_model or get_nomic_embedding()
         self._collection_name = collection_name
         self._kb: PGVector = get_connection(self._connection, self._embedding_model, self._collection_name)
+        self._akb: PGVector | None = None
+        self._stats_table_ready = False
+        self._binary_quantization = binary_quantization
+        self._rescore_factor = max(rescore_factor, 1)
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Search for similar documents along with their cosine similarity to the query.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their similarity score, most similar first.
 
-    def similarity_search(self, query: str, k: int = 10) -> list[Document]:
-        """Search for similar documents in the vector store.
+        """
+        exclude_ids = set(exclude_ids or ())
+        if self._binary_quantization:
+            return exclude_documents(self.similarity_search_batch_with_score([query], k + len(exclude_ids))[0], exclude_ids, k)
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="similarity_search"):
+            results = self._kb.similarity_search_with_score(query=query, k=k + len(exclude_ids))
+        return exclude_documents(self._to_similarity(results), exclude_ids, k)
+
+    async def asimilarity_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Asynchronously search for similar documents along with their cosine similarity to the query.
 
         Args:
             query: The query to search for.
             k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their similarity score, most similar first.
+
+        """
+        exclude_ids = set(exclude_ids or ())
+        if self._binary_quantization:
+            return exclude_documents((await self.asimilarity_search_batch_with_score([query], k + len(exclude_ids)))[0], exclude_ids, k)
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="similarity_search"):
+            results = await self._async_kb().asimilarity_search_with_score(query=query, k=k + len(exclude_ids))
+        return exclude_documents(self._to_similarity(results), exclude_ids, k)
+
+    def similarity_search_batch_with_score(self, queries: list[str], k: int = 10) -> list[list[tuple[Document, float]]]:
+        """Search for similar documents for several queries with one embedding call and one database round trip.
+
+        Args:
+            queries: The queries to search for.
+            k: The number of results to return per query.
+
+        Returns:
+            list[list[tuple[Document, float]]]: Documents with their similarity score for each query, in query order.
+
+        """
+        if not queries:
+            return []
+
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="similarity_search_batch"):
+            embeddings = self._embed_queries(queries)
+            with self._kb._make_sync_session() as session:  # noqa: SLF001
+                collection = self._kb.get_collection(session)
+                if collection is None:
+                    return [[] for _ in queries]
+                rows = session.execute(self._batch_statement(self._kb, collection.uuid, embeddings, k, self._shortlist_size(k))).all()
+
+        return self._group_batch_rows(rows, len(queries))
+
+    async def asimilarity_search_batch_with_score(self, queries: list[str], k: int = 10) -> list[list[tuple[Document, float]]]:
+        """Asynchronously search for similar documents for several queries with one embedding call and one database round trip.
+
+        Args:
+            queries: The queries to search for.
+            k: The number of results to return per query.
 
         Returns:
-            list[Document]: The list of documents found.
+            list[list[tuple[Document, float]]]: Documents with their similarity score for each query, in query order.
+
+        """
+        if not queries:
+            return []
+
+        akb = self._async_kb()
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="similarity_search_batch"):
+            embeddings = await self._aembed_queries(queries)
+            # Creates the collection tables on first use, same as the public PGVector methods do
+            await akb._PGVector__apost_init__()  # noqa: SLF001
+            async with akb._make_async_session() as session:  # noqa: SLF001
+                collection = await akb.aget_collection(session)
+                if collection is None:
+                    return [[] for _ in queries]
+                rows = (await session.execute(self._batch_statement(akb, collection.uuid, embeddings, k, self._shortlist_size(k)))).all()
+
+        return self._group_batch_rows(rows, len(queries))
+
+    def hybrid_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Search with full-text and vector search in one round trip, fused by reciprocal rank.
+
+        Full-text search catches exact terms such as drug or program names that the embedding misses.
+        Run `create_full_text_index` once per database so it does not scan the table.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their cosine similarity to the query, best first after fusion.
+
+        """
+        exclude_ids = set(exclude_ids or ())
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="hybrid_search"):
+            embedding = self._embed_queries([query])[0]
+            with self._kb._make_sync_session() as session:  # noqa: SLF001
+                collection = self._kb.get_collection(session)
+                if collection is None:
+                    return []
+                rows = session.execute(self._hybrid_statement(
+                    self._kb, collection.uuid, query, embedding, k + len(exclude_ids), self._shortlist_size(k + len(exclude_ids)),
+                )).all()
+
+        return exclude_documents(reciprocal_rank_fusion(self._group_batch_rows(rows, 2), k + len(exclude_ids)), exclude_ids, k)
+
+    async def ahybrid_search_with_score(
+        self,
+        query: str,
+        k: int = 10,
+        *,
+        exclude_ids: Collection[str] | None = None,
+    ) -> list[tuple[Document, float]]:
+        """Asynchronously search with full-text and vector search in one round trip, fused by reciprocal rank.
+
+        Args:
+            query: The query to search for.
+            k: The number of results to return.
+            exclude_ids: [Optional] Ids of documents to skip, e.g. documents already seen in earlier retries.
+
+        Returns:
+            list[tuple[Document, float]]: Documents with their cosine similarity to the query, best first after fusion.
+
+        """
+        exclude_ids = set(exclude_ids or ())
+        akb = self._async_kb()
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="hybrid_search"):
+            embedding = (await self._aembed_queries([query]))[0]
+            await akb._PGVector__apost_init__()  # noqa: SLF001
+            async with akb._make_async_session() as session:  # noqa: SLF001
+                collection = await akb.aget_collection(session)
+                if collection is None:
+                    return []
+                rows = (await session.execute(self._hybrid_statement(
+                    akb, collection.uuid, query, embedding, k + len(exclude_ids), self._shortlist_size(k + len(exclude_ids)),
+                ))).all()
+
+        return exclude_documents(reciprocal_rank_fusion(self._group_batch_rows(rows, 2), k + len(exclude_ids)), exclude_ids, k)
+
+    def create_binary_quantization_index(self) -> None:
+        """Create the HNSW index over the binary quantized embeddings backing `binary_quantization`, a no-op when it exists.
+
+        Requires pgvector 0.7 or later. The bit length is taken from the stored embeddings.
+        """
+        store = self._kb.EmbeddingStore
+        with self._kb._make_sync_session() as session:  # noqa: SLF001
+            dimension = session.execute(select(func.vector_dims(store.embedding)).limit(1)).scalar()
+            if dimension is None:
+                return
+            embedding = Column("embedding", store.embedding.type)
+            bits = func.binary_quantize(embedding).cast(BIT(dimension)).label("bits")
+            self._create_index(
+                session,
+                Index(f"ix_{store.__tablename__}_binary_hnsw", bits, postgresql_using="hnsw", postgresql_ops={"bits": "bit_hamming_ops"}),
+                embedding,
+            )
+
+    def create_full_text_index(self) -> None:
+        """Create the GIN index backing the full-text side of hybrid search, a no-op when it exists."""
+        store = self._kb.EmbeddingStore
+        with self._kb._make_sync_session() as session:  # noqa: SLF001
+            document = Column("document", store.document.type)
+            self._create_index(
+                session,
+                Index(f"ix_{store.__tablename__}_document_fts", func.to_tsvector(FTS_CONFIG, document), postgresql_using="gin"),
+                document,
+            )
+
+    def _create_index(self, session: Session, index: Index, *columns: Column) -> None:
+        """Create an expression index over `columns` of the embedding table, a no-op when it exists.
+
+        The columns belong to a detached copy of the table, so the index never joins the PGVector table metadata.
+        """
+        Table(self._kb.EmbeddingStore.__tablename__, MetaData(), *columns, index)
+        session.execute(CreateIndex(index, if_not_exists=True))
+        session.commit()
+
+    @classmethod
+    def _hybrid_statement(
+        cls,
+        kb: PGVector,
+        collection_id: uuid.UUID,
+        query: str,
+        embedding: list[float],
+        k: int,
+        shortlist: int | None = None,
+    ) -> CompoundSelect:
+        """Build one statement returning the `k` nearest neighbours (query index 0) and the `k` best full-text matches (query index 1).
+
+        Full-text matches carry a rank column and are returned in rank order, both carry their cosine distance to the query.
+        """
+        store = kb.EmbeddingStore
+        distance = kb.distance_strategy(embedding)
+        ts_query = func.websearch_to_tsquery(FTS_CONFIG, query)
+        ts_vector = func.to_tsvector(FTS_CONFIG, store.document)
+        lexical = (
+            select(
+                literal(1).label("query_index"),
+                store.id,
+                store.document,
+                store.cmetadata,
+                distance.label("distance"),
+                func.ts_rank_cd(ts_vector, ts_query).label("text_rank"),
+            )
+            .where(store.collection_id == collection_id, ts_vector.op("@@")(ts_query))
+            .order_by(func.ts_rank_cd(ts_vector, ts_query).desc())
+            .limit(k)
+            .subquery()
+        )
+        nearest = cls._batch_statement(kb, collection_id, [embedding], k, shortlist).add_columns(literal(0.0).label("text_rank"))
+        return union_all(nearest, select(lexical))
+
+    def _shortlist_size(self, k: int) -> int | None:
+        return k * self._rescore_factor if self._binary_quantization else None
+
+    @staticmethod
+    def _batch_statement(
+        kb: PGVector,
+        collection_id: uuid.UUID,
+        embeddings: list[list[float]],
+        k: int,
+        shortlist: int | None = None,
+    ) -> Select | CompoundSelect:
+        """Build one statement returning the `k` nearest neighbours of every embedding, tagged with its query index.
+
+        With a `shortlist` size the nearest neighbours are ranked exactly among that many candidates with the
+        smallest Hamming distance between the binary quantized embeddings.
+        """
+        store = kb.EmbeddingStore
+        selects = []
+        for index, embedding in enumerate(embeddings):
+            if shortlist:
+                bits = BIT(len(embedding))
+                hamming = func.binary_quantize(store.embedding).cast(bits).op("<~>")(
+                    func.binary_quantize(literal(embedding, type_=store.embedding.type)).cast(bits),
+                )
+                rows = aliased(
+                    store,
+                    select(store).where(store.collection_id == collection_id).order_by(hamming).limit(shortlist).subquery(),
+                )
+                distance = rows.embedding.cosine_distance(embedding)
+            else:
+                rows = store
+                distance = kb.distance_strategy(embedding)
+            nearest = (
+                select(
+                    literal(index).label("query_index"),
+                    rows.id,
+                    rows.document,
+                    rows.cmetadata,
+                    distance.label("distance"),
+                )
+                .where(rows.collection_id == collection_id)
+                .order_by(distance)
+                .limit(k)
+                .subquery()
+            )
+            selects.append(select(nearest))
+        return selects[0] if len(selects) == 1 else union_all(*selects)
+
+    @classmethod
+    def _group_batch_rows(cls, rows: list, n_queries: int) -> list[list[tuple[Document, float]]]:
+        grouped: list[list[tuple[Document, float, float]]] = [[] for _ in range(n_queries)]
+        for row in rows:
+            grouped[row.query_index].append(
+                (Document(id=str(row.id), page_content=row.document, metadata=row.cmetadata), row.distance, getattr(row, "text_rank", 0.0)),
+            )
+        # Full-text rows rank by text rank first, vector rows all have rank 0 and rank by distance
+        return [
+            cls._to_similarity([(doc, distance) for doc, distance, _ in sorted(results, key=lambda x: (-x[2], x[1]))])
+            for results in grouped
+        ]
+
+    @staticmethod
+    def _to_similarity(results: list[tuple[Document, float]]) -> list[tuple[Document, float]]:
+        # PGVector reports cosine distance, convert to similarity so higher is better
+        return [(doc, 1.0 - distance) for doc, distance in results]
+
+    async def aping(self) -> None:
+        """Check the database answers with a trivial query over the async connection pool, raises when it does not."""
+        async with self._async_kb()._make_async_session() as session:  # noqa: SLF001
+            await session.execute(text("SELECT 1"))
+
+    def _async_kb(self) -> PGVector:
+        if self._akb is None:
+            self._akb = get_connection(self._connection, self._embedding_model, self._collection_name, async_mode=True)
+        return self._akb
+
+    def iter_documents_with_embeddings(self, batch_size: int = 1000) -> Iterator[tuple[Document, list[float]]]:
+        """Stream every document of the collection along with its stored embedding.
+
+        Args:
+            batch_size: Number of rows fetched from the database at a time.
+
+        Yields:
+            tuple[Document, list[float]]: A document and its embedding.
 
         """
-        return self._kb.similarity_search(query=query, k=k)
+        store = self._kb.EmbeddingStore
+        with self._kb._make_sync_session() as session:  # noqa: SLF001
+            collection = self._kb.get_collection(session)
+            if collection is None:
+                return
+            rows = session.execute(
+                select(store.id, store.document, store.cmetadata, store.embedding)
+                .where(store.collection_id == collection.uuid)
+                .execution_options(yield_per=batch_size),
+            )
+            for row in rows:
+                yield Document(id=str(row.id), page_content=row.document, metadata=row.cmetadata), list(row.embedding)
 
     def add_documents(self, documents: list[Document]) -> list[str]:
         """Add documents to the vector store.
 
+        Documents are keyed by a hash of the collection name and their id, or source and content when they have none,
+        adding them again overwrites the existing rows.
+
         Args:
             documents: List of documents to add.
 
@@ -62,8 +437,175 @@ class VectorStore:
             list[str]: List of document IDs that were added.
 
         """
-        return self._kb.add_documents(documents)
+        with VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="add_documents"):
+            return self.add_embeddings(
+                documents,
+                self.embed_documents([doc.page_content for doc in documents]),
+                [self.stored_id(doc) for doc in documents],
+            )
+
+    def add_embeddings(self, documents: list[Document], embeddings: list[list[float]], ids: list[str]) -> list[str]:
+        """Upsert already embedded documents by id, existing rows with the same id are overwritten.
+
+        The rows and the collection statistics are written in one transaction, and upserts into the same
+        collection are serialized by an advisory lock, so overwritten rows are counted once even when
+        several ingestions write the same documents concurrently.
+
+        Args:
+            documents: List of documents to add.
+            embeddings: Embedding of each document.
+            ids: Id of each document, e.g. a content hash so re-ingestion is idempotent.
+
+        Returns:
+            list[str]: List of document IDs that were upserted.
+
+        """
+        if not documents:
+            return []
+
+        # A single upsert statement can not touch the same row twice, the last duplicate wins
+        unique = {doc_id: (doc, embedding) for doc, embedding, doc_id in zip(documents, embeddings, ids)}
+        ids = list(unique)
+        documents = [doc for doc, _ in unique.values()]
+        embeddings = [embedding for _, embedding in unique.values()]
+
+        store = self._kb.EmbeddingStore
+        with (
+            VECTORSTORE_LATENCY.time(collection=self._collection_name, operation="add_embeddings"),
+            self._kb._make_sync_session() as session,  # noqa: SLF001
+        ):
+            self._ensure_stats_table(session)
+            collection = self._kb.get_collection(session)
+            if collection is None:
+                raise ValueError(f"Collection {self._collection_name} not found")
+
+            # Held until commit, the rows read as replaced are exactly the rows this upsert overwrites
+            self._lock_collection(session)
+            replaced = self._stored_documents(session, collection.uuid, ids)
+
+            statement = insert(store).values([
+                {"id": doc_id, "collection_id": collection.uuid, "embedding": embedding, "document": doc.page_content, "cmetadata": doc.metadata or {}}
+                for doc_id, doc, embedding in zip(ids, documents, embeddings)
+            ])
+            session.execute(statement.on_conflict_do_update(
+                index_elements=[store.id],
+                set_={"embedding": statement.excluded.embedding, "document": statement.excluded.document, "cmetadata": statement.excluded.cmetadata},
+            ))
+            # Rows are overwritten with embeddings of the same model, so they had the same dimension
+            self._update_stats(session, document_stats(documents, embeddings), document_stats(replaced, [embeddings[0]] * len(replaced)))
+            session.commit()
+        return ids
+
+    def get_stats(self) -> dict:
+        """Return the collection statistics maintained at ingest, without touching the embedding table.
+
+        Collections filled before statistics were tracked need one `rebuild_stats()` call.
+
+        Returns:
+            dict: Document count, content and embedding size in bytes, and documents per source domain.
+
+        """
+        with self._kb._make_sync_session() as session:  # noqa: SLF001
+            self._ensure_stats_table(session)
+            rows = session.execute(select(COLLECTION_STATS).where(COLLECTION_STATS.c.collection_name == self._collection_name)).all()
+        return summarize_stats(self._collection_name, {row.domain: {name: getattr(row, name) for name in STAT_COLUMNS} for row in rows})
+
+    def rebuild_stats(self) -> dict:
+        """Recompute the collection statistics with one aggregate query, only counts leave the database.
+
+        Returns:
+            dict: The rebuilt collection statistics, see `get_stats`.
+
+        """
+        store = self._kb.EmbeddingStore
+        source = func.coalesce(func.nullif(store.cmetadata["source"].astext, ""), store.cmetadata["url"].astext, "")
+        domain = func.coalesce(func.nullif(func.split_part(source, "/", 3), ""), "Unknown")
+        with self._kb._make_sync_session() as session:  # noqa: SLF001
+            self._ensure_stats_table(session)
+            # No upsert can change the counts between the aggregate and the rewrite of the statistics
+            self._lock_collection(session)
+            collection = self._kb.get_collection(session)
+            rows = [] if collection is None else session.execute(
+                select(
+                    domain.label("domain"),
+                    func.count().label("documents"),
+                    func.coalesce(func.sum(func.octet_length(store.document)), 0).label("content_bytes"),
+                    func.coalesce(func.sum(func.vector_dims(store.embedding) * 4), 0).label("embedding_bytes"),
+                )
+                .where(store.collection_id == collection.uuid)
+                .group_by(domain),
+            ).all()
+
+            session.execute(delete(COLLECTION_STATS).where(COLLECTION_STATS.c.collection_name == self._collection_name))
+            if rows:
+                session.execute(
+                    insert(COLLECTION_STATS),
+                    [{"collection_name": self._collection_name, **row._asdict()} for row in rows],
+                )
+            session.commit()
+
+        logger.info(f"Collection statistics rebuilt | {self._collection_name} | {sum(row.documents for row in rows)} documents")
+        return self.get_stats()
+
+    def _stored_embeddings(self, scored_docs: list[tuple[Document, float]]) -> list[list[float]]:
+        """Stored embedding of every retrieved document, fetched by id in one query."""
+        with self._kb._make_sync_session() as session:  # noqa: SLF001
+            rows = session.execute(self._embeddings_statement(self._kb, scored_docs)).all()
+        return self._order_embeddings(rows, scored_docs)
+
+    async def _astored_embeddings(self, scored_docs: list[tuple[Document, float]]) -> list[list[float]]:
+        """Asynchronously get the stored embedding of every retrieved document, fetched by id in one query."""
+        akb = self._async_kb()
+        async with akb._make_async_session() as session:  # noqa: SLF001
+            rows = (await session.execute(self._embeddings_statement(akb, scored_docs))).all()
+        return self._order_embeddings(rows, scored_docs)
+
+    @staticmethod
+    def _embeddings_statement(kb: PGVector, scored_docs: list[tuple[Document, float]]) -> Select:
+        store = kb.EmbeddingStore
+        return select(store.id, store.embedding).where(store.id.in_([doc.id for doc, _ in scored_docs]))
+
+    @staticmethod
+    def _order_embeddings(rows: list, scored_docs: list[tuple[Document, float]]) -> list[list[float]]:
+        embeddings = {str(row.id): list(row.embedding) for row in rows}
+        return [embeddings[doc.id] for doc, _ in scored_docs]
+
+    def _stored_documents(self, session: Session, collection_id: uuid.UUID, ids: list[str]) -> list[Document]:
+        """Documents of the collection with the given ids, i.e. the rows an upsert of `ids` overwrites."""
+        store = self._kb.EmbeddingStore
+        rows = session.execute(
+            select(store.document, store.cmetadata).where(store.collection_id == collection_id, store.id.in_(ids)),
+        ).all()
+        return [Document(page_content=row.document, metadata=row.cmetadata) for row in rows]
+
+    def _update_stats(self, session: Session, added: dict[str, dict[str, int]], removed: dict[str, dict[str, int]]) -> None:
+        """Apply the difference of added and removed per-domain counters to the statistics table, within the caller's transaction."""
+        deltas = {
+            domain: {name: added.get(domain, {}).get(name, 0) - removed.get(domain, {}).get(name, 0) for name in STAT_COLUMNS}
+            for domain in added.keys() | removed.keys()
+        }
+        deltas = {domain: delta for domain, delta in deltas.items() if any(delta.values())}
+        if not deltas:
+            return
+
+        statement = insert(COLLECTION_STATS).values(
+            [{"collection_name": self._collection_name, "domain": domain, **delta} for domain, delta in deltas.items()],
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[COLLECTION_STATS.c.collection_name, COLLECTION_STATS.c.domain],
+            set_={name: COLLECTION_STATS.c[name] + statement.excluded[name] for name in STAT_COLUMNS},
+        )
+        session.execute(statement)
+
+    def _lock_collection(self, session: Session) -> None:
+        """Serialize writers of this collection until the transaction of `session` ends."""
+        session.execute(select(func.pg_advisory_xact_lock(func.hashtext(self._collection_name))))
 
+    def _ensure_stats_table(self, session: Session) -> None:
+        if not self._stats_table_ready:
+            COLLECTION_STATS.create(session.connection(), checkfirst=True)
+            session.commit()
+            self._stats_table_ready = True
 
 if __name__ == "__main__":
     kb = VectorStore(collection_name="peer_support_kb")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""Streaming bulk ingestion of documents into a knowledge base.
+
+Documents are read lazily from a CSV (`title`, `content`, `url` columns) or JSONL (`page_content`,
+`metadata`) file, embedded in batches by a pool of parallel workers and upserted by a hash of the
+collection name, their source and content, so re-running an ingestion overwrites instead of duplicating. The number of
+input rows committed so far is written to a checkpoint file after every batch, an interrupted run
+resumes from there.
+"""
+
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+from classes.BaseVectorStore import BaseVectorStore
+from classes.VectorStore import VectorStore
+from utils.logger import logger
+
+
+def read_csv_documents(path: str | Path, source_type: str, doc_type: str) -> Iterator[Document]:
+    """Lazily read documents from a CSV file with `title`, `content` and `url` columns.
+
+    Args:
+        path: Path of the CSV file.
+        source_type: Value of the `source-type` metadata, e.g. NIH.
+        doc_type: Value of the `type` metadata, e.g. ClinicalInsight.
+
+    Yields:
+        Document: One document per row, rows without content are skipped.
+
+    """
+    csv.field_size_limit(sys.maxsize)
+    with Path(path).open(encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            if not row.get("content"):
+                continue
+            yield Document(
+                page_content=row["content"],
+                metadata={
+                    "title": row.get("title", ""),
+                    "source": row.get("url", ""),
+                    "source-type": source_type,
+                    "type": doc_type,
+                },
+            )
+
+
+def read_jsonl_documents(path: str | Path) -> Iterator[Document]:
+    """Lazily read documents from a JSONL file with one `{"page_content": ..., "metadata": {...}}` object per line.
+
+    Args:
+        path: Path of the JSONL file.
+
+    Yields:
+        Document: One document per non-empty line.
+
+    """
+    with Path(path).open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield Document(page_content=record["page_content"], metadata=record.get("metadata", {}))
+
+
+def _batched(documents: Iterable[Document], batch_size: int) -> Iterator[list[Document]]:
+    iterator = iter(documents)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+def _read_checkpoint(path: Path | None) -> int:
+    if path is None or not path.exists():
+        return 0
+    return int(json.loads(path.read_text())["processed"])
+
+
+def _write_checkpoint(path: Path | None, processed: int) -> None:
+    if path is None:
+        return
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"processed": processed}))
+    os.replace(tmp, path)
+
+
+def _embed_batch(store: BaseVectorStore, batch: list[Document]) -> tuple[list[Document], list[list[float]], list[str]]:
+    # The same content can appear more than once in a batch, a single upsert statement can not touch a row twice
+    unique = {store.stored_id(doc): doc for doc in batch}
+    documents = list(unique.values())
+    return documents, store.embed_documents([doc.page_content for doc in documents]), list(unique)
+
+
+def ingest(
+    store: BaseVectorStore,
+    documents: Iterable[Document],
+    batch_size: int = 64,
+    workers: int = 4,
+    checkpoint: str | Path | None = None,
+) -> dict:
+    """Embed and upsert documents into a vector store in parallel batches.
+
+    Batches are embedded concurrently but written in input order, so the checkpoint always marks a
+    prefix of the input that is fully stored.
+
+    Args:
+        store: The knowledge base to ingest into.
+        documents: Documents to ingest, consumed lazily.
+        batch_size: Number of documents per embedding call and upsert.
+        workers: Number of batches embedded in parallel.
+        checkpoint: [Optional] Path of the checkpoint file, input rows before the recorded offset are skipped.
+
+    Returns:
+        dict: Number of input documents processed, documents upserted, elapsed seconds and documents per second.
+
+    Raises:
+        ValueError: If batch_size or workers is not positive.
+
+    """
+    if batch_size < 1 or workers < 1:
+        raise ValueError("Batch size and workers must be positive")
+
+    checkpoint = Path(checkpoint) if checkpoint else None
+    processed = _read_checkpoint(checkpoint)
+    if processed:
+        logger.info(f"Ingestion | {store.collection_name} | resuming after {processed} documents")
+
+    batches = _batched(itertools.islice(documents, processed, None), batch_size)
+    pending: deque[tuple[int, Future]] = deque()
+    upserted = 0
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in itertools.chain(batches, [None]):
+            if batch is not None:
+                pending.append((len(batch), executor.submit(_embed_batch, store, batch)))
+            # Keep at most `workers` batches in flight, drain everything once the input is exhausted
+            while pending and (batch is None or len(pending) > workers):
+                size, future = pending.popleft()
+                upserted += len(store.add_embeddings(*future.result()))
+                processed += size
+                _write_checkpoint(checkpoint, processed)
+
+                elapsed = time.perf_counter() - start
+                logger.info(f"Ingestion | {store.collection_name} | {processed} documents processed | {upserted / elapsed:.1f} docs/s")
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "processed": processed,
+        "upserted": upserted,
+        "elapsed_seconds": elapsed,
+        "docs_per_second": upserted / elapsed if elapsed else 0.0,
+    }
+    logger.success(f"Ingestion | {store.collection_name} | {upserted} documents upserted in {elapsed:.1f}s | {stats['docs_per_second']:.1f} docs/s")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Bulk ingest documents into a knowledge base collection.")
+    parser.add_argument("path", help="CSV or JSONL file with the documents")
+    parser.add_argument("--collection", required=True, help="Name of the collection, e.g. clinical_insights")
+    parser.add_argument("--source-type", default="", help="`source-type` metadata of CSV documents, e.g. NIH")
+    parser.add_argument("--type", default="ClinicalInsight", help="`type` metadata of CSV documents")
+    parser.add_argument("--batch-size", type=int, default=64, help="Documents per embedding call and upsert")
+    parser.add_argument("--workers", type=int, default=4, help="Number of batches embedded in parallel")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file to resume an interrupted ingestion")
+    args = parser.parse_args()
+
+    store = VectorStore(collection_name=args.collection)
+
+    if args.path.endswith(".jsonl"):
+        documents = read_jsonl_documents(args.path)
+    else:
+        documents = read_csv_documents(args.path, source_type=args.source_type, doc_type=args.type)
+
+    ingest(store, documents, batch_size=args.batch_size, workers=args.workers, checkpoint=args.checkpoint)
+    # Hybrid retrieval relies on the full-text index, creating it is a no-op once it exists
+    store.create_full_text_index()
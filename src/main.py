@@ -1,28 +1,64 @@
-# ruff: noqa: ANN201, SIM108
+# ruff: noqa: ANN201, SIM108, E402
 
+import asyncio
+import json
+import os
+from collections.abc import AsyncIterator, Collection
+from contextlib import asynccontextmanager
 from typing import Optional
 
 from dotenv import load_dotenv
+
+# LLM scheduler and client limits are read when utils.Models is imported, .env must be loaded first
+load_dotenv()
+
 from fastapi import FastAPI
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from langchain_core.documents import Document
 from langgraph.graph import END, StateGraph
 from langgraph.pregel.io import AddableValuesDict  # noqa: TC002
-from pydantic import BaseModel, Field
-
-from checkpoints.adaptive_decision import adaptive_rag_decision
-from checkpoints.answer_generation import generate_answer
-from checkpoints.query_extander import query_extander
-from checkpoints.retrieval_grading import grade_retrieval_batch
+from langgraph.types import StreamWriter
+from numpy import ndarray
+from pydantic import BaseModel, Field, ValidationError, model_validator
+
+from checkpoints.adaptive_decision import aadaptive_rag_decision
+from checkpoints.answer_generation import GENERATION_FAILED_ANSWER, agenerate_answer, astream_answer
+from checkpoints.query_extander import aquery_extander
+from checkpoints.retrieval_grading import gate_by_similarity, grade_retrieval_batch, grade_retrieval_until
 from classes.AdaptiveDecision import AdaptiveDecision
+from classes.BaseVectorStore import BaseVectorStore, Diversity, RetrievalMode
 from classes.ChatSession import ChatSessionFactory
 from classes.DocumentAssessment import AnnotatedDocumentEvl
 from classes.Generation import Generation
 from classes.RequestBody import RequestBody
+from classes.SemanticCache import SemanticAnswerCache
 from classes.VectorStore import VectorStore
 from utils.logger import logger
+from utils.metrics import NODE_LATENCY, REGISTRY
+from utils.Models import llm_clients
+from utils.resources import RESOURCES, LazyResource
+from utils.tools import dispose_engines, document_id, merge_weighted_results
 
-load_dotenv()
 
-fastapi_app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:  # noqa: ARG001
+    """Warm up knowledge bases, answer cache, agent graph and LLM clients before serving, release pools on shutdown.
+
+    Set `CALM_WARMUP_ON_STARTUP=false` to create them on first use instead. A resource failing to start
+    does not stop the service, it is reported by `/ready` and retried on first use. Models listed in
+    `CALM_WARMUP_MODELS`, comma separated, are loaded and get a warm pooled connection.
+    """
+    if os.environ.get("CALM_WARMUP_ON_STARTUP", "true").lower() == "true":
+        await RESOURCES.awarm()
+        warmup_models = [model.strip() for model in os.environ.get("CALM_WARMUP_MODELS", "").split(",") if model.strip()]
+        await llm_clients.awarm(warmup_models)
+    yield
+    await llm_clients.aclose()
+    await dispose_engines()
+
+
+fastapi_app = FastAPI(lifespan=lifespan)
 
 # Define state machine state structure using Pydantic BaseModel
 
@@ -40,18 +76,39 @@ class GraphState(BaseModel):
     max_retries: int = Field(default=3, ge=1, description="Maximum retry attempts")
     doc_number: int = Field(default=5, ge=1, description="Number of documents to retrieve")
     temperature: float = Field(default=0.3, ge=0.0, le=1.0, description="Model temperature")
+    stream_answer: bool = Field(default=False, description="Stream answer tokens to the custom stream channel while generating")
+    speculative_retrieval: bool = Field(default=False, description="Search both knowledge bases while intention detection is in flight")
+    early_exit_grading: bool = Field(default=False, description="Stop grading and cancel remaining grader calls once doc_number documents pass the threshold")
+    accept_similarity: float | None = Field(default=None, description="Retrieval similarity at or above which documents are accepted without LLM grading")
+    reject_similarity: float | None = Field(default=None, description="Retrieval similarity below which documents are rejected without LLM grading")
+    retrieval_mode: RetrievalMode = Field(default="vector", description="Retrieval mode, vector search only or hybrid full-text and vector search")
+    diversity: Diversity = Field(default="none", description="Diversify retrieved documents before grading, one per source URL or maximal marginal relevance")
+    fetch_k: int | None = Field(default=None, ge=1, description="Number of candidates retrieved for diversification, defaults to 4 * doc_number")
+    merge_knowledge_bases: bool = Field(default=False, description="Search both knowledge bases concurrently and merge the results, weighting the routed one higher")
+    secondary_kb_weight: float = Field(default=0.5, ge=0.0, le=1.0, description="Weight of the knowledge base not chosen by the router when merging knowledge bases")
 
     # Running states
     query_message: str = Field(default="", description="Current query message, original from user query modified by query expansion")
     final_answer: Generation | None = Field(default=None, description="Final generated answer")
     retrieved_docs: list = Field(default_factory=list, description="Retrieved documents")
+    retrieved_scores: dict[str, float] = Field(default_factory=dict, description="Retrieval similarity score by document id")
+    prefetched_docs: list = Field(default_factory=list, description="Documents retrieved speculatively from the chosen knowledge base during intention detection")
     filtered_docs: list[AnnotatedDocumentEvl] = Field(default_factory=list, description="Filtered documents")
+    graded_docs: dict[str, AnnotatedDocumentEvl] = Field(default_factory=dict, description="Grading results of this request memoized by document id")
     missing_topics: list[str] = Field(default_factory=list, description="Missing topics for query expansion")
+    gate_rejected_all: bool = Field(default=False, description="Irrelevant documents were all rejected by the similarity gate, leaving no missing topics to expand the query with")
 
     # Routing function
     adaptive_decision: Optional[AdaptiveDecision] = Field(default=None, description="Adaptive decision result, whether to use extra knowledge about ADRD. Determined by user's query")  # noqa: UP007
     retry_count: int = Field(default=0, ge=0, description="Current retry count")
 
+    @model_validator(mode="after")
+    def _check_similarity_gate(self) -> "GraphState":
+        """A document can not be both accepted and rejected by the similarity gate."""
+        if self.accept_similarity is not None and self.reject_similarity is not None and self.accept_similarity < self.reject_similarity:
+            raise ValueError(f"accept_similarity ({self.accept_similarity}) must not be below reject_similarity ({self.reject_similarity})")
+        return self
+
     class Config:
         """Pydantic BaseModel Config."""
 
@@ -63,72 +120,240 @@ class GraphState(BaseModel):
 
 
 # Initialize knowledge base connections
-p_kb = VectorStore(collection_name="peer_support")
-r_kb = VectorStore(collection_name="clinical_insights")
+def _create_knowledge_base(collection_name: str) -> BaseVectorStore:
+    """Create a knowledge base on the backend selected by `CALM_VECTOR_BACKEND`, `pgvector` (default) or `local`.
+
+    `CALM_VECTOR_QUANTIZATION` enables the quantized first pass, `int8` or `binary` locally and `binary` on PGVector.
+    """
+    quantization = os.environ.get("CALM_VECTOR_QUANTIZATION", "none")
+    rescore_factor = int(os.environ.get("CALM_VECTOR_RESCORE_FACTOR", "4"))
+    if os.environ.get("CALM_VECTOR_BACKEND", "pgvector") == "local":
+        from classes.LocalVectorStore import LocalVectorStore
+
+        return LocalVectorStore(
+            collection_name=collection_name,
+            approximate=os.environ.get("CALM_LOCAL_INDEX_APPROXIMATE", "false").lower() == "true",
+            quantization=quantization,
+            rescore_factor=rescore_factor,
+        )
+    return VectorStore(collection_name=collection_name, binary_quantization=quantization == "binary", rescore_factor=rescore_factor)
 
-def detect_intention(state: GraphState) -> dict:
-    """User intention detection node. Determine whether to use extra knowledge about ADRD."""
-    logger.info(f"User's query: {state.user_query}")
 
-    decision = adaptive_rag_decision(
-        query=state.user_query,
-        model=state.intermediate_model,
-        temperature=state.temperature,
-        latest_conversation_pair=state.chat_session.get_formatted_conversation("latest_conversation_pair"),
+# Knowledge bases connect on first use or at startup, importing this module opens no connections
+_peer_support_kb = RESOURCES.register("peer_support_kb", lambda: _create_knowledge_base("peer_support"))
+_clinical_insights_kb = RESOURCES.register("clinical_insights_kb", lambda: _create_knowledge_base("clinical_insights"))
+
+
+def _knowledge_bases() -> tuple[BaseVectorStore, BaseVectorStore]:
+    """The peer support and clinical insights knowledge bases."""
+    return _peer_support_kb.get(), _clinical_insights_kb.get()
+
+
+async def _aknowledge_bases() -> tuple[BaseVectorStore, BaseVectorStore]:
+    """The peer support and clinical insights knowledge bases, connected in worker threads on first use."""
+    return await _peer_support_kb.aget(), await _clinical_insights_kb.aget()
+
+
+async def _aselect_knowledge_base(decision: AdaptiveDecision | None) -> BaseVectorStore:
+    """Map the adaptive decision to the knowledge base to search."""
+    p_kb, r_kb = await _aknowledge_bases()
+    if decision and decision.knowledge_base == "peer_support":
+        return p_kb
+    return r_kb
+
+
+async def _search_knowledge_base(kb: BaseVectorStore, state: GraphState, exclude_ids: Collection[str] = ()) -> list[tuple[Document, float]]:
+    """Search a knowledge base for the current query message with the retrieval settings of the request."""
+    return await kb.asearch_with_score(
+        state.query_message,
+        k=state.doc_number,
+        exclude_ids=exclude_ids,
+        mode=state.retrieval_mode,
+        diversity=state.diversity,
+        fetch_k=state.fetch_k,
     )
 
-    return {"adaptive_decision": decision}
+
+def _merge_knowledge_base_results(
+    state: GraphState,
+    chosen_kb: BaseVectorStore,
+    results: list[tuple[BaseVectorStore, list[tuple[Document, float]]]],
+) -> list[tuple[Document, float]]:
+    """Merge search results of several knowledge bases, the one chosen by the router weighs the most."""
+    if len(results) == 1:
+        return results[0][1]
+    return merge_weighted_results(
+        [(kb_results, 1.0 if kb is chosen_kb else state.secondary_kb_weight) for kb, kb_results in results],
+        state.doc_number,
+    )
+
+
+async def _retrieve(state: GraphState, exclude_ids: Collection[str] = ()) -> list[tuple[Document, float]]:
+    """Search the chosen knowledge base, or both concurrently when merging knowledge bases."""
+    chosen_kb = await _aselect_knowledge_base(state.adaptive_decision)
+    kbs = await _aknowledge_bases() if state.merge_knowledge_bases else (chosen_kb,)
+    results = await asyncio.gather(*(_search_knowledge_base(kb, state, exclude_ids) for kb in kbs))
+    return _merge_knowledge_base_results(state, chosen_kb, list(zip(kbs, results)))
+
+
+async def _cancel_tasks(tasks: list[asyncio.Task]) -> None:
+    """Cancel tasks and wait until they finished, so their exceptions are retrieved and no search outlives the node."""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@NODE_LATENCY.track(node="detect_intention")
+async def detect_intention(state: GraphState) -> dict:
+    """User intention detection node. Determine whether to use extra knowledge about ADRD.
+
+    In speculative mode both knowledge bases are searched while the decision LLM call is in flight,
+    only the result for the chosen knowledge base is kept and the other search is cancelled. When
+    merging knowledge bases both results are kept and merged.
+    """
+    logger.info(f"User's query: {state.user_query}")
+
+    speculative: list[tuple[BaseVectorStore, asyncio.Task]] = []
+    if state.speculative_retrieval:
+        speculative = [
+            (kb, asyncio.create_task(_search_knowledge_base(kb, state)))
+            for kb in await _aknowledge_bases()
+        ]
+
+    try:
+        decision = await aadaptive_rag_decision(
+            query=state.user_query,
+            model=state.intermediate_model,
+            temperature=state.temperature,
+            latest_conversation_pair=state.chat_session.get_formatted_conversation("latest_conversation_pair"),
+        )
+    except BaseException:
+        await _cancel_tasks([task for _, task in speculative])
+        raise
+
+    update: dict = {"adaptive_decision": decision}
+    if not speculative:
+        return update
+
+    chosen_kb = await _aselect_knowledge_base(decision) if decision.require_extra_re else None
+    kept = [(kb, task) for kb, task in speculative if chosen_kb is not None and (state.merge_knowledge_bases or kb is chosen_kb)]
+    await _cancel_tasks([task for kb, task in speculative if (kb, task) not in kept])
+
+    if not kept:
+        return update
+
+    try:
+        results = _merge_knowledge_base_results(state, chosen_kb, [(kb, await task) for kb, task in kept])
+    except Exception as e:
+        # Fall back to a regular search in the retrieval node
+        await _cancel_tasks([task for _, task in kept])
+        logger.warning(f"Speculative retrieval failed, retrieving on demand: {e!s}")
+        return update
+
+    update["prefetched_docs"] = [doc for doc, _ in results]
+    update["retrieved_scores"] = {**state.retrieved_scores, **{document_id(doc): score for doc, score in results}}
+    logger.success(f"Speculative retrieval kept | {len(update['prefetched_docs'])} | documents")
+    return update
 
 
-def retrieve_documents(state: GraphState) -> dict:
+@NODE_LATENCY.track(node="retrieve_docs")
+async def retrieve_documents(state: GraphState) -> dict:
     """Retrieve documents from knowledge base."""
-    if state.adaptive_decision and state.adaptive_decision.knowledge_base == "peer_support":
-        cls_kb = p_kb
+    scores = state.retrieved_scores
+    if state.prefetched_docs and state.retry_count == 0:
+        # Query message is still the original user query on the first pass, reuse the speculative result
+        docs = state.prefetched_docs
     else:
-        cls_kb = r_kb
-
-    docs = cls_kb.similarity_search(state.query_message, k=state.doc_number)
+        # Only bring in new candidates, documents graded in earlier iterations are excluded
+        results = await _retrieve(state, exclude_ids=state.graded_docs.keys())
+        docs = [doc for doc, _ in results]
+        scores = {**scores, **{document_id(doc): score for doc, score in results}}
 
     logger.success(f"Similarity search retrieved | {len(docs)} | documents")
 
     return {
         "retrieved_docs": docs,
+        "retrieved_scores": scores,
+        "prefetched_docs": [],
         "retry_count": state.retry_count + 1,
     }
 
 
+@NODE_LATENCY.track(node="grade_docs")
 async def grade_documents(state: GraphState) -> dict:
     """Asynchronously grade documents. Filter out irrelevant documents and identify missing topics for query expansion."""
-    graded = await grade_retrieval_batch(
-        state.query_message,
-        state.retrieved_docs,
-        model=state.intermediate_model,
-        temperature=state.temperature,
+    # Documents graded in earlier iterations of this request skip the LLM
+    graded_docs = dict(state.graded_docs)
+    new_docs = [doc for doc in state.retrieved_docs if document_id(doc) not in graded_docs]
+    reused = len(state.retrieved_docs) - len(new_docs)
+
+    # Clear-cut documents are decided by their retrieval similarity, only the uncertain band goes to the LLM grader
+    decided, new_docs = gate_by_similarity(
+        new_docs,
+        state.retrieved_scores,
+        accept_above=state.accept_similarity,
+        reject_below=state.reject_similarity,
     )
+    graded_docs.update({document_id(doc.document): doc for doc in decided})
+
+    # Remove duplicates by document id
+    filtered: dict[str, AnnotatedDocumentEvl] = {document_id(doc.document): doc for doc in state.filtered_docs}
+
+    if new_docs and state.early_exit_grading:
+        # Stop grading once enough relevant documents are known, counting reused grading results too
+        relevant_ids = set(filtered) | {
+            document_id(doc) for doc in state.retrieved_docs
+            if document_id(doc) in graded_docs and graded_docs[document_id(doc)].relevance_score >= state.threshold
+        }
+        newly_graded = await grade_retrieval_until(
+            state.query_message,
+            new_docs,
+            required=state.doc_number - len(relevant_ids),
+            threshold=state.threshold,
+            model=state.intermediate_model,
+            temperature=state.temperature,
+        )
+        graded_docs.update({document_id(doc.document): doc for doc in newly_graded})
+    elif new_docs:
+        newly_graded = await grade_retrieval_batch(
+            state.query_message,
+            new_docs,
+            model=state.intermediate_model,
+            temperature=state.temperature,
+        )
+        graded_docs.update({document_id(doc.document): doc for doc in newly_graded})
+
+    # Documents whose grading was cancelled by an early exit are left out
+    graded = [graded_docs[document_id(doc)] for doc in state.retrieved_docs if document_id(doc) in graded_docs]
 
-    filtered: list[AnnotatedDocumentEvl] = state.filtered_docs.copy() if state.filtered_docs else []
     missing: list[str] = []
     for doc in graded:
         if doc.relevance_score >= state.threshold:
-            # Remove duplicates
-            if doc not in filtered:
-                filtered.append(doc)
+            filtered.setdefault(document_id(doc.document), doc)
         else:
             missing.extend(doc.missing_topics)
 
     logger.success(
-        f"Filtered in {len(filtered)} documents, out of {len(graded)} graded documents",
+        f"Filtered in {len(filtered)} documents, out of {len(graded)} graded documents ({reused} reused, {len(decided)} decided by similarity)",
     )
 
+    # Gate rejections carry no missing topics, expanding without topics would retrieve the same documents again
+    gate_rejected_all = not missing and any(doc.relevance_score < state.threshold for doc in decided)
+    if gate_rejected_all:
+        logger.info("Similarity gate rejected every irrelevant document | no missing topics, skipping query expansion")
+
     return {
-        "filtered_docs": sorted(filtered, key=lambda x: x.relevance_score, reverse=True),
+        "filtered_docs": sorted(filtered.values(), key=lambda x: x.relevance_score, reverse=True),
         "missing_topics": missing,
+        "graded_docs": graded_docs,
+        "gate_rejected_all": gate_rejected_all,
     }
 
 
-def expand_query(state: GraphState) -> dict:
+@NODE_LATENCY.track(node="expand_query")
+async def expand_query(state: GraphState) -> dict:
     """Query expansion node."""
-    new_query = query_extander(
+    new_query = await aquery_extander(
         state.query_message,
         state.missing_topics,
         model=state.intermediate_model,
@@ -140,11 +365,35 @@ def expand_query(state: GraphState) -> dict:
     }
 
 
-def generate_answer_unified(state: GraphState) -> dict:
-    """Unified answer generation node - handles both direct and retrieval-based responses."""
+@NODE_LATENCY.track(node="generate_answer")
+async def generate_answer_unified(state: GraphState, writer: StreamWriter) -> dict:
+    """Unified answer generation node - handles both direct and retrieval-based responses.
+
+    The stream writer is injected by LangGraph as a node argument, `get_stream_writer()` relies on context
+    variables that async nodes do not inherit before Python 3.11.
+    """
     assert state.adaptive_decision is not None, "Adaptive decision is None"
 
-    answer = generate_answer(
+    if state.stream_answer:
+        # Forward answer tokens to the caller through LangGraph's custom stream mode
+        answer: Generation | None = None
+        async for chunk in astream_answer(
+            question=state.query_message,
+            context_chunks=state.filtered_docs,
+            work_memory=state.chat_session,
+            temperature=state.temperature,
+            model=state.model,
+            follow_up_model=state.intermediate_model,
+            isInformal=not state.adaptive_decision.require_extra_re,
+        ):
+            if isinstance(chunk, Generation):
+                answer = chunk
+            else:
+                writer({"event": "token", "delta": chunk})
+
+        return {"final_answer": answer}
+
+    answer = await agenerate_answer(
         question=state.query_message,
         context_chunks=state.filtered_docs,
         work_memory=state.chat_session,
@@ -179,7 +428,8 @@ def setup_workflow():
 
     def should_retry(state: GraphState) -> bool:
         return (state.retry_count < state.max_retries and
-                len(state.filtered_docs) < state.doc_number)
+                len(state.filtered_docs) < state.doc_number and
+                not state.gate_rejected_all)
 
     # Main process routing - both paths now go to the same unified answer node
     builder.add_conditional_edges(
@@ -209,43 +459,143 @@ def setup_workflow():
     return builder.compile()
 
 
-calm_agent = setup_workflow()
+_calm_agent = RESOURCES.register("calm_agent", setup_workflow)
 
 # ============== | API Service | ==============
 
 
+def _build_initial_state(request: RequestBody, *, stream_answer: bool = False) -> GraphState:
+    """Create the initial graph state from an API request, inconsistent settings are answered with a 422."""
+    try:
+        return GraphState(
+            user_query=request.user_query,
+            model=request.model,
+            intermediate_model=request.intermediate_model,
+            threshold=request.threshold,
+            max_retries=request.max_retries,
+            doc_number=request.doc_number,
+            temperature=request.temperature,
+            stream_answer=stream_answer,
+            speculative_retrieval=request.speculative_retrieval,
+            early_exit_grading=request.early_exit_grading,
+            accept_similarity=request.accept_similarity,
+            reject_similarity=request.reject_similarity,
+            retrieval_mode=request.retrieval_mode,
+            diversity=request.diversity,
+            fetch_k=request.fetch_k,
+            merge_knowledge_bases=request.merge_knowledge_bases,
+            secondary_kb_weight=request.secondary_kb_weight,
+            query_message=request.user_query,  # Initialize query_message with user_query
+            chat_session=ChatSessionFactory(
+                messages=request.chat_session,
+                max_messages=6,
+            ),
+        )
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_context=False, include_input=False)) from e
+
+
+# Semantic cache of final answers in front of the agent
+_answer_cache = RESOURCES.register(
+    "answer_cache",
+    lambda: SemanticAnswerCache(
+        similarity_threshold=float(os.environ.get("CALM_ANSWER_CACHE_THRESHOLD", "0.95")),
+        max_size=int(os.environ.get("CALM_ANSWER_CACHE_SIZE", "1024")),
+        ttl_seconds=float(os.environ.get("CALM_ANSWER_CACHE_TTL", "3600")),
+    ),
+)
+
+REGISTRY.gauge(
+    "calm_answer_cache",
+    "Semantic answer cache size and hit/miss counters.",
+    ("stat",),
+    callback=lambda: {(stat,): value for stat, value in _answer_cache.peek().stats().items()} if _answer_cache.ready else {},
+)
+
+# Lazily created module attributes, e.g. `from main import calm_agent` in the evaluation scripts
+_LAZY_ATTRIBUTES: dict[str, LazyResource] = {
+    "p_kb": _peer_support_kb,
+    "r_kb": _clinical_insights_kb,
+    "calm_agent": _calm_agent,
+    "answer_cache": _answer_cache,
+}
+
+
+def __getattr__(name: str):  # noqa: ANN202
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name].get()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _answer_cache_key(state: GraphState) -> str:
+    """Context key of a request: settings that change the answer plus the conversation history the answer is generated from."""
+    return SemanticAnswerCache.make_context_key(
+        settings=state.model_dump(
+            include={
+                "model", "intermediate_model", "threshold", "max_retries", "doc_number", "temperature",
+                "retrieval_mode", "diversity", "fetch_k", "merge_knowledge_bases", "secondary_kb_weight",
+                "accept_similarity", "reject_similarity", "early_exit_grading",
+            },
+        ),
+        # Generation sees the whole history, two sessions sharing their last turn may still need different answers
+        conversation=state.chat_session.get_formatted_conversation("messages"),
+    )
+
+
+async def _lookup_cached_answer(state: GraphState) -> tuple[Generation | None, ndarray | None]:
+    """Look up a cached answer, returns the answer (if any) and the query embedding to store the new answer with."""
+    try:
+        embedding = await (await _answer_cache.aget()).aembed(state.user_query)
+    except Exception as e:
+        logger.warning(f"Answer cache lookup skipped, query embedding failed: {e!s}")
+        return None, None
+
+    cached = _answer_cache.get().lookup(embedding, _answer_cache_key(state))
+    if cached is not None:
+        logger.success(f"Answer cache hit for query: {state.user_query}")
+    return cached, embedding
+
+
+def _store_cached_answer(state: GraphState, embedding: ndarray | None, answer: Generation) -> None:
+    """Store a successfully generated answer in the answer cache."""
+    if embedding is None or answer.answer.startswith(GENERATION_FAILED_ANSWER):
+        return
+    _answer_cache.get().store(embedding, _answer_cache_key(state), answer)
+
+
+def _format_sse(event: str, data: str) -> str:
+    """Format a single server-sent event."""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
 @fastapi_app.post("/ask-calm-adrd-agent")
 async def calm_adrd_agent_api(request: RequestBody) -> Generation:
     """Maintain a callable API for the Calm ADRD Agent to pipeline."""
     logger.info(f"Received request of message: {request.chat_session}")
 
     # Create initial state using Pydantic model
-    initial_state = GraphState(
-        user_query=request.user_query,
-        model=request.model,
-        intermediate_model=request.intermediate_model,
-        threshold=request.threshold,
-        max_retries=request.max_retries,
-        doc_number=request.doc_number,
-        temperature=request.temperature,
-        query_message=request.user_query,  # Initialize query_message with user_query
-        chat_session=ChatSessionFactory(
-            messages=request.chat_session,
-            max_messages=6,
-        ),
-    )
+    initial_state = _build_initial_state(request)
+
+    query_embedding = None
+    if not request.bypass_cache:
+        cached, query_embedding = await _lookup_cached_answer(initial_state)
+        if cached is not None:
+            return cached
 
     try:
         # Convert Pydantic model to dict for graph execution
         final_state: AddableValuesDict | None = None
-        async for state_update in calm_agent.astream(initial_state.model_dump(), stream_mode="values"):
+        async for state_update in (await _calm_agent.aget()).astream(initial_state.model_dump(), stream_mode="values"):
             final_state = state_update
 
         # Make sure final_answer is not empty
         assert final_state is not None, "Final state is None"
         assert final_state.get("final_answer"), "Final answer is empty"
 
-        return final_state.get("final_answer", "")
+        final_answer: Generation = final_state.get("final_answer")
+        _store_cached_answer(initial_state, query_embedding, final_answer)
+
+        return final_answer
     except AssertionError as e:
         logger.error(f"Assertion error in calm_agent stream: {e!s}")
         return Generation(
@@ -262,16 +612,110 @@ async def calm_adrd_agent_api(request: RequestBody) -> Generation:
         )
 
 
+@fastapi_app.post("/ask-calm-adrd-agent/stream")
+async def calm_adrd_agent_stream_api(request: RequestBody) -> StreamingResponse:
+    """Stream the Calm ADRD Agent run as server-sent events.
+
+    Emits a `node` event whenever a graph node completes, `token` events carrying answer deltas
+    while the answer is generated, and a final `final` event with the complete Generation
+    (answer, sources and follow up questions). Failures are reported as an `error` event.
+    """
+    logger.info(f"Received streaming request of message: {request.chat_session}")
+
+    initial_state = _build_initial_state(request, stream_answer=True)
+
+    async def event_stream() -> AsyncIterator[str]:
+        query_embedding = None
+        if not request.bypass_cache:
+            cached, query_embedding = await _lookup_cached_answer(initial_state)
+            if cached is not None:
+                yield _format_sse("final", cached.model_dump_json())
+                return
+
+        final_answer: Generation | None = None
+        try:
+            async for mode, chunk in (await _calm_agent.aget()).astream(initial_state.model_dump(), stream_mode=["updates", "custom"]):
+                if mode == "custom":
+                    yield _format_sse(chunk["event"], json.dumps({"delta": chunk["delta"]}))
+                    continue
+
+                for node, update in chunk.items():
+                    yield _format_sse("node", json.dumps({"node": node, "status": "completed"}))
+                    if update and update.get("final_answer"):
+                        final_answer = update["final_answer"]
+
+            assert final_answer is not None, "Final answer is empty"
+            _store_cached_answer(initial_state, query_embedding, final_answer)
+            yield _format_sse("final", final_answer.model_dump_json())
+        except Exception as e:
+            logger.error(f"Error in calm_agent event stream: {e!s}")
+            yield _format_sse("error", json.dumps({"message": f"Sorry, an error occurred while processing your request. Please try again later.{e}"}))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @fastapi_app.get("/server-health-check")
 def health_check_api():
     """Health check API."""
     return {"status": "CaLM ADRD Agent Server is Healthy"}
 
 
+async def _ping_knowledge_base(resource: LazyResource[BaseVectorStore]) -> str | None:
+    """Ping a created knowledge base, returns the error or None when it answered."""
+    try:
+        await asyncio.wait_for(resource.peek().aping(), float(os.environ.get("CALM_READY_TIMEOUT_SECONDS", "2")))
+    except Exception as e:
+        return str(e) or type(e).__name__
+    return None
+
+
+@fastapi_app.get("/ready")
+async def readiness_api() -> JSONResponse:
+    """Readiness of the service, 503 until it can serve requests.
+
+    Ready once every resource is created, the knowledge bases answer a ping and every pool of LLM endpoints
+    has a healthy endpoint. Reports the state and warm-up latency of every resource and the result of each check.
+    """
+    knowledge_bases = {"peer_support_kb": _peer_support_kb, "clinical_insights_kb": _clinical_insights_kb}
+    pinged = {name: resource for name, resource in knowledge_bases.items() if resource.ready}
+    errors = await asyncio.gather(*(_ping_knowledge_base(resource) for resource in pinged.values()))
+    checks = {
+        **{name: {"ok": error is None, "error": error} for name, error in zip(pinged, errors)},
+        "llm_endpoints": {"ok": llm_clients.endpoints_healthy(), "error": None},
+    }
+    ready = RESOURCES.ready and all(check["ok"] for check in checks.values())
+    return JSONResponse(
+        {"ready": ready, "resources": RESOURCES.status(), "checks": checks},
+        status_code=200 if ready else 503,
+    )
+
+
+@fastapi_app.get("/llm-clients")
+def llm_clients_api():
+    """In-flight and total calls of every pooled LLM client, health and latency of every Ollama endpoint."""
+    return {"clients": llm_clients.stats(), "endpoints": llm_clients.endpoint_stats()}
+
+
+@fastapi_app.get("/metrics")
+def metrics_api() -> PlainTextResponse:
+    """Expose node, LLM and vector store latency metrics in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@fastapi_app.get("/knowledge-base/stats")
+def knowledge_base_stats_api():
+    """Document counts, size in bytes and documents per source domain of every knowledge base, from the precomputed statistics."""
+    return {"knowledge_bases": [kb.get_stats() for kb in _knowledge_bases()]}
+
+
 def generate_graph_diagram():
     """Generate graph diagram."""
     logger.info("Generating graph diagram")
-    return calm_agent.get_graph().draw_mermaid_png(output_file_path="./public/calm_adrd_langgraph_diagram.png")
+    return _calm_agent.get().get_graph().draw_mermaid_png(output_file_path="./public/calm_adrd_langgraph_diagram.png")
 
 if __name__ == "__main__":
     generate_graph_diagram()
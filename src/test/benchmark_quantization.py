@@ -0,0 +1,62 @@
+import argparse
+import time
+
+import numpy as np
+
+from classes.LocalVectorStore import LocalVectorStore
+
+
+def benchmark(store: LocalVectorStore, queries: np.ndarray, k: int, exact: list[set[str]] | None = None) -> dict:
+    """Run every query one at a time, returns latency percentiles, recall@k against `exact` and the scanned index size."""
+    latencies = []
+    found = []
+    for query in queries:
+        start = time.perf_counter()
+        results = store.similarity_search_by_vectors(query, k)[0]
+        latencies.append(time.perf_counter() - start)
+        found.append({doc.id for doc, _ in results})
+
+    recall = 1.0 if exact is None else float(np.mean([len(f & e) / len(e) for f, e in zip(found, exact) if e]))
+    return {
+        "found": found,
+        "recall": recall,
+        "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "p95_ms": 1000 * float(np.percentile(latencies, 95)),
+        "index_mb": store.index_nbytes / 2**20,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare quantized local vector search against the exact search.")
+    parser.add_argument("collection", help="Name of the collection snapshot, e.g. peer_support")
+    parser.add_argument("--snapshot-dir", default=None, help="Directory holding collection snapshots")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries")
+    parser.add_argument("--k", type=int, default=10, help="Number of results per query")
+    parser.add_argument("--rescore-factor", type=int, nargs="+", default=[2, 4, 10], help="Rescore factors to compare")
+    parser.add_argument("--noise", type=float, default=0.05, help="Gaussian noise added to the sampled document embeddings")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the query sample")
+    args = parser.parse_args()
+
+    # Queries are perturbed document embeddings, so no embedding model is needed
+    exact_store = LocalVectorStore(args.collection, snapshot_dir=args.snapshot_dir)
+    rng = np.random.default_rng(args.seed)
+    sample = np.asarray(exact_store._embeddings[rng.choice(len(exact_store), size=min(args.queries, len(exact_store)), replace=False)])  # noqa: SLF001
+    queries = sample + rng.normal(scale=args.noise, size=sample.shape).astype(np.float32)
+
+    exact = benchmark(exact_store, queries, args.k)
+    print(f"{'mode':<12} {'rescore':>7} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8} {'index MB':>9}")
+    print(f"{'exact':<12} {'-':>7} {exact['recall']:>9.3f} {exact['p50_ms']:>8.2f} {exact['p95_ms']:>8.2f} {exact['index_mb']:>9.1f}")
+
+    for quantization in ("int8", "binary"):
+        for rescore_factor in args.rescore_factor:
+            store = LocalVectorStore(
+                args.collection,
+                snapshot_dir=args.snapshot_dir,
+                quantization=quantization,
+                rescore_factor=rescore_factor,
+            )
+            result = benchmark(store, queries, args.k, exact["found"])
+            print(
+                f"{quantization:<12} {rescore_factor:>7} {result['recall']:>9.3f} "
+                f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['index_mb']:>9.1f}",
+            )
@@ -49,8 +49,12 @@ async def call_api(query: str, model: str = "qwen3:30b-a3b", intermediate_model:
 
 
 
-async def call_api_batch(queries: list[str], model: str, intermediate_model: str) -> list[str]:
-    return await asyncio.gather(*[
-        call_api(query=query, model=model, intermediate_model=intermediate_model)
-        for query in queries
-    ])
+async def call_api_batch(queries: list[str], model: str, intermediate_model: str, max_concurrency: int = 4) -> list[str]:
+    """Answer queries concurrently, at most `max_concurrency` graph runs at a time."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def bounded_call(query: str) -> str:
+        async with semaphore:
+            return await call_api(query=query, model=model, intermediate_model=intermediate_model)
+
+    return await asyncio.gather(*[bounded_call(query) for query in queries])
@@ -0,0 +1,107 @@
+import tempfile
+
+from pydantic import BaseModel
+
+from classes.ChatSession import BaseChatMessage, ChatSessionFactory
+from classes.SemanticCache import SemanticAnswerCache
+from main import GraphState, _answer_cache_key
+from utils.response_cache import ResponseCache, prompt_fingerprint
+
+
+class Decision(BaseModel):
+    route: str
+
+
+class OtherDecision(BaseModel):
+    route: str
+    confidence: float
+
+
+def test_prompt_fingerprint():
+    """The fingerprint changes with the template and the output schema, a pydantic model hashes as its JSON schema."""
+    fingerprint = prompt_fingerprint("Route {question}", Decision)
+
+    assert fingerprint == prompt_fingerprint("Route {question}", Decision.model_json_schema())
+    assert fingerprint != prompt_fingerprint("Route the question {question}", Decision)
+    assert fingerprint != prompt_fingerprint("Route {question}", OtherDecision)
+    assert fingerprint != prompt_fingerprint("Route {question}")
+
+
+def test_response_cache_key():
+    """Keys are independent of the order of the inputs and differ in every other field."""
+    key = ResponseCache.key("adaptive_decision", "qwen3:4b", 0.3, "prompt", {"question": "q", "latest_conversation_pair": ""})
+
+    assert key == ResponseCache.key("adaptive_decision", "qwen3:4b", 0.30000001, "prompt", {"latest_conversation_pair": "", "question": "q"})
+    assert len({
+        key,
+        ResponseCache.key("query_expansion", "qwen3:4b", 0.3, "prompt", {"question": "q", "latest_conversation_pair": ""}),
+        ResponseCache.key("adaptive_decision", "qwen3:8b", 0.3, "prompt", {"question": "q", "latest_conversation_pair": ""}),
+        ResponseCache.key("adaptive_decision", "qwen3:4b", 0.0, "prompt", {"question": "q", "latest_conversation_pair": ""}),
+        ResponseCache.key("adaptive_decision", "qwen3:4b", 0.3, "other prompt", {"question": "q", "latest_conversation_pair": ""}),
+        ResponseCache.key("adaptive_decision", "qwen3:4b", 0.3, "prompt", {"question": "q", "latest_conversation_pair": "hi"}),
+    }) == 6
+
+
+def test_response_cache_roundtrip():
+    """Stored responses are served for the same key only, a new prompt version drops them and hot temperatures are not cached."""
+    inputs = {"question": "q"}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = ResponseCache(f"{cache_dir}/responses.db", max_temperature=0.5)
+
+        cache.put("adaptive_decision", "qwen3:4b", 0.3, "v1", inputs, Decision(route="research"))
+        assert cache.get("adaptive_decision", "qwen3:4b", 0.3, "v1", inputs) == {"route": "research"}
+        assert cache.get("adaptive_decision", "qwen3:8b", 0.3, "v1", inputs) is None
+
+        cache.put("adaptive_decision", "qwen3:4b", 0.9, "v1", inputs, {"route": "peer_support"})
+        assert cache.get("adaptive_decision", "qwen3:4b", 0.9, "v1", inputs) is None
+
+        assert cache.get("adaptive_decision", "qwen3:4b", 0.3, "v2", inputs) is None
+        assert cache.get("adaptive_decision", "qwen3:4b", 0.3, "v1", inputs) is None
+        assert cache.stats()["adaptive_decision"] == {"hits": 1, "misses": 3, "entries": 0}
+
+
+def test_answer_context_key():
+    """Answers are keyed on the settings that change them and the conversation history, not on the order of the settings."""
+    key = SemanticAnswerCache.make_context_key({"model": "deepseek-v3", "temperature": 0.3}, "USER: hi")
+
+    assert key == SemanticAnswerCache.make_context_key({"temperature": 0.3, "model": "deepseek-v3"}, "USER: hi")
+    assert key != SemanticAnswerCache.make_context_key({"model": "deepseek-v3", "temperature": 0.7}, "USER: hi")
+    assert key != SemanticAnswerCache.make_context_key({"model": "deepseek-v3", "temperature": 0.3}, "USER: hello")
+
+
+def test_answer_cache_key_of_request():
+    """Every setting that changes the answer is part of the key of a request, the running state is not."""
+
+    def state(messages: list[BaseChatMessage] | None = None, **settings) -> GraphState:
+        return GraphState(user_query="q", chat_session=ChatSessionFactory(messages=messages or [], max_messages=6), **settings)
+
+    key = _answer_cache_key(state())
+
+    assert key == _answer_cache_key(state(query_message="expanded q", retry_count=2, stream_answer=True))
+    changed = [
+        {"model": "qwen3:4b"},
+        {"temperature": 0.9},
+        {"doc_number": 10},
+        {"retrieval_mode": "hybrid"},
+        {"merge_knowledge_bases": True},
+        {"accept_similarity": 0.9},
+        {"reject_similarity": 0.2},
+        {"early_exit_grading": True},
+        {"messages": [BaseChatMessage(role="user", content="hi"), BaseChatMessage(role="assistant", content="hello")]},
+    ]
+    assert all(_answer_cache_key(state(**settings)) != key for settings in changed)
+
+    # Sessions sharing their last turn but not their earlier history are not served each other's answers
+    last_turn = [BaseChatMessage(role="user", content="and at night?"), BaseChatMessage(role="assistant", content="Keep a routine.")]
+    sundowning = [BaseChatMessage(role="user", content="My mother is agitated in the evening"), BaseChatMessage(role="assistant", content="That is sundowning."), *last_turn]
+    wandering = [BaseChatMessage(role="user", content="My father wanders off"), BaseChatMessage(role="assistant", content="Secure the doors."), *last_turn]
+    assert _answer_cache_key(state(messages=sundowning)) != _answer_cache_key(state(messages=wandering))
+
+
+if __name__ == "__main__":
+    test_prompt_fingerprint()
+    test_response_cache_key()
+    test_response_cache_roundtrip()
+    test_answer_context_key()
+    test_answer_cache_key_of_request()
+    print("✅ Cache keys")
@@ -0,0 +1,92 @@
+import asyncio
+import gc
+import tempfile
+
+from langchain_core.embeddings import Embeddings
+
+from utils.embedding_cache import EMBEDDING_CACHE_STATS, CachedQueryEmbeddings
+
+
+class PrefixEmbeddings(Embeddings):
+    """Asymmetric fake embedding model, queries and documents of the same text embed differently."""
+
+    def __init__(self) -> None:
+        self.queries: list[str] = []
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [[float(len(text)), 0.0] for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return [float(len(text)), 1.0]
+
+
+def test_hits_skip_the_model():
+    """A repeated query, up to whitespace, is served from memory and embedded as a query exactly once."""
+    model = PrefixEmbeddings()
+    cache = CachedQueryEmbeddings(model, "prefix", max_size=8)
+
+    first = cache.embed_queries(["sundowning tips", "sundowning  tips", "wandering"])
+    assert first == [[15.0, 1.0], [15.0, 1.0], [9.0, 1.0]]
+    assert asyncio.run(cache.aembed_query(" sundowning tips ")) == [15.0, 1.0]
+    assert model.queries == ["sundowning tips", "wandering"]
+    assert cache.stats()["hits"] == 1
+
+    # Returned vectors are copies, a caller changing them does not corrupt the cache
+    first[0][0] = -1.0
+    assert cache.embed_query("sundowning tips") == [15.0, 1.0]
+
+
+def test_disk_tier_survives_restart():
+    """Embeddings written to the SQLite tier are served by a new cache on the same file, per model name."""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        path = f"{cache_dir}/embeddings.db"
+        CachedQueryEmbeddings(PrefixEmbeddings(), "prefix", disk_path=path).embed_query("respite care")
+
+        model = PrefixEmbeddings()
+        restarted = CachedQueryEmbeddings(model, "prefix", disk_path=path)
+        assert asyncio.run(restarted.aembed_queries(["respite care"])) == [[12.0, 1.0]]
+        assert model.queries == []
+        assert restarted.stats()["disk_hits"] == 1
+
+        other = PrefixEmbeddings()
+        CachedQueryEmbeddings(other, "other-model", disk_path=path).embed_query("respite care")
+        assert other.queries == ["respite care"]
+
+
+def test_lru_eviction():
+    """Beyond `max_size` the least recently used query is evicted from memory."""
+    model = PrefixEmbeddings()
+    cache = CachedQueryEmbeddings(model, "prefix", max_size=2)
+
+    cache.embed_queries(["a", "b"])
+    cache.embed_query("a")  # b is now the least recently used
+    cache.embed_query("c")
+    assert cache.stats()["size"] == 2
+
+    cache.embed_queries(["a", "c"])
+    assert model.queries == ["a", "b", "c"]
+    cache.embed_query("b")
+    assert model.queries == ["a", "b", "c", "b"]
+
+
+def test_stats_gauge():
+    """Every live cache is reported once by the module level gauge, dropped caches are not kept alive."""
+    cache = CachedQueryEmbeddings(PrefixEmbeddings(), "gauge-model")
+    cache.embed_query("hello")
+
+    lines = [line for line in EMBEDDING_CACHE_STATS.collect() if 'model="gauge-model"' in line and 'stat="misses"' in line]
+    assert len(lines) == 1
+    assert lines[0].endswith(" 1") or lines[0].endswith(" 1.0")
+
+    del cache
+    gc.collect()
+    assert not any('model="gauge-model"' in line for line in EMBEDDING_CACHE_STATS.collect())
+
+
+if __name__ == "__main__":
+    test_hits_skip_the_model()
+    test_disk_tier_survives_restart()
+    test_lru_eviction()
+    test_stats_gauge()
+    print("✅ Query embedding cache")
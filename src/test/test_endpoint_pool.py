@@ -0,0 +1,99 @@
+import json
+import time
+from collections.abc import Callable
+
+import httpx
+
+from utils.endpoint_pool import EndpointPool
+
+
+def fake_endpoints(down: set[str], status: dict[str, int] | None = None) -> tuple[list[str], Callable]:
+    """Two fake Ollama hosts answering with their own name, hosts in `down` refuse connections.
+
+    `status` maps a host to the HTTP status it answers with, 200 by default.
+    """
+    urls = ["http://gpu-1:11434", "http://gpu-2:11434"]
+    status = status if status is not None else {}
+
+    def factory(url: str) -> tuple[httpx.BaseTransport, httpx.AsyncBaseTransport]:
+        def handler(request: httpx.Request) -> httpx.Response:
+            if url in down:
+                raise httpx.ConnectError("Connection refused", request=request)
+            # Streamed body, the request stays outstanding until the response is closed
+            body = json.dumps({"host": url, "path": request.url.path}).encode()
+            return httpx.Response(status.get(url, 200), content=iter([body]))
+
+        return httpx.MockTransport(handler), httpx.MockTransport(handler)
+
+    return urls, factory
+
+
+def test_least_outstanding_routing():
+    """A request goes to the endpoint with fewer requests in flight."""
+    urls, factory = fake_endpoints(down=set())
+    pool = EndpointPool(urls, transport_factory=factory)
+
+    with httpx.Client(base_url=pool.url, transport=pool.sync_transport()) as client:
+        with client.stream("POST", "/api/chat"):
+            assert pool.stats()[urls[0]]["outstanding"] == 1
+            response = client.post("/api/chat")
+            assert response.json() == {"host": urls[1], "path": "/api/chat"}
+
+    assert all(status["outstanding"] == 0 for status in pool.stats().values())
+
+
+def test_failover_and_recovery():
+    """A refused connection is retried on the other endpoint, the failed one rejoins after a health probe."""
+    down = {"http://gpu-1:11434"}
+    urls, factory = fake_endpoints(down)
+    pool = EndpointPool(urls, cooldown=0.0, transport_factory=factory)
+
+    with httpx.Client(base_url=pool.url, transport=pool.sync_transport()) as client:
+        assert client.post("/api/chat").json()["host"] == urls[1]
+        assert not pool.stats()[urls[0]]["healthy"]
+
+        down.clear()
+        client.post("/api/chat")  # triggers the background probe of the unhealthy endpoint
+        deadline = time.monotonic() + 2
+        while not pool.stats()[urls[0]]["healthy"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert pool.stats()[urls[0]]["healthy"]
+        assert urls[0] in {client.post("/api/chat").json()["host"] for _ in range(2)}
+
+
+def test_server_errors():
+    """A 500 is counted without ejecting the endpoint until it repeats, a gateway error ejects it right away."""
+    status = {"http://gpu-1:11434": 500}
+    urls, factory = fake_endpoints(down=set(), status=status)
+    pool = EndpointPool(urls[:1], cooldown=60.0, max_failures=2, transport_factory=factory)
+
+    with httpx.Client(base_url=pool.url, transport=pool.sync_transport()) as client:
+        assert client.post("/api/chat").status_code == 500
+        assert pool.stats()[urls[0]]["errors"] == 1
+        assert pool.stats()[urls[0]]["healthy"]
+
+        # A success in between resets the run of failures
+        status[urls[0]] = 200
+        client.post("/api/chat")
+        status[urls[0]] = 500
+        client.post("/api/chat")
+        assert pool.stats()[urls[0]]["healthy"]
+
+        client.post("/api/chat")
+        assert not pool.stats()[urls[0]]["healthy"]
+        assert pool.stats()[urls[0]]["errors"] == 3
+
+    urls, factory = fake_endpoints(down=set(), status={"http://gpu-1:11434": 503})
+    pool = EndpointPool(urls, cooldown=60.0, transport_factory=factory)
+    with httpx.Client(base_url=pool.url, transport=pool.sync_transport()) as client:
+        assert client.post("/api/chat").status_code == 503
+        assert not pool.stats()[urls[0]]["healthy"]
+        assert client.post("/api/chat").json()["host"] == urls[1]
+
+
+if __name__ == "__main__":
+    test_least_outstanding_routing()
+    test_failover_and_recovery()
+    test_server_errors()
+    print("✅ Endpoint pool routing and failover")
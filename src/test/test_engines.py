@@ -0,0 +1,26 @@
+import asyncio
+import os
+import tempfile
+from unittest.mock import patch
+
+from utils.tools import dispose_engines, get_engine
+
+
+def test_shared_engine():
+    """Every knowledge base of a connection string shares one pooled engine, configured from `PGVECTOR_POOL_*`."""
+    with tempfile.TemporaryDirectory() as db_dir, patch.dict(os.environ, {"PGVECTOR_POOL_SIZE": "2", "PGVECTOR_POOL_MAX_OVERFLOW": "1"}):
+        research, peer_support = f"sqlite:///{db_dir}/research.db", f"sqlite:///{db_dir}/peer_support.db"
+
+        engine = get_engine(research)
+        assert get_engine(research) is engine
+        assert get_engine(peer_support) is not engine
+        assert engine.pool.size() == 2
+
+        asyncio.run(dispose_engines())
+        assert get_engine(research) is not engine
+        asyncio.run(dispose_engines())
+
+
+if __name__ == "__main__":
+    test_shared_engine()
+    print("✅ Shared database engines")
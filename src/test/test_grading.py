@@ -0,0 +1,80 @@
+import asyncio
+from unittest.mock import patch
+
+from langchain_core.documents import Document
+
+from checkpoints import retrieval_grading
+from checkpoints.retrieval_grading import gate_by_similarity, grade_retrieval_until
+from classes.DocumentAssessment import AnnotatedDocumentEvl
+
+
+def graded_docs(*grades: tuple[int, float]) -> list[Document]:
+    """Documents whose fake grader answers with `relevance_score` after `delay` seconds."""
+    return [Document(id=str(i), page_content=f"doc {i}", metadata={"score": score, "delay": delay}) for i, (score, delay) in enumerate(grades)]
+
+
+def fake_grader(cancelled: list[str]):
+    """Grader standing in for the LLM, records the documents whose grading was cancelled."""
+
+    async def grade(question: str, retrieved_doc: Document, **kwargs) -> AnnotatedDocumentEvl:
+        try:
+            await asyncio.sleep(retrieved_doc.metadata["delay"])
+        except asyncio.CancelledError:
+            cancelled.append(retrieved_doc.id)
+            raise
+        return AnnotatedDocumentEvl(document=retrieved_doc, relevance_score=retrieved_doc.metadata["score"], reasoning="", missing_topics=[])
+
+    return grade
+
+
+def test_gate_by_similarity():
+    """Clear-cut documents are decided by their similarity, the rest and documents without a score are left for grading."""
+    docs = [Document(id=name, page_content=name) for name in ("high", "edge", "middle", "low", "unscored")]
+    scores = {"high": 0.9, "edge": 0.8, "middle": 0.5, "low": 0.1}
+
+    decided, uncertain = gate_by_similarity(docs, scores, accept_above=0.8, reject_below=0.2)
+
+    assert {doc.document.id: doc.relevance_score for doc in decided} == {"high": 5, "edge": 5, "low": 1}
+    assert [doc.id for doc in uncertain] == ["middle", "unscored"]
+
+    # Without thresholds everything goes to the grader
+    decided, uncertain = gate_by_similarity(docs, scores)
+    assert decided == []
+    assert uncertain == docs
+
+
+def test_grade_retrieval_until():
+    """Grading stops once enough documents are relevant, the slower grader calls are cancelled."""
+    docs = graded_docs((5, 0.0), (2, 0.05), (4, 0.1), (5, 1.0), (5, 1.0))
+    cancelled: list[str] = []
+
+    async def run() -> list[AnnotatedDocumentEvl]:
+        graded = await grade_retrieval_until("question", docs, required=2, threshold=4)
+        # The remaining grader calls are cancelled and finished before the function returns
+        assert sorted(cancelled) == ["3", "4"]
+        return graded
+
+    with patch.object(retrieval_grading, "grade_retrieval", fake_grader(cancelled)):
+        graded = asyncio.run(run())
+
+    assert [doc.document.id for doc in graded] == ["0", "2", "1"]
+
+
+def test_grade_retrieval_until_exhausted():
+    """Without enough relevant documents every document is graded, best first."""
+    docs = graded_docs((2, 0.1), (4, 0.05), (1, 0.0))
+    cancelled: list[str] = []
+
+    with patch.object(retrieval_grading, "grade_retrieval", fake_grader(cancelled)):
+        graded = asyncio.run(grade_retrieval_until("question", docs, required=2, threshold=4))
+        assert asyncio.run(grade_retrieval_until("question", docs, required=0, threshold=4)) == []
+
+    assert [doc.relevance_score for doc in graded] == [4, 2, 1]
+    assert cancelled == []
+
+
+if __name__ == "__main__":
+    test_gate_by_similarity()
+    test_grade_retrieval_until()
+    test_grade_retrieval_until_exhausted()
+    print("✅ Similarity gate and early exit grading")
@@ -0,0 +1,73 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+# Budget for `import main` in a fresh interpreter, generous enough for a cold disk cache
+IMPORT_BUDGET_SECONDS = float(os.environ.get("CALM_IMPORT_BUDGET_SECONDS", "5.0"))
+
+# Client libraries that must only be imported when a model is first used
+LAZY_MODULES = ("langchain_ollama", "langchain_deepseek", "langchain_openai", "openai", "ollama")
+
+# Database libraries the in-process vector store backend must run without
+DATABASE_MODULES = ("langchain_postgres", "sqlalchemy", "psycopg")
+
+PROBE = f"""
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": elapsed,
+    "loaded": [name for name in {LAZY_MODULES!r} if name in sys.modules],
+    "resources": {{name: status["state"] for name, status in main.RESOURCES.status().items()}},
+}}))
+"""
+
+
+def measure_import() -> dict:
+    """Import the service module in a fresh interpreter and report the import time and what it loaded."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def loaded_by(module: str) -> list[str]:
+    """Import a module in a fresh interpreter and report which database libraries it loaded."""
+    probe = f"import json, sys; import {module}; print(json.dumps([name for name in {DATABASE_MODULES!r} if name in sys.modules]))"
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=Path(__file__).resolve().parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_time_budget():
+    """Importing the service stays within budget, opens no connections and loads no LLM client library."""
+    report = measure_import()
+
+    assert report["seconds"] < IMPORT_BUDGET_SECONDS, f"import main took {report['seconds']:.2f}s, budget is {IMPORT_BUDGET_SECONDS:.2f}s"
+    assert not report["loaded"], f"LLM client libraries imported eagerly: {report['loaded']}"
+    assert all(state == "pending" for state in report["resources"].values()), f"Resources created at import: {report['resources']}"
+
+
+def test_local_backend_without_database():
+    """The local vector store backend imports neither PGVector nor SQLAlchemy, the PGVector backend still does."""
+    assert loaded_by("classes.LocalVectorStore") == []
+    assert "langchain_postgres" in loaded_by("classes.VectorStore")
+
+
+if __name__ == "__main__":
+    print(measure_import())
+    test_import_time_budget()
+    test_local_backend_without_database()
+    print("✅ Import time within budget")
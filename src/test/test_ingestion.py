@@ -0,0 +1,82 @@
+import tempfile
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import ingestion
+from classes.LocalVectorStore import LocalVectorStore
+from ingestion import ingest
+
+DOCUMENTS = [Document(page_content=f"caregiving tip {i}", metadata={"source": f"https://example.org/{i}"}) for i in range(10)]
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Deterministic fake embedding model counting the embedded documents."""
+
+    embedded: int = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def interrupted(function: Callable, calls: int) -> Callable:
+    """Wrap `function` to raise on call number `calls`, every earlier call passes through."""
+    seen: list[int] = []
+
+    def call(*args, **kwargs):  # noqa: ANN002, ANN003, ANN202
+        seen.append(1)
+        if len(seen) == calls:
+            raise KeyboardInterrupt
+        return function(*args, **kwargs)
+
+    return call
+
+
+def store(snapshot_dir: str) -> LocalVectorStore:
+    return LocalVectorStore("kb", snapshot_dir, CountingEmbeddings(size=8))
+
+
+def test_resume_after_failed_batch():
+    """A run interrupted while storing its second batch resumes after the first and stores every document once."""
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        checkpoint = Path(snapshot_dir) / "kb.checkpoint"
+        first = store(snapshot_dir)
+        with patch.object(first, "add_embeddings", interrupted(first.add_embeddings, 2)), pytest.raises(KeyboardInterrupt):
+            ingest(first, DOCUMENTS, batch_size=3, workers=1, checkpoint=checkpoint)
+        assert len(store(snapshot_dir)) == 3
+
+        resumed = store(snapshot_dir)
+        stats = ingest(resumed, DOCUMENTS, batch_size=3, workers=1, checkpoint=checkpoint)
+
+        assert stats["processed"] == 10
+        assert stats["upserted"] == 7
+        assert resumed._embedding_model.embedded == 7  # noqa: SLF001
+        assert len(resumed) == 10
+
+        # A finished ingestion resumes past the end of the input
+        assert ingest(store(snapshot_dir), DOCUMENTS, batch_size=3, checkpoint=checkpoint)["upserted"] == 0
+
+
+def test_resume_before_checkpoint_written():
+    """A batch stored but not checkpointed is upserted again on resume, by id, without duplicating its documents."""
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        checkpoint = Path(snapshot_dir) / "kb.checkpoint"
+        with patch.object(ingestion, "_write_checkpoint", interrupted(ingestion._write_checkpoint, 2)), pytest.raises(KeyboardInterrupt):  # noqa: SLF001
+            ingest(store(snapshot_dir), DOCUMENTS, batch_size=3, workers=2, checkpoint=checkpoint)
+        assert len(store(snapshot_dir)) == 6
+
+        stats = ingest(store(snapshot_dir), DOCUMENTS, batch_size=3, workers=2, checkpoint=checkpoint)
+
+        assert stats["upserted"] == 7
+        assert len(store(snapshot_dir)) == 10
+
+
+if __name__ == "__main__":
+    test_resume_after_failed_batch()
+    test_resume_before_checkpoint_written()
+    print("✅ Ingestion checkpoint and resume")
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+from collections.abc import Iterator
+from contextlib import contextmanager
+from functools import partial
+from unittest.mock import patch
+
+import httpx
+import langchain_deepseek
+import langchain_ollama
+
+from utils import llm_clients
+from utils.llm_clients import LLMClientRegistry
+
+
+class StubChatModel:
+    """Stands in for the chat model classes, keeps the arguments it was created with."""
+
+    def __init__(self, **kwargs) -> None:  # noqa: ANN003
+        self.kwargs = kwargs
+
+
+def backend_of(model: str) -> str:
+    return "deepseek" if model.startswith("deepseek") else "ollama"
+
+
+def registry(**kwargs) -> LLMClientRegistry:  # noqa: ANN003
+    return LLMClientRegistry(backend_resolver=backend_of, **kwargs)
+
+
+@contextmanager
+def stub_clients() -> Iterator[None]:
+    """Replace the Ollama and DeepSeek chat model classes with `StubChatModel`."""
+    with patch.object(langchain_ollama, "ChatOllama", StubChatModel), patch.object(langchain_deepseek, "ChatDeepSeek", StubChatModel):
+        yield
+
+
+def test_lru_eviction():
+    """Beyond `max_clients` the least recently used client is dropped, a later request creates a new one."""
+    clients = registry(max_clients=2)
+    with stub_clients():
+        first = clients.get("qwen3:4b", 0.3)
+        second = clients.get("deepseek-chat", 0.3)
+        assert clients.get("qwen3:4b", 0.3) is first  # deepseek-chat is now the least recently used
+        clients.get("qwen3:4b", 0.0)
+
+        assert clients.get("qwen3:4b", 0.3) is first
+        assert clients.get("deepseek-chat", 0.3) is not second
+        assert clients.evict("qwen3:4b") == 1
+        assert clients.evict() == 1
+
+
+def test_stats_handler_shared_per_model():
+    """Every temperature of a model reports to one stats handler, which outlives the eviction of its clients."""
+    clients = registry()
+    with stub_clients():
+        cold, warm = clients.get("qwen3:4b", 0.0), clients.get("qwen3:4b", 0.7)
+        other = clients.get("deepseek-chat", 0.7)
+        clients.evict("qwen3:4b")
+        recreated = clients.get("qwen3:4b", 0.0)
+
+    handler = cold.kwargs["callbacks"][0]
+    assert cold is not warm
+    assert warm.kwargs["callbacks"][0] is handler
+    assert recreated.kwargs["callbacks"][0] is handler
+    assert other.kwargs["callbacks"][0] is not handler
+    assert (handler.backend, handler.model) == ("ollama", "qwen3:4b")
+    assert set(clients.stats()) == {"qwen3:4b", "deepseek-chat"}
+    # Clients of a model share one pooled transport regardless of temperature
+    assert cold.kwargs["base_url"] == warm.kwargs["base_url"]
+
+
+def test_awarm():
+    """Every host of an Ollama model gets a load request, DeepSeek a model list request, failures report None."""
+    requests: list[tuple[str, str, str | None]] = []
+
+    def factory(url: str) -> tuple[httpx.BaseTransport, httpx.AsyncBaseTransport]:
+        def handler(request: httpx.Request) -> httpx.Response:
+            model = json.loads(request.content)["model"] if request.content else None
+            requests.append((url, request.url.path, model))
+            return httpx.Response(404 if model == "missing" else 200, json={})
+
+        return httpx.MockTransport(handler), httpx.MockTransport(handler)
+
+    def deepseek(request: httpx.Request) -> httpx.Response:
+        requests.append(("deepseek", request.url.path, None))
+        return httpx.Response(200, json={"data": []})
+
+    hosts = {"qwen3:4b": ["http://gpu-1:11434", "http://gpu-2:11434"], "missing": ["http://gpu-1:11434"]}
+    clients = registry()
+    http_clients = (httpx.Client(transport=httpx.MockTransport(deepseek)), httpx.AsyncClient(transport=httpx.MockTransport(deepseek)))
+    with (
+        patch.dict(os.environ, {"OLLAMA_MODEL_HOSTS": json.dumps(hosts), "DEEPSEEK_API_BASE": "https://deepseek.test"}),
+        patch.object(llm_clients, "EndpointPool", partial(llm_clients.EndpointPool, transport_factory=factory)),
+        patch.object(clients, "_deepseek_http_clients", return_value=http_clients),
+    ):
+        latencies = asyncio.run(clients.awarm(["qwen3:4b", "deepseek-chat", "missing"]))
+        asyncio.run(clients.aclose())
+
+    assert latencies["qwen3:4b"] is not None
+    assert latencies["deepseek-chat"] is not None
+    assert latencies["missing"] is None
+    assert requests == [
+        ("http://gpu-1:11434", "/api/generate", "qwen3:4b"),
+        ("http://gpu-2:11434", "/api/generate", "qwen3:4b"),
+        ("deepseek", "/models", None),
+        ("http://gpu-1:11434", "/api/generate", "missing"),
+    ]
+
+
+if __name__ == "__main__":
+    test_lru_eviction()
+    test_stats_handler_shared_per_model()
+    test_awarm()
+    print("✅ LLM client registry")
@@ -0,0 +1,84 @@
+import tempfile
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import FakeEmbeddings
+
+from classes.LocalVectorStore import LocalVectorStore
+from utils.quantization import hamming_distances, int8_similarities, quantize_binary, quantize_int8, shortlist
+
+
+def unit_vectors(rows: int, dims: int = 64, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(rows, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_int8_quantization():
+    """int8 codes reconstruct every value within half a quantization step, their similarities track the exact ones."""
+    matrix = unit_vectors(200)
+    codes, scale = quantize_int8(matrix)
+
+    assert codes.dtype == np.int8
+    assert np.all(np.abs(codes.astype(np.float32) * scale - matrix) <= scale / 2 + 1e-6)
+
+    queries = unit_vectors(3, seed=1)
+    approximate = int8_similarities(codes, scale, queries, chunk_size=64)
+    assert approximate.shape == (3, 200)
+    assert np.allclose(approximate, queries @ matrix.T, atol=0.05)
+
+    # A constant zero dimension keeps a unit scale instead of dividing by zero
+    _, scale = quantize_int8(np.zeros((2, 4), dtype=np.float32))
+    assert np.all(scale == 1.0)
+
+
+def test_binary_quantization():
+    """Binary codes keep the sign bit of every dimension, Hamming distances count the differing signs."""
+    matrix = np.array([[1.0, -1.0, 1.0, -1.0, 1.0, 1.0, 1.0, 1.0, -1.0], [-1.0] * 9], dtype=np.float32)
+    codes = quantize_binary(matrix)
+
+    assert codes.shape == (2, 2)
+    assert codes.dtype == np.uint8
+
+    distances = hamming_distances(codes, matrix[:1], chunk_size=1)
+    assert distances.tolist() == [[0, 6]]
+
+
+def test_shortlist():
+    scores = np.array([[0.1, 0.9, 0.5, 0.7], [4.0, 1.0, 3.0, 2.0]])
+
+    assert [set(row) for row in shortlist(scores, 2)] == [{1, 3}, {0, 2}]
+    assert [set(row) for row in shortlist(scores, 2, largest=False)] == [{0, 2}, {1, 3}]
+    assert shortlist(scores, 10).shape == (2, 4)
+
+
+def test_rescore_matches_exact_search():
+    """Shortlisted candidates are re-scored with the full vectors, scores and order are those of the exact search."""
+    embeddings = unit_vectors(300)
+    documents = [Document(id=str(i), page_content=f"doc {i}") for i in range(len(embeddings))]
+    queries = embeddings[:5] + np.random.default_rng(2).normal(scale=0.05, size=(5, embeddings.shape[1])).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        LocalVectorStore.write_snapshot(f"{snapshot_dir}/kb", zip(documents, embeddings.tolist()))
+        fake = FakeEmbeddings(size=embeddings.shape[1])
+        exact = LocalVectorStore("kb", snapshot_dir, fake).similarity_search_by_vectors(queries, k=5)
+
+        for quantization in ("int8", "binary"):
+            # Every row is a candidate, so the re-scored results must equal the exact ones
+            store = LocalVectorStore("kb", snapshot_dir, fake, quantization=quantization, rescore_factor=len(documents))
+            for results, expected in zip(store.similarity_search_by_vectors(queries, k=5), exact):
+                assert [doc.id for doc, _ in results] == [doc.id for doc, _ in expected]
+                assert np.allclose([score for _, score in results], [score for _, score in expected])
+
+            # A short list still finds the perturbed source document of every query, with its exact score
+            store = LocalVectorStore("kb", snapshot_dir, fake, quantization=quantization, rescore_factor=4)
+            for i, results in enumerate(store.similarity_search_by_vectors(queries, k=5)):
+                assert results[0][0].id == str(i)
+                assert np.isclose(results[0][1], exact[i][0][1])
+
+
+if __name__ == "__main__":
+    test_int8_quantization()
+    test_binary_quantization()
+    test_shortlist()
+    test_rescore_matches_exact_search()
+    print("✅ Quantized search and exact re-scoring")
@@ -0,0 +1,68 @@
+from langchain_core.documents import Document
+
+from utils.tools import diversify_by_source, merge_weighted_results, reciprocal_rank_fusion
+
+
+def doc(name: str, source: str | None = None) -> Document:
+    """A document with a fixed id, and a source URL when given."""
+    return Document(id=name, page_content=name, metadata={"source": source} if source else {})
+
+
+def ids(scored_docs: list[tuple[Document, float]]) -> list[str]:
+    return [document.id for document, _ in scored_docs]
+
+
+def test_reciprocal_rank_fusion():
+    """Documents found by both retrievers rise to the top, each keeps the score of the first ranking it appears in."""
+    vector = [(doc("a"), 0.9), (doc("b"), 0.8), (doc("c"), 0.7)]
+    lexical = [(doc("c"), 12.0), (doc("d"), 11.0), (doc("b"), 10.0)]
+
+    fused = reciprocal_rank_fusion([vector, lexical], k=3)
+
+    # b: 1/62 + 1/63, c: 1/63 + 1/61, a: 1/61
+    assert ids(fused) == ["c", "b", "a"]
+    assert dict((document.id, score) for document, score in fused) == {"c": 0.7, "b": 0.8, "a": 0.9}
+
+    # Ties keep the order of the first ranking
+    assert ids(reciprocal_rank_fusion([[(doc("x"), 0.5), (doc("y"), 0.4)], [(doc("y"), 0.3), (doc("x"), 0.2)]], k=2)) == ["x", "y"]
+    assert reciprocal_rank_fusion([[], []], k=3) == []
+
+
+def test_diversify_by_source():
+    """Only the best document of each source is kept, documents without a source are all distinct."""
+    scored = [
+        (doc("a1", "https://nia.nih.gov/a"), 0.9),
+        (doc("a2", "https://nia.nih.gov/a"), 0.8),
+        (doc("n1"), 0.7),
+        (doc("b1", "https://alz.org/b"), 0.6),
+        (doc("n2"), 0.5),
+    ]
+
+    assert ids(diversify_by_source(scored, k=10)) == ["a1", "n1", "b1", "n2"]
+    assert ids(diversify_by_source(scored, k=2)) == ["a1", "n1"]
+
+
+def test_merge_weighted_results():
+    """Raw similarities are weighted per knowledge base, a weak result list is not stretched to the range of a strong one."""
+    research = [(doc("r1"), 0.9), (doc("r2"), 0.5), (doc("shared"), 0.4)]
+    peer_support = [(doc("p1"), 0.35), (doc("p2"), 0.3), (doc("shared"), 0.9)]
+
+    merged = merge_weighted_results([(research, 1.0), (peer_support, 0.5)], k=4)
+
+    # Weighted: r1 0.9, r2 0.5, shared max(0.4, 0.45), p1 0.175, p2 0.15
+    assert ids(merged) == ["r1", "r2", "shared", "p1"]
+    # Each document keeps its original score, a duplicate the one of its best weighted hit
+    assert [score for _, score in merged] == [0.9, 0.5, 0.9, 0.35]
+
+    assert ids(merge_weighted_results([([], 1.0), (peer_support, 0.5)], k=1)) == ["shared"]
+
+    # A low weight never promotes a negative similarity: unclamped, -0.6 * 0.5 would outrank -0.5 * 1.0
+    merged = merge_weighted_results([([(doc("dissimilar"), -0.5)], 1.0), ([(doc("opposite"), -0.6)], 0.5)], k=2)
+    assert ids(merged) == ["dissimilar", "opposite"]
+    assert [score for _, score in merged] == [-0.5, -0.6]
+
+if __name__ == "__main__":
+    test_reciprocal_rank_fusion()
+    test_diversify_by_source()
+    test_merge_weighted_results()
+    print("✅ Rank fusion and merging")
@@ -0,0 +1,130 @@
+import asyncio
+from collections.abc import Collection
+from unittest.mock import AsyncMock, patch
+
+from langchain_core.documents import Document
+
+import main
+from classes.AdaptiveDecision import AdaptiveDecision
+from classes.ChatSession import ChatSessionFactory
+from classes.DocumentAssessment import AnnotatedDocumentEvl
+from main import GraphState, detect_intention, grade_documents, retrieve_documents
+
+
+class FakeKnowledgeBase:
+    """Knowledge base over a fixed ranking answering after `delay` seconds, records the excluded ids of every search."""
+
+    def __init__(self, *names: str, delay: float = 0.0) -> None:
+        self.ranking = [(Document(id=name, page_content=name), 0.5) for name in names]
+        self.delay = delay
+        self.excluded: list[set[str]] = []
+        self.cancelled = 0
+
+    async def asearch_with_score(self, query: str, k: int, exclude_ids: Collection[str] = (), **kwargs) -> list[tuple[Document, float]]:
+        self.excluded.append(set(exclude_ids))
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return [(doc, score) for doc, score in self.ranking if doc.id not in exclude_ids][:k]
+
+
+def fake_grader(graded: list[str]):
+    """Batch grader standing in for the LLM, records the graded document ids and finds every document irrelevant."""
+
+    async def grade(question: str, docs: list[Document], **kwargs) -> list[AnnotatedDocumentEvl]:
+        graded.extend(doc.id for doc in docs)
+        return [AnnotatedDocumentEvl(document=doc, relevance_score=1, reasoning="", missing_topics=["respite"]) for doc in docs]
+
+    return grade
+
+
+async def iterate(state: GraphState) -> GraphState:
+    """Run one retrieval and grading iteration of the workflow on `state`."""
+    state = state.model_copy(update=await retrieve_documents(state))
+    return state.model_copy(update=await grade_documents(state))
+
+
+def new_state(**settings) -> GraphState:  # noqa: ANN003
+    return GraphState(user_query="q", query_message="q", doc_number=2, chat_session=ChatSessionFactory(messages=[], max_messages=6), **settings)
+
+
+def decide(decision: AdaptiveDecision):  # noqa: ANN201
+    """Intention detection standing in for the LLM, answers once the speculative searches are in flight."""
+
+    async def adaptive_rag_decision(**kwargs) -> AdaptiveDecision:  # noqa: ANN003
+        await asyncio.sleep(0.01)
+        return decision
+
+    return adaptive_rag_decision
+
+
+def test_speculative_prefetch_used():
+    """The search of the chosen knowledge base started during intention detection serves the first retrieval."""
+    research, peer_support = FakeKnowledgeBase("r1", "r2", "r3"), FakeKnowledgeBase("p1", delay=1.0)
+    state = new_state(speculative_retrieval=True)
+
+    async def run() -> tuple[dict, dict, dict]:
+        update = await detect_intention(state)
+        # The other knowledge base is cancelled and finished before the node returns
+        assert peer_support.cancelled == 1
+        prefetched = state.model_copy(update=update)
+        return update, await retrieve_documents(prefetched), await retrieve_documents(prefetched.model_copy(update={"retry_count": 1}))
+
+    decision = AdaptiveDecision(require_extra_re=True, knowledge_base="research")
+    with patch.object(main, "_aknowledge_bases", AsyncMock(return_value=(peer_support, research))), patch.object(main, "aadaptive_rag_decision", decide(decision)):
+        update, first, retry = asyncio.run(run())
+
+    assert [doc.id for doc in update["prefetched_docs"]] == ["r1", "r2"]
+    assert [doc.id for doc in first["retrieved_docs"]] == ["r1", "r2"]
+    assert first["prefetched_docs"] == []
+    # Only a retry searches again, the first retrieval reused the speculative search
+    assert len(research.excluded) == 2
+    assert [doc.id for doc in retry["retrieved_docs"]] == ["r1", "r2"]
+
+
+def test_speculative_prefetch_cancelled_when_informal():
+    """An informal question needs no retrieval, both speculative searches are cancelled and nothing is prefetched."""
+    research, peer_support = FakeKnowledgeBase("r1", delay=1.0), FakeKnowledgeBase("p1", delay=1.0)
+
+    async def run() -> dict:
+        update = await detect_intention(new_state(speculative_retrieval=True))
+        assert (research.cancelled, peer_support.cancelled) == (1, 1)
+        return update
+
+    with patch.object(main, "_aknowledge_bases", AsyncMock(return_value=(peer_support, research))), patch.object(main, "aadaptive_rag_decision", decide(AdaptiveDecision())):
+        update = asyncio.run(run())
+
+    assert update == {"adaptive_decision": AdaptiveDecision()}
+
+
+def test_graded_documents_memoized():
+    """Documents graded in the first iteration are neither fetched nor graded again in the second."""
+    kb = FakeKnowledgeBase("a", "b", "c", "d")
+    graded: list[str] = []
+    state = new_state()
+
+    with patch.object(main, "_aselect_knowledge_base", AsyncMock(return_value=kb)), patch.object(main, "grade_retrieval_batch", fake_grader(graded)):
+        state = asyncio.run(iterate(state))
+        assert graded == ["a", "b"]
+
+        state = asyncio.run(iterate(state.model_copy(update={"query_message": "q respite"})))
+        assert kb.excluded == [set(), {"a", "b"}]
+        assert [doc.id for doc in state.retrieved_docs] == ["c", "d"]
+        assert graded == ["a", "b", "c", "d"]
+
+        # A memoized document retrieved again, e.g. speculatively, reuses its grade
+        state = state.model_copy(update={"retrieved_docs": [Document(id="a", page_content="a")]})
+        update = asyncio.run(grade_documents(state))
+
+    assert graded == ["a", "b", "c", "d"]
+    assert set(update["graded_docs"]) == {"a", "b", "c", "d"}
+    assert update["missing_topics"] == ["respite"]
+
+
+if __name__ == "__main__":
+    test_speculative_prefetch_used()
+    test_speculative_prefetch_cancelled_when_informal()
+    test_graded_documents_memoized()
+    print("✅ Speculative retrieval and grading memoized across retrieval iterations")
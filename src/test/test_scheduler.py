@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from utils.scheduler import BackendQueue, Priority
+
+
+async def run_in_priority_order() -> list[str]:
+    """Queue calls of every priority behind a busy slot, returns the order they got the slot in."""
+    queue = BackendQueue("ollama", limit=1)
+    await queue.acquire(Priority.GRADING)
+    served: list[str] = []
+
+    async def call(name: str, priority: Priority) -> None:
+        await queue.acquire(priority)
+        served.append(name)
+        queue.release()
+
+    calls = [
+        ("grading-1", Priority.GRADING),
+        ("expansion", Priority.EXPANSION),
+        ("grading-2", Priority.GRADING),
+        ("generation", Priority.GENERATION),
+        ("decision", Priority.DECISION),
+    ]
+    tasks = [asyncio.create_task(call(name, priority)) for name, priority in calls]
+    await asyncio.sleep(0)
+    assert queue.depth() == {Priority.GENERATION: 1, Priority.DECISION: 1, Priority.EXPANSION: 1, Priority.GRADING: 2}
+
+    queue.release()
+    await asyncio.gather(*tasks)
+    assert queue.active == 0
+    return served
+
+
+async def cancel_waiter() -> tuple[int, dict[Priority, int]]:
+    """Cancel a waiting call, the slot skips it and is freed once released."""
+    queue = BackendQueue("ollama", limit=1)
+    await queue.acquire(Priority.GENERATION)
+    waiter = asyncio.create_task(queue.acquire(Priority.GENERATION))
+    await asyncio.sleep(0)
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    queue.release()
+    return queue.active, queue.depth()
+
+
+def test_priority_order():
+    """Waiting calls get the slot by priority, calls of the same priority first come first served."""
+    assert asyncio.run(run_in_priority_order()) == ["generation", "decision", "expansion", "grading-1", "grading-2"]
+
+
+def test_cancelled_waiter():
+    """A cancelled waiter neither holds nor leaks a slot."""
+    active, depth = asyncio.run(cancel_waiter())
+    assert active == 0
+    assert not any(depth.values())
+
+
+def test_invalid_limit():
+    with pytest.raises(ValueError):
+        BackendQueue("ollama", limit=0)
+
+
+if __name__ == "__main__":
+    test_priority_order()
+    test_cancelled_waiter()
+    test_invalid_limit()
+    print("✅ LLM scheduler priority queue")
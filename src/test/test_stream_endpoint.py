@@ -0,0 +1,123 @@
+import asyncio
+import json
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+import main
+from checkpoints import answer_generation
+from checkpoints.answer_generation import _ReasoningFilter, astream_answer
+from classes.AdaptiveDecision import AdaptiveDecision
+from utils.Models import llm_scheduler
+
+ANSWER = "<think>The caregiver is worried, reassure first.</think>\n\nEvening agitation is common. Keep a calm routine."
+
+
+class FailingChatModel(GenericFakeChatModel):
+    """Fake chat model whose stream breaks after its first tokens."""
+
+    async def _astream(self, *args: Any, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:  # noqa: ANN401
+        yield ChatGenerationChunk(message=AIMessageChunk(content="Evening "))
+        raise ConnectionError("model host went away")
+
+
+def fake_llm(answer: str = ANSWER, *, fail: bool = False):
+    """Replacement of `_get_llm` streaming a fixed answer, or failing mid-stream."""
+
+    def get_llm(model: str, temperature: float) -> GenericFakeChatModel:
+        messages: Iterator[AIMessage] = iter([AIMessage(content=answer)])
+        return FailingChatModel(messages=messages) if fail else GenericFakeChatModel(messages=messages)
+
+    return get_llm
+
+
+async def informal_decision(**kwargs: Any) -> AdaptiveDecision:  # noqa: ANN401
+    return AdaptiveDecision(require_extra_re=False, knowledge_base="NA")
+
+
+def stream_events(**llm_kwargs: Any) -> list[tuple[str, dict]]:  # noqa: ANN401
+    """Call the streaming endpoint on the direct answer path, returns the server-sent events in order."""
+    with patch.object(main, "aadaptive_rag_decision", informal_decision), patch.object(answer_generation, "_get_llm", fake_llm(**llm_kwargs)):
+        response = TestClient(main.fastapi_app).post(
+            "/ask-calm-adrd-agent/stream",
+            json={"user_query": "My mother gets agitated in the evening", "bypass_cache": True},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_stream_events():
+    """Tokens arrive before the answer node completes, the final event carries the full answer without reasoning."""
+    events = stream_events()
+    names = [event for event, _ in events]
+
+    assert names[0] == "node"
+    assert events[0][1] == {"node": "detect_intention", "status": "completed"}
+    assert names.index("token") < names.index("node", 1)
+    assert names[-2:] == ["node", "final"]
+    assert events[-2][1] == {"node": "generate_answer", "status": "completed"}
+
+    streamed = "".join(data["delta"] for event, data in events if event == "token")
+    assert streamed == "Evening agitation is common. Keep a calm routine."
+    assert events[-1][1]["answer"] == streamed
+    assert "think" not in streamed
+
+
+def test_stream_error():
+    """A model failing mid-stream ends with an error event, never with a final answer."""
+    events = stream_events(fail=True)
+    names = [event for event, _ in events]
+
+    assert "token" in names
+    assert names[-1] == "error"
+    assert "model host went away" in events[-1][1]["message"]
+    assert "final" not in names
+
+
+def test_slot_released_before_consumer():
+    """The generation slot is released once the model is done, even while the consumer has not read the answer."""
+
+    async def run() -> tuple[int, int]:
+        with patch.object(answer_generation, "_get_llm", fake_llm()):
+            stream = astream_answer("question", model="fake-stream-model", isInformal=True)
+            await anext(stream)
+            await asyncio.sleep(0.05)
+            active = llm_scheduler.queue(llm_scheduler._backend_resolver("fake-stream-model")).active  # noqa: SLF001
+            rest = [chunk async for chunk in stream]
+        return active, len(rest)
+
+    active, rest = asyncio.run(run())
+    assert active == 0
+    assert rest > 1
+
+
+def test_reasoning_filter():
+    """Reasoning blocks are dropped even when their tags are split across deltas."""
+    reasoning = _ReasoningFilter()
+    deltas = ["<th", "ink>draft ", "only</th", "ink>\n\nHello", " <", "b>there</b>"]
+    text = "".join(reasoning.feed(delta) for delta in deltas) + reasoning.flush()
+    assert text == "Hello <b>there</b>"
+
+    reasoning = _ReasoningFilter()
+    assert reasoning.feed("Plain answer <") + reasoning.flush() == "Plain answer <"
+    reasoning = _ReasoningFilter()
+    assert reasoning.feed("<think>never closed") + reasoning.flush() == ""
+
+
+if __name__ == "__main__":
+    test_stream_events()
+    test_stream_error()
+    test_slot_released_before_consumer()
+    test_reasoning_filter()
+    print("✅ Streaming endpoint")
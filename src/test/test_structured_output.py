@@ -0,0 +1,244 @@
+import asyncio
+import os
+from collections.abc import Callable
+from typing import Any
+from unittest.mock import AsyncMock, patch
+
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from utils.metrics import LLM_LATENCY
+from utils.Models import llm_scheduler
+from utils.scheduler import Priority
+from utils.structured_output import RetryPolicy, StructuredOutput, StructuredOutputError, ainvoke_structured, invoke_structured
+
+HEDGE_POLICY = RetryPolicy(max_attempts=1, timeout=5.0, hedge_quantile=0.5, hedge_model="hedge", hedge_min_samples=1)
+
+
+class FakeModels:
+    """Fake structured output chains, every model answers after a delay with a value or an exception.
+
+    Calls, finished calls and cancelled calls are recorded by model name.
+    """
+
+    def __init__(self, answers: dict[str, tuple[float, Any]]) -> None:
+        self.answers = answers
+        self.calls: list[str] = []
+        self.finished: list[str] = []
+        self.cancelled: list[str] = []
+
+    def build_chain(self, model: str) -> Runnable:
+        async def answer(inputs: dict) -> Any:  # noqa: ANN401
+            self.calls.append(model)
+            delay, value = self.answers[model]
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancelled.append(model)
+                raise
+            self.finished.append(model)
+            if isinstance(value, Exception):
+                raise value
+            return value
+
+        return RunnableLambda(answer)
+
+
+def is_answer(value: Any) -> bool:  # noqa: ANN401
+    return isinstance(value, str) and value.startswith("answer")
+
+
+def hedged(task: str, models: FakeModels, policy: RetryPolicy = HEDGE_POLICY) -> StructuredOutput:
+    """Run a hedged call of `task` on the `primary` model, its recent latency puts the hedge delay at 50ms."""
+    for _ in range(3):
+        LLM_LATENCY.observe(0.05, task=task, model="primary")
+
+    async def run() -> StructuredOutput:
+        output = await ainvoke_structured(task, models.build_chain, {}, "primary", is_answer, Priority.DECISION, policy)
+        # Losing calls are cancelled and finished by the time the call returns, their slots are free
+        assert all(llm_scheduler.queue(llm_scheduler._backend_resolver(model)).active == 0 for model in models.answers)  # noqa: SLF001
+        return output
+
+    return asyncio.run(run())
+
+
+def test_primary_wins():
+    """A primary answering before the hedge delay never sends a hedge request."""
+    models = FakeModels({"primary": (0.0, "answer primary"), "hedge": (0.0, "answer hedge")})
+
+    assert hedged("hedge_primary_wins", models) == StructuredOutput("answer primary", "primary")
+    assert models.calls == ["primary"]
+
+
+def test_hedge_wins():
+    """A stalled primary is hedged after the delay, the hedge answer wins and the primary is cancelled before returning."""
+    models = FakeModels({"primary": (2.0, "answer primary"), "hedge": (0.0, "answer hedge")})
+
+    assert hedged("hedge_hedge_wins", models) == StructuredOutput("answer hedge", "hedge")
+    assert models.calls == ["primary", "hedge"]
+    assert models.cancelled == ["primary"]
+
+
+def test_failed_hedge_waits_for_primary():
+    """A failing hedge does not end the call, the primary answer is still awaited."""
+    models = FakeModels({"primary": (0.2, "answer primary"), "hedge": (0.0, ConnectionError("hedge host down"))})
+
+    assert hedged("hedge_hedge_fails", models) == StructuredOutput("answer primary", "primary")
+    assert models.finished == ["hedge", "primary"]
+
+
+def test_both_fail_fallback_model():
+    """When primary and hedge both fail the attempt is spent and the fallback model answers."""
+    models = FakeModels({
+        "primary": (0.2, "not an answer"),
+        "hedge": (0.0, ConnectionError("hedge host down")),
+        "fallback": (0.0, "answer fallback"),
+    })
+    policy = RetryPolicy(**{**HEDGE_POLICY.__dict__, "fallback_model": "fallback", "base_delay": 0.0})
+
+    assert hedged("hedge_both_fail", models, policy) == StructuredOutput("answer fallback", "fallback")
+    assert models.calls == ["primary", "hedge", "fallback"]
+    assert models.cancelled == []
+
+
+HANG = object()
+
+
+def flaky(outcomes: dict[str, list[Any]], calls: list[str]) -> Callable[[str], Runnable]:
+    """Chains answering every call of a model with its next outcome: a value, an exception or `HANG`."""
+
+    def build_chain(model: str) -> Runnable:
+        async def answer(inputs: dict) -> Any:  # noqa: ANN401
+            calls.append(model)
+            outcome = outcomes[model].pop(0)
+            if outcome is HANG:
+                await asyncio.Event().wait()
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        return RunnableLambda(answer)
+
+    return build_chain
+
+
+def retried(task: str, outcomes: dict[str, list[Any]], policy: RetryPolicy) -> tuple[StructuredOutput | BaseException, list[str], list[float]]:
+    """Run a call of `task` on the `primary` model with backoff sleeps patched out.
+
+    Returns the output or raised error, the model of every attempt and the requested backoff delays.
+    """
+    calls: list[str] = []
+    sleep = AsyncMock()
+    with patch("utils.structured_output.asyncio.sleep", sleep):
+        try:
+            output = asyncio.run(ainvoke_structured(task, flaky(outcomes, calls), {}, "primary", is_answer, Priority.DECISION, policy))
+        except StructuredOutputError as e:
+            output = e
+    return output, calls, [call.args[0] for call in sleep.await_args_list]
+
+
+def test_retry_until_valid():
+    """Errors and invalid answers are retried within the budget, with a bounded backoff before every retry."""
+    policy = RetryPolicy(max_attempts=3, timeout=None, base_delay=0.5, max_delay=0.75)
+    output, calls, sleeps = retried("retry_until_valid", {"primary": [ConnectionError("refused"), "not an answer", "answer"]}, policy)
+
+    assert output == StructuredOutput("answer", "primary")
+    assert calls == ["primary"] * 3
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 0.5
+    assert 0 <= sleeps[1] <= 0.75
+
+
+def test_retry_budget_exhausted():
+    """Once every attempt failed the call raises, chained to the last error."""
+    policy = RetryPolicy(max_attempts=2, timeout=None, base_delay=0.0)
+    output, calls, _ = retried("retry_exhausted", {"primary": [ConnectionError("refused"), ValueError("bad json")]}, policy)
+
+    assert isinstance(output, StructuredOutputError)
+    assert isinstance(output.__cause__, ValueError)
+    assert calls == ["primary", "primary"]
+
+
+def test_timeout_then_fallback_model():
+    """A hanging attempt times out, once the budget is spent the fallback model answers without another backoff."""
+    policy = RetryPolicy(max_attempts=2, timeout=0.05, base_delay=0.1, fallback_model="fallback")
+    output, calls, sleeps = retried("retry_fallback", {"primary": [HANG, HANG], "fallback": ["answer from fallback"]}, policy)
+
+    assert output == StructuredOutput("answer from fallback", "fallback")
+    assert calls == ["primary", "primary", "fallback"]
+    assert len(sleeps) == 1
+    assert policy.models("primary") == ["primary", "primary", "fallback"]
+    assert policy.models("fallback") == ["fallback", "fallback"]
+
+
+def test_invoke_structured():
+    """The synchronous executor shares the retry budget and the fallback model."""
+    calls: list[str] = []
+    outcomes = {"primary": [ConnectionError("refused"), ConnectionError("refused")], "fallback": ["answer"]}
+
+    def build_chain(model: str) -> Runnable:
+        def answer(inputs: dict) -> Any:  # noqa: ANN401
+            calls.append(model)
+            outcome = outcomes[model].pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        return RunnableLambda(answer)
+
+    with patch("utils.structured_output.time.sleep") as sleep:
+        output = invoke_structured("retry_sync", build_chain, {}, "primary", is_answer, RetryPolicy(max_attempts=2, fallback_model="fallback"))
+
+    assert output == StructuredOutput("answer", "fallback")
+    assert calls == ["primary", "primary", "fallback"]
+    assert sleep.call_count == 1
+
+
+def test_policy_from_env():
+    """The retry policy is parsed from the `CALM_STRUCTURED_*` and `CALM_HEDGE_*` variables, a zero timeout disables it."""
+    env = {
+        "CALM_STRUCTURED_MAX_ATTEMPTS": "5",
+        "CALM_STRUCTURED_TIMEOUT_SECONDS": "0",
+        "CALM_STRUCTURED_BACKOFF_SECONDS": "0.25",
+        "CALM_STRUCTURED_MAX_BACKOFF_SECONDS": "2",
+        "CALM_STRUCTURED_FALLBACK_MODEL": "qwen3:4b",
+        "CALM_HEDGE_QUANTILE": "0.9",
+        "CALM_HEDGE_MODEL": "qwen3:1.7b",
+        "CALM_HEDGE_MIN_SAMPLES": "10",
+    }
+    with patch.dict(os.environ, env):
+        policy = RetryPolicy.from_env()
+
+    assert policy == RetryPolicy(
+        max_attempts=5,
+        timeout=None,
+        base_delay=0.25,
+        max_delay=2.0,
+        fallback_model="qwen3:4b",
+        hedge_quantile=0.9,
+        hedge_model="qwen3:1.7b",
+        hedge_min_samples=10,
+    )
+
+    with patch.dict(os.environ, {}, clear=True):
+        assert RetryPolicy.from_env() == RetryPolicy()
+
+
+def test_backoff_bounds():
+    """Full jitter backoff doubles per retry up to the maximum delay."""
+    policy = RetryPolicy(base_delay=0.5, max_delay=3.0)
+    with patch("utils.structured_output.random.uniform", side_effect=lambda low, high: high):
+        assert [policy.backoff(retry) for retry in range(1, 6)] == [0.5, 1.0, 2.0, 3.0, 3.0]
+
+
+if __name__ == "__main__":
+    test_primary_wins()
+    test_hedge_wins()
+    test_failed_hedge_waits_for_primary()
+    test_both_fail_fallback_model()
+    test_retry_until_valid()
+    test_retry_budget_exhausted()
+    test_timeout_then_fallback_model()
+    test_invoke_structured()
+    test_policy_from_env()
+    test_backoff_bounds()
+    print("✅ Structured output retries and hedging")
@@ -1,35 +1,79 @@
 import os
 from functools import lru_cache
+from typing import TYPE_CHECKING
 
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import AIMessage
-from langchain_deepseek import ChatDeepSeek
-from langchain_ollama import ChatOllama, OllamaEmbeddings
-from langchain_openai.chat_models.base import BaseChatOpenAI
 
+from utils.embedding_cache import CachedQueryEmbeddings
+from utils.llm_clients import LLMClientRegistry
+from utils.scheduler import LLMScheduler, Priority  # noqa: F401
+
+if TYPE_CHECKING:
+    from langchain_openai.chat_models.base import BaseChatOpenAI
+
+# LLM client libraries are imported on first use of a model, importing this module stays cheap
+
+
+def backend_of(model: str) -> str:
+    """Get the name of the backend serving a model."""
+    if model.startswith("deepseek"):
+        return "deepseek"
+    return "ollama"
+
+
+def _concurrency_limits() -> dict[str, int]:
+    """Read per backend concurrency limits from `CALM_LLM_CONCURRENCY_<BACKEND>` environment variables."""
+    prefix = "CALM_LLM_CONCURRENCY_"
+    return {key.removeprefix(prefix).lower(): int(value) for key, value in os.environ.items() if key.startswith(prefix)}
+
+
+# Shared scheduler bounding concurrent LLM calls per backend
+llm_scheduler = LLMScheduler(
+    backend_resolver=backend_of,
+    default_limit=int(os.environ.get("CALM_LLM_CONCURRENCY", "4")),
+    limits=_concurrency_limits(),
+)
+
+
+# Shared registry of chat model clients, pooling HTTP connections per backend host
+llm_clients = LLMClientRegistry(
+    backend_resolver=backend_of,
+    max_clients=int(os.environ.get("CALM_LLM_MAX_CLIENTS", "64")),
+    max_connections=int(os.environ.get("CALM_LLM_MAX_CONNECTIONS", "32")),
+)
+
+
+def _get_deepseek(model: str, temperature: float) -> "BaseChatOpenAI":
+    """Get a DeepSeek chat model from the client registry."""
+    return llm_clients.get(model, temperature)
 
-@lru_cache(maxsize=1000)
-def _get_deepseek(model: str, temperature: float) -> BaseChatOpenAI:
-    os.environ["DEEPSEEK_API_KEY"] = os.getenv("DEEPSEEK_API")
-    return ChatDeepSeek(model=model, temperature=temperature)
 
-@lru_cache(maxsize=1000)
 def _get_llm(model: str, temperature: float) -> BaseChatModel:
     """Get the LLM model based on the model name and temperature."""
-    if model.startswith("deepseek"):
-        return _get_deepseek(model, temperature)
+    return llm_clients.get(model, temperature)
 
-    return ChatOllama(model=model, temperature=temperature)
 
 @lru_cache(maxsize=1000)
-def get_nomic_embedding() -> OllamaEmbeddings:
+def get_nomic_embedding() -> CachedQueryEmbeddings:
     """Get the Nomic embedding model.
 
+    Query embeddings are cached in memory, bounded by `CALM_EMBEDDING_CACHE_SIZE`, and on disk when
+    `CALM_EMBEDDING_CACHE_PATH` is set.
+
     Returns:
-        OllamaEmbeddings: The Nomic embedding model.
+        CachedQueryEmbeddings: The Nomic embedding model with a query embedding cache.
 
     """
-    return OllamaEmbeddings(model="nomic-embed-text:latest")
+    from langchain_ollama import OllamaEmbeddings
+
+    model_name = "nomic-embed-text:latest"
+    return CachedQueryEmbeddings(
+        OllamaEmbeddings(model=model_name),
+        model_name=model_name,
+        max_size=int(os.environ.get("CALM_EMBEDDING_CACHE_SIZE", "4096")),
+        disk_path=os.environ.get("CALM_EMBEDDING_CACHE_PATH"),
+    )
 
 
 # TODO: add a function to clear the cache
@@ -54,6 +54,13 @@ Chat history for reference:
 """
 
 
+# Streamed answers reach the caregiver token by token, so the streaming prompt asks for the answer only and no drafted thinking steps
+CALM_ADRD_STREAMING_PROMPT = CALM_ADRD_PROMPT.replace(
+    "# Thinking Process\n\nEach response should be considered from following four aspects. Think step by step, but only keep a minimum draft for each thinking step, with 5 words at most.",
+    "# Response Aspects\n\nEach response should be considered from following four aspects. Do not write out your thinking, drafts or these aspect headings, reply with the answer to the caregiver only.",
+)
+
+
 BASIC_PROMPT = """
 You are a compassionate healthcare consultant specializing in caregiving for Alzheimer's Disease and Related Dementias
 (ADRD). Your job is to provide empathetic, knowledgeable, and structured support to caregivers facing emotional,
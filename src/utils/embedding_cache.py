@@ -0,0 +1,190 @@
+import asyncio
+import sqlite3
+import threading
+import weakref
+from array import array
+from collections import OrderedDict
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, TypeVar
+
+from langchain_core.embeddings import Embeddings
+
+from utils.metrics import REGISTRY
+
+T = TypeVar("T")
+
+# Live caches reported by the stats gauge, a cache dropped by its owner is not kept alive by the metrics
+_caches: "weakref.WeakSet[CachedQueryEmbeddings]" = weakref.WeakSet()
+
+
+def _cache_stats() -> dict[tuple[str, ...], float]:
+    return {(cache.model_name, stat): value for cache in list(_caches) for stat, value in cache.stats().items()}
+
+
+EMBEDDING_CACHE_STATS = REGISTRY.gauge(
+    "calm_embedding_cache",
+    "Query embedding cache size and hit/miss counters.",
+    ("model", "stat"),
+    callback=_cache_stats,
+)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper caching query embeddings.
+
+    Query embeddings are kept in a bounded in-memory LRU keyed on (embedding model name, normalized text),
+    with an optional SQLite tier on disk that survives restarts. Misses are embedded as queries, asymmetric
+    models such as Nomic prefix queries and documents differently. Document embeddings are passed through
+    uncached, ingestion would only flush useful query entries out of the cache.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, max_size: int = 4096, disk_path: str | None = None) -> None:
+        """Initialize the query embedding cache.
+
+        Args:
+            embeddings: The embedding model to wrap.
+            model_name: Name of the embedding model, part of the cache key.
+            max_size: Maximum number of query embeddings kept in memory.
+            disk_path: [Optional] Path of the SQLite file backing the on-disk tier.
+
+        """
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.max_size = max_size
+
+        self._memory: OrderedDict[str, list[float]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk: sqlite3.Connection | None = None
+        if disk_path:
+            Path(disk_path).parent.mkdir(parents=True, exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (model TEXT NOT NULL, text TEXT NOT NULL, vector BLOB NOT NULL, PRIMARY KEY (model, text))",
+            )
+            self._disk.commit()
+
+        _caches.add(self)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize query text for the cache key, collapsing whitespace."""
+        return " ".join(text.split())
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed documents, not cached."""
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Asynchronously embed documents, not cached."""
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query, served from the cache when possible."""
+        return self.embed_queries([text])[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Asynchronously embed a query, served from the cache when possible."""
+        return (await self.aembed_queries([text]))[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Embed several queries, every distinct cache miss is embedded once.
+
+        Returns copies of the cached vectors, callers may modify them.
+        """
+        vectors, missing = self._lookup(texts)
+        if missing:
+            self._fill(vectors, missing, [self.embeddings.embed_query(text) for text in missing])
+        return [list(vector) for vector in vectors]
+
+    async def aembed_queries(self, texts: list[str]) -> list[list[float]]:
+        """Asynchronously embed several queries, the distinct cache misses are embedded concurrently.
+
+        Returns copies of the cached vectors, callers may modify them.
+        """
+        vectors, missing = await self._off_loop(self._lookup, texts)
+        if missing:
+            embedded = await asyncio.gather(*(self.embeddings.aembed_query(text) for text in missing))
+            await self._off_loop(self._fill, vectors, missing, list(embedded))
+        return [list(vector) for vector in vectors]
+
+    def stats(self) -> dict:
+        """Return cache size and hit/miss counters."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._memory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear(self) -> None:
+        """Drop all cached query embeddings of this model, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM query_embeddings WHERE model = ?", (self.model_name,))
+                self._disk.commit()
+
+    async def _off_loop(self, func: Callable[..., T], *args: Any) -> T:  # noqa: ANN401
+        """Run a cache access, in a worker thread when it reads or writes the SQLite tier."""
+        if self._disk is None:
+            return func(*args)
+        return await asyncio.to_thread(func, *args)
+
+    def _lookup(self, texts: list[str]) -> tuple[list[list[float] | None], dict[str, list[int]]]:
+        """Resolve cached vectors, returns the vectors (None for misses) and the positions of each missing text."""
+        vectors: list[list[float] | None] = [None] * len(texts)
+        missing: dict[str, list[int]] = {}
+        with self._lock:
+            for i, text in enumerate(texts):
+                key = self.normalize(text)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                elif (vector := self._disk_get(key)) is not None:
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+                    self.misses += 1
+                    continue
+                vectors[i] = vector
+        return vectors, missing
+
+    def _fill(self, vectors: list[list[float] | None], missing: dict[str, list[int]], embedded: list[list[float]]) -> None:
+        with self._lock:
+            for (key, positions), vector in zip(missing.items(), embedded, strict=True):
+                self._remember(key, vector)
+                self._disk_put(key, vector)
+                for i in positions:
+                    vectors[i] = vector
+            if self._disk is not None:
+                self._disk.commit()
+
+    def _remember(self, key: str, vector: list[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> list[float] | None:
+        if self._disk is None:
+            return None
+        row = self._disk.execute("SELECT vector FROM query_embeddings WHERE model = ? AND text = ?", (self.model_name, key)).fetchone()
+        return array("f", row[0]).tolist() if row else None
+
+    def _disk_put(self, key: str, vector: list[float]) -> None:
+        if self._disk is None:
+            return
+        self._disk.execute(
+            "INSERT OR REPLACE INTO query_embeddings (model, text, vector) VALUES (?, ?, ?)",
+            (self.model_name, key, array("f", vector).tobytes()),
+        )
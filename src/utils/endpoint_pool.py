@@ -0,0 +1,347 @@
+"""Pool of equivalent inference endpoints behind one HTTP transport.
+
+Every request is routed to the healthy endpoint with the fewest outstanding requests. An endpoint
+failing to connect, answering with a gateway error (502, 503, 504) or failing several requests in a
+row is marked unhealthy and skipped; a background probe adds it back once it answers again. Other
+server errors may be caused by the request itself, they are counted without ejecting the endpoint.
+Requests that never reached a failed endpoint are retried on the next one. When every endpoint is
+unhealthy, requests are still routed, the pool fails open.
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Iterator
+
+import httpx
+
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+ENDPOINT_LATENCY = REGISTRY.histogram(
+    "calm_llm_endpoint_latency_seconds",
+    "Latency of requests per inference endpoint, measured until the response body is consumed.",
+    ("endpoint",),
+)
+ENDPOINT_ERRORS = REGISTRY.counter(
+    "calm_llm_endpoint_errors_total",
+    "Failed requests per inference endpoint, connection errors and server errors.",
+    ("endpoint",),
+)
+
+# Errors raised before the request reached the endpoint, safe to retry elsewhere
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Server errors telling the host, or the proxy in front of it, is down or overloaded
+UNHEALTHY_STATUS_CODES = frozenset({502, 503, 504})
+
+
+class Endpoint:
+    """One inference endpoint with its own connection pools and routing state."""
+
+    def __init__(self, url: str, sync_transport: httpx.BaseTransport, async_transport: httpx.AsyncBaseTransport) -> None:
+        self.url = httpx.URL(url)
+        self.name = str(self.url).rstrip("/")
+        self.sync_transport = sync_transport
+        self.async_transport = async_transport
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.failures = 0
+        self.healthy = True
+        self.probing = False
+        self.probe_at = 0.0
+        self.cooldown = 0.0
+
+    def route(self, request: httpx.Request) -> None:
+        """Point the request at this endpoint, keeping its path and query."""
+        request.url = request.url.copy_with(scheme=self.url.scheme, host=self.url.host, port=self.url.port)
+        request.headers["Host"] = request.url.netloc.decode("ascii")
+
+    def status(self) -> dict:
+        """Routing state and request counters of the endpoint."""
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "p50_seconds": ENDPOINT_LATENCY.quantile(0.5, endpoint=self.name),
+            "p95_seconds": ENDPOINT_LATENCY.quantile(0.95, endpoint=self.name),
+        }
+
+
+class EndpointPool:
+    """Least-outstanding-requests load balancer over equivalent endpoints.
+
+    Args:
+        urls: Base URLs of the endpoints.
+        limits: [Optional] Connection pool limits of every endpoint.
+        cooldown: Seconds before the first health probe of a failed endpoint, doubled after every failed probe.
+        max_cooldown: Upper bound of the probe interval in seconds.
+        max_failures: Failed requests in a row after which an endpoint is marked unhealthy.
+        probe_path: Path requested by health probes, any answer below 500 marks the endpoint healthy.
+        transport_factory: [Optional] Builds the (sync, async) transports of an endpoint URL, defaults to httpx pooled transports.
+
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        limits: httpx.Limits | None = None,
+        cooldown: float = 5.0,
+        max_cooldown: float = 60.0,
+        max_failures: int = 3,
+        probe_path: str = "/api/version",
+        transport_factory: Callable[[str], tuple[httpx.BaseTransport, httpx.AsyncBaseTransport]] | None = None,
+    ) -> None:
+        if not urls:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+
+        limits = limits or httpx.Limits()
+        factory = transport_factory or (lambda _: (httpx.HTTPTransport(limits=limits), httpx.AsyncHTTPTransport(limits=limits)))
+        self.endpoints = [Endpoint(url, *factory(url)) for url in urls]
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.max_failures = max_failures
+        self.probe_path = probe_path
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        """Base URL handed to clients, requests are re-routed by the pool transports."""
+        return self.endpoints[0].name
+
+    def acquire(self, exclude: set[str] | frozenset[str] = frozenset()) -> Endpoint | None:
+        """Pick the endpoint for the next request and count it as outstanding.
+
+        Args:
+            exclude: Names of endpoints already tried for this request.
+
+        Returns:
+            Endpoint | None: The healthy endpoint with the fewest outstanding requests, any untried endpoint
+            when none is healthy, None when all were tried.
+
+        """
+        self._probe_due()
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.name not in exclude]
+            if not candidates:
+                return None
+            healthy = [e for e in candidates if e.healthy]
+            endpoint = min(healthy or candidates, key=lambda e: (e.outstanding, e.requests))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, started: float, *, failed: bool = False, unhealthy: bool = False) -> None:
+        """Finish an outstanding request, recording its latency and outcome.
+
+        Args:
+            endpoint: The endpoint the request was sent to.
+            started: `time.perf_counter()` when the request was sent.
+            failed: The request failed, counted as an error of the endpoint.
+            unhealthy: The failure shows the endpoint is down, it is marked unhealthy right away.
+
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            if not failed and not unhealthy:
+                endpoint.failures = 0
+        ENDPOINT_LATENCY.observe(time.perf_counter() - started, endpoint=endpoint.name)
+        if failed or unhealthy:
+            self.record_error(endpoint, unhealthy=unhealthy)
+
+    def mark_unhealthy(self, endpoint: Endpoint) -> None:
+        """Stop routing to an endpoint until a health probe succeeds."""
+        self.record_error(endpoint, unhealthy=True)
+
+    def record_error(self, endpoint: Endpoint, *, unhealthy: bool = False) -> None:
+        """Count a failed request, the endpoint is marked unhealthy when asked to or after `max_failures` in a row."""
+        ENDPOINT_ERRORS.inc(endpoint=endpoint.name)
+        with self._lock:
+            endpoint.errors += 1
+            endpoint.failures += 1
+            if not endpoint.healthy or (not unhealthy and endpoint.failures < self.max_failures):
+                return
+            endpoint.healthy = False
+            endpoint.cooldown = self.cooldown
+            endpoint.probe_at = time.monotonic() + endpoint.cooldown
+        logger.warning(f"Endpoint unhealthy | {endpoint.name} | probing in {endpoint.cooldown:.0f}s")
+
+    def probe(self, endpoint: Endpoint) -> bool:
+        """Probe an endpoint, marks it healthy when it answers, returns whether it did."""
+        request = httpx.Request(
+            "GET",
+            endpoint.url.join(self.probe_path),
+            extensions={"timeout": {"connect": 2.0, "read": 2.0, "write": 2.0, "pool": 2.0}},
+        )
+        try:
+            response = endpoint.sync_transport.handle_request(request)
+            response.read()
+            response.close()
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+
+        with self._lock:
+            endpoint.probing = False
+            if ok:
+                endpoint.healthy = True
+                endpoint.failures = 0
+            else:
+                endpoint.cooldown = min(endpoint.cooldown * 2, self.max_cooldown)
+                endpoint.probe_at = time.monotonic() + endpoint.cooldown
+        if ok:
+            logger.info(f"Endpoint healthy again | {endpoint.name}")
+        return ok
+
+    def _probe_due(self) -> None:
+        """Start background probes of unhealthy endpoints whose cooldown has passed."""
+        now = time.monotonic()
+        with self._lock:
+            due = [e for e in self.endpoints if not e.healthy and not e.probing and e.probe_at <= now]
+            for endpoint in due:
+                endpoint.probing = True
+        for endpoint in due:
+            threading.Thread(target=self.probe, args=(endpoint,), name=f"probe-{endpoint.name}", daemon=True).start()
+
+    @property
+    def healthy(self) -> bool:
+        """Whether at least one endpoint is healthy."""
+        return any(endpoint.healthy for endpoint in self.endpoints)
+
+    def stats(self) -> dict[str, dict]:
+        """Routing state, counters and latency percentiles per endpoint."""
+        return {endpoint.name: endpoint.status() for endpoint in self.endpoints}
+
+    def sync_transport(self) -> "PooledTransport":
+        """A synchronous httpx transport routing through this pool."""
+        return PooledTransport(self)
+
+    def async_transport(self) -> "AsyncPooledTransport":
+        """An asynchronous httpx transport routing through this pool."""
+        return AsyncPooledTransport(self)
+
+    async def aclose(self) -> None:
+        """Close the connection pools of every endpoint."""
+        for endpoint in self.endpoints:
+            endpoint.sync_transport.close()
+            await endpoint.async_transport.aclose()
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body releasing its endpoint once closed."""
+
+    def __init__(self, stream: httpx.SyncByteStream, on_close: Callable[[], None]) -> None:
+        self._stream = stream
+        self._on_close = on_close
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield from self._stream
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    """Asynchronous response body releasing its endpoint once closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]) -> None:
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+def _outcome(response: httpx.Response) -> dict[str, bool]:
+    """Release arguments of a response, a server error is a failure and a gateway error marks the endpoint down."""
+    return {"failed": response.status_code >= 500, "unhealthy": response.status_code in UNHEALTHY_STATUS_CODES}
+
+
+def _release_on_close(response: httpx.Response, release: Callable[[], None], stream_type: type) -> httpx.Response:
+    """Release the endpoint once the response body is closed, right away when it was read eagerly."""
+    if response.is_closed:
+        release()
+    else:
+        response.stream = stream_type(response.stream, release)
+    return response
+
+
+class PooledTransport(httpx.BaseTransport):
+    """Synchronous transport sending each request to the least busy healthy endpoint of a pool."""
+
+    def __init__(self, pool: EndpointPool) -> None:
+        self.pool = pool
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        """Send a request to the least busy healthy endpoint, failing over to the next one on connection errors."""
+        tried: set[str] = set()
+        while (endpoint := self.pool.acquire(tried)) is not None:
+            tried.add(endpoint.name)
+            endpoint.route(request)
+            started = time.perf_counter()
+            try:
+                response = endpoint.sync_transport.handle_request(request)
+            except RETRYABLE_ERRORS:
+                self.pool.release(endpoint, started, unhealthy=True)
+                if len(tried) < len(self.pool.endpoints):
+                    continue
+                raise
+            except Exception:
+                self.pool.release(endpoint, started, failed=True)
+                raise
+
+            return _release_on_close(response, lambda e=endpoint, s=started, r=response: self.pool.release(e, s, **_outcome(r)), _ReleasingStream)
+        raise httpx.ConnectError("No endpoint available", request=request)
+
+    def close(self) -> None:
+        """Endpoint pools are owned by the pool, closed with `EndpointPool.aclose`."""
+
+
+class AsyncPooledTransport(httpx.AsyncBaseTransport):
+    """Asynchronous transport sending each request to the least busy healthy endpoint of a pool."""
+
+    def __init__(self, pool: EndpointPool) -> None:
+        self.pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        """Asynchronously send a request to the least busy healthy endpoint, failing over to the next one on connection errors."""
+        tried: set[str] = set()
+        while (endpoint := self.pool.acquire(tried)) is not None:
+            tried.add(endpoint.name)
+            endpoint.route(request)
+            started = time.perf_counter()
+            try:
+                response = await endpoint.async_transport.handle_async_request(request)
+            except RETRYABLE_ERRORS:
+                self.pool.release(endpoint, started, unhealthy=True)
+                if len(tried) < len(self.pool.endpoints):
+                    continue
+                raise
+            except asyncio.CancelledError:
+                # A cancelled call says nothing about the endpoint health
+                self.pool.release(endpoint, started)
+                raise
+            except Exception:
+                self.pool.release(endpoint, started, failed=True)
+                raise
+
+            return _release_on_close(response, lambda e=endpoint, s=started, r=response: self.pool.release(e, s, **_outcome(r)), _AsyncReleasingStream)
+        raise httpx.ConnectError("No endpoint available", request=request)
+
+    async def aclose(self) -> None:
+        """Endpoint pools are owned by the pool, closed with `EndpointPool.aclose`."""
@@ -0,0 +1,309 @@
+"""Registry of chat model clients sharing keep-alive HTTP connection pools per backend host.
+
+Every (model, temperature) variant gets its own lightweight chat model object, but all variants
+served by the same hosts reuse one pooled HTTP transport, so a new temperature never opens a new
+pool and warm connections survive client eviction. Clients are bounded in number and evicted in
+LRU order; `aclose` releases the pools.
+
+Ollama models can be served by several hosts: `OLLAMA_HOSTS` lists the default hosts, comma
+separated, and `OLLAMA_MODEL_HOSTS` maps model names to their own hosts as JSON, e.g.
+`{"qwen3:14b": ["http://gpu-1:11434", "http://gpu-2:11434"]}`. Calls are balanced over the hosts
+of a model by an `EndpointPool`.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+from uuid import UUID
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from utils.endpoint_pool import EndpointPool
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+MODEL_LATENCY = REGISTRY.histogram(
+    "calm_llm_model_latency_seconds",
+    "Latency of chat model calls per model, all temperatures together, measured from request start to the last token.",
+    ("backend", "model"),
+)
+MODEL_ERRORS = REGISTRY.counter(
+    "calm_llm_model_errors_total",
+    "Failed chat model calls per model.",
+    ("backend", "model"),
+)
+
+
+class ModelStatsHandler(BaseCallbackHandler):
+    """Callback handler tracking the in-flight calls and latency of a model, shared by its clients at every temperature."""
+
+    def __init__(self, backend: str, model: str) -> None:
+        self.backend = backend
+        self.model = model
+        self.in_flight = 0
+        self.calls = 0
+        self._started: dict[UUID, float] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized: dict, messages: list, *, run_id: UUID, **kwargs: Any) -> None:  # noqa: ARG002, ANN401
+        """Count the call as in flight."""
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+            self.in_flight += 1
+            self.calls += 1
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:  # noqa: ARG002, ANN401
+        """Record the latency of a finished call."""
+        self._finish(run_id, failed=False)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:  # noqa: ARG002, ANN401
+        """Record a failed call."""
+        self._finish(run_id, failed=True)
+
+    def _finish(self, run_id: UUID, *, failed: bool) -> None:
+        with self._lock:
+            start = self._started.pop(run_id, None)
+            if start is None:
+                return
+            self.in_flight -= 1
+        MODEL_LATENCY.observe(time.perf_counter() - start, backend=self.backend, model=self.model)
+        if failed:
+            MODEL_ERRORS.inc(backend=self.backend, model=self.model)
+
+
+class LLMClientRegistry:
+    """Bounded registry of chat model clients with shared HTTP pools per backend host.
+
+    Args:
+        backend_resolver: Maps a model name to the backend serving it, `ollama` or `deepseek`.
+        max_clients: Maximum number of (model, temperature) clients kept, least recently used are evicted.
+        max_connections: Maximum number of pooled connections per backend host.
+        keepalive_expiry: Seconds an idle pooled connection is kept open.
+
+    """
+
+    def __init__(
+        self,
+        backend_resolver: Callable[[str], str],
+        max_clients: int = 64,
+        max_connections: int = 32,
+        keepalive_expiry: float = 120.0,
+    ) -> None:
+        self._backend_resolver = backend_resolver
+        self.max_clients = max_clients
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._clients: OrderedDict[tuple[str, float], BaseChatModel] = OrderedDict()
+        self._handlers: dict[str, ModelStatsHandler] = {}
+        self._pools: dict[tuple[str, ...], EndpointPool] = {}
+        self._http_clients: dict[str, tuple[httpx.Client, httpx.AsyncClient]] = {}
+        # Reentrant, pools and HTTP clients are created both under `get` and on their own from `awarm`
+        self._lock = threading.RLock()
+
+        REGISTRY.gauge(
+            "calm_llm_model_in_flight",
+            "Chat model calls in flight per model.",
+            ("backend", "model"),
+            callback=lambda: {(h.backend, h.model): h.in_flight for h in list(self._handlers.values())},
+        )
+        REGISTRY.gauge(
+            "calm_llm_clients",
+            "Number of cached chat model clients and pooled backend hosts.",
+            ("kind",),
+            callback=lambda: {("clients",): len(self._clients), ("hosts",): sum(len(p.endpoints) for p in list(self._pools.values())) + len(self._http_clients)},
+        )
+
+    @staticmethod
+    def ollama_host() -> str:
+        """Ollama host from `OLLAMA_HOST`, the same default as the Ollama client."""
+        return LLMClientRegistry._normalize_ollama_host(os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434"))
+
+    @classmethod
+    def ollama_hosts(cls, model: str) -> tuple[str, ...]:
+        """Ollama hosts serving a model, from `OLLAMA_MODEL_HOSTS`, then `OLLAMA_HOSTS`, then `OLLAMA_HOST`."""
+        hosts = json.loads(os.environ.get("OLLAMA_MODEL_HOSTS", "{}")).get(model)
+        if hosts is None:
+            hosts = [host.strip() for host in os.environ.get("OLLAMA_HOSTS", "").split(",") if host.strip()]
+        if not hosts:
+            return (cls.ollama_host(),)
+        return tuple(cls._normalize_ollama_host(host) for host in hosts)
+
+    @staticmethod
+    def _normalize_ollama_host(host: str) -> str:
+        """A host without scheme defaults to http on the Ollama port 11434, like the Ollama client does."""
+        if "://" in host:
+            return host.rstrip("/")
+        url = httpx.URL(f"http://{host}")
+        return str(url if url.port else url.copy_with(port=11434)).rstrip("/")
+
+    @staticmethod
+    def deepseek_base_url() -> str:
+        """DeepSeek API base URL from `DEEPSEEK_API_BASE`."""
+        return os.environ.get("DEEPSEEK_API_BASE", "https://api.deepseek.com")
+
+    def get(self, model: str, temperature: float) -> BaseChatModel:
+        """Get the client of a model at a temperature, created on first use.
+
+        Args:
+            model: The model name.
+            temperature: The sampling temperature.
+
+        Returns:
+            BaseChatModel: The chat model client.
+
+        """
+        key = (model, float(temperature))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+            client = self._create(model, float(temperature))
+            self._clients[key] = client
+            while len(self._clients) > self.max_clients:
+                # Pools are shared per host, an evicted client leaves the warm connections behind
+                (evicted, _), _ = self._clients.popitem(last=False)
+                logger.debug(f"LLM client evicted | {evicted}")
+            return client
+
+    def evict(self, model: str | None = None) -> int:
+        """Drop the clients of a model, or all clients, returns how many were dropped. Pools stay open."""
+        with self._lock:
+            keys = [key for key in self._clients if model is None or key[0] == model]
+            for key in keys:
+                del self._clients[key]
+            return len(keys)
+
+    def stats(self) -> dict[str, dict]:
+        """In-flight and total calls per model, over its clients at every temperature."""
+        return {model: {"in_flight": h.in_flight, "calls": h.calls} for model, h in list(self._handlers.items())}
+
+    def endpoint_stats(self) -> dict[str, dict]:
+        """Health, outstanding requests and latency percentiles per Ollama endpoint."""
+        return {name: status for pool in list(self._pools.values()) for name, status in pool.stats().items()}
+
+    def endpoints_healthy(self) -> bool:
+        """Whether every pool of Ollama endpoints has a healthy endpoint, True before any pool was created."""
+        return all(pool.healthy for pool in list(self._pools.values()))
+
+    async def awarm(self, models: list[str]) -> dict[str, float | None]:
+        """Open pooled connections and load the models ahead of the first request.
+
+        Ollama models are loaded into memory on every host serving them with an empty generate request sent
+        over the connection pool of that host, DeepSeek gets a model list request over the pooled connection.
+        Failures are logged, warming is best effort.
+
+        Args:
+            models: Names of the models to warm up.
+
+        Returns:
+            dict[str, float | None]: Warm-up latency in seconds per model, None when warming failed.
+
+        """
+        latencies: dict[str, float | None] = {}
+        for model in models:
+            start = time.perf_counter()
+            try:
+                if self._backend_resolver(model) == "deepseek":
+                    _, http_client = self._deepseek_http_clients()
+                    response = await http_client.get(
+                        f"{self.deepseek_base_url()}/models",
+                        headers={"Authorization": f"Bearer {os.getenv('DEEPSEEK_API')}"},
+                    )
+                    response.raise_for_status()
+                else:
+                    for endpoint in self._ollama_pool(model).endpoints:
+                        # Straight to the host transport, the pool transport would route to the least busy host
+                        request = httpx.Request(
+                            "POST",
+                            endpoint.url.join("/api/generate"),
+                            json={"model": model, "prompt": "", "stream": False},
+                            extensions={"timeout": {"connect": 5.0, "read": 300.0, "write": 5.0, "pool": 5.0}},
+                        )
+                        response = await endpoint.async_transport.handle_async_request(request)
+                        try:
+                            await response.aread()
+                        finally:
+                            await response.aclose()
+                        response.request = request
+                        response.raise_for_status()
+                latencies[model] = time.perf_counter() - start
+                logger.info(f"LLM client warmed up | {model} | {latencies[model]:.3f}s")
+            except Exception as e:
+                latencies[model] = None
+                logger.warning(f"LLM client warm-up failed | {model} | {e!s}")
+        return latencies
+
+    async def aclose(self) -> None:
+        """Drop every client and close the shared HTTP pools."""
+        with self._lock:
+            self._clients.clear()
+            pools = list(self._pools.values())
+            http_clients = list(self._http_clients.values())
+            self._pools.clear()
+            self._http_clients.clear()
+
+        for pool in pools:
+            await pool.aclose()
+        for sync_client, async_client in http_clients:
+            sync_client.close()
+            await async_client.aclose()
+
+    def _create(self, model: str, temperature: float) -> BaseChatModel:
+        backend = self._backend_resolver(model)
+        handler = self._handlers.setdefault(model, ModelStatsHandler(backend, model))
+
+        if backend == "deepseek":
+            from langchain_deepseek import ChatDeepSeek
+
+            http_client, http_async_client = self._deepseek_http_clients()
+            return ChatDeepSeek(
+                model=model,
+                temperature=temperature,
+                api_key=os.getenv("DEEPSEEK_API"),
+                api_base=self.deepseek_base_url(),
+                http_client=http_client,
+                http_async_client=http_async_client,
+                callbacks=[handler],
+            )
+
+        from langchain_ollama import ChatOllama
+
+        pool = self._ollama_pool(model)
+        return ChatOllama(
+            model=model,
+            temperature=temperature,
+            base_url=pool.url,
+            sync_client_kwargs={"transport": pool.sync_transport()},
+            async_client_kwargs={"transport": pool.async_transport()},
+            callbacks=[handler],
+        )
+
+    def _ollama_pool(self, model: str) -> EndpointPool:
+        hosts = self.ollama_hosts(model)
+        with self._lock:
+            if hosts not in self._pools:
+                self._pools[hosts] = EndpointPool(
+                    list(hosts),
+                    limits=self._limits,
+                    cooldown=float(os.environ.get("CALM_ENDPOINT_PROBE_SECONDS", "5")),
+                    max_failures=int(os.environ.get("CALM_ENDPOINT_MAX_FAILURES", "3")),
+                )
+            return self._pools[hosts]
+
+    def _deepseek_http_clients(self) -> tuple[httpx.Client, httpx.AsyncClient]:
+        base_url = self.deepseek_base_url()
+        with self._lock:
+            if base_url not in self._http_clients:
+                self._http_clients[base_url] = (httpx.Client(limits=self._limits), httpx.AsyncClient(limits=self._limits))
+            return self._http_clients[base_url]
@@ -0,0 +1,283 @@
+"""Lightweight in-process metrics exposed in the Prometheus text exposition format.
+
+Latencies are exposed as histograms, cumulative `_bucket`, `_sum` and `_count` series per label set
+that Prometheus aggregates across workers. A sliding window of recent observations is kept as well,
+its quantiles drive in-process decisions such as hedging and back the JSON stats endpoints.
+"""
+
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+
+# Bucket upper bounds in seconds, from sub-millisecond vector searches to slow LLM generations
+LATENCY_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names: tuple[str, ...], label_values: tuple[str, ...], **extra: str) -> str:
+    pairs = [*zip(label_names, label_values), *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """Base class of a labelled metric."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def header(self) -> list[str]:
+        """Return the HELP and TYPE lines."""
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    @abstractmethod
+    def collect(self) -> list[str]:
+        """Return the exposition lines of this metric."""
+
+
+class LatencyHistogram(_Metric):
+    """Latency histogram per label set, with sliding-window quantiles for in-process use."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        window: int = 1024,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self.window = window
+        self.buckets = tuple(sorted(buckets))
+        self._samples: dict[tuple[str, ...], deque[float]] = {}
+        self._bucket_counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+        self._counts: dict[tuple[str, ...], int] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Record one observation in seconds."""
+        key = self._key(labels)
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(value)
+            # Per-bucket counts, made cumulative at collection, the last slot counts values above every bound
+            self._bucket_counts.setdefault(key, [0] * (len(self.buckets) + 1))[bisect.bisect_left(self.buckets, value)] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def quantile(self, q: float, *, min_samples: int = 1, **labels: str) -> float | None:
+        """Return the q-quantile of the recent observations, None if fewer than `min_samples` were recorded."""
+        key = self._key(labels)
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(min_samples, 1):
+            return None
+        return samples[min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))]
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Time the enclosed block, failures are recorded as well."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def track(self, **labels: str) -> Callable:
+        """Decorate a sync or async function to time every call."""
+        def decorator(func: Callable) -> Callable:
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):  # noqa: ANN202
+                    with self.time(**labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):  # noqa: ANN202
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def collect(self) -> list[str]:
+        """Return the exposition lines of this metric."""
+        lines = self.header()
+        with self._lock:
+            series = [(key, list(counts), self._sums[key], self._counts[key]) for key, counts in self._bucket_counts.items()]
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le=_format_value(bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter per label set."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the counter."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> list[str]:
+        """Return the exposition lines of this metric."""
+        lines = self.header()
+        with self._lock:
+            values = list(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in values)
+        return lines
+
+
+class Gauge(_Metric):
+    """Gauge per label set, either set explicitly or read from a callback at scrape time.
+
+    A callback returns a mapping from label value tuples (in `label_names` order) to values.
+    """
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        callback: Callable[[], dict[tuple[str, ...], float]] | None = None,
+    ) -> None:
+        super().__init__(name, documentation, label_names)
+        self._values: dict[tuple[str, ...], float] = {}
+        self._callbacks: list[Callable[[], dict[tuple[str, ...], float]]] = [callback] if callback else []
+
+    def set(self, value: float, **labels: str) -> None:
+        """Set the gauge value."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Increase the gauge value."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        """Decrease the gauge value."""
+        self.inc(-amount, **labels)
+
+    def add_callback(self, callback: Callable[[], dict[tuple[str, ...], float]]) -> None:
+        """Read additional series from a callback at scrape time."""
+        self._callbacks.append(callback)
+
+    def collect(self) -> list[str]:
+        """Return the exposition lines of this metric."""
+        lines = self.header()
+        with self._lock:
+            values = dict(self._values)
+        for callback in self._callbacks:
+            values.update({tuple(str(v) for v in key): value for key, value in callback().items()})
+        lines.extend(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in values.items())
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide registry of metrics, rendered in the Prometheus text format."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+                    raise ValueError(f"Metric {metric.name} is already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def histogram(self, name: str, documentation: str, label_names: tuple[str, ...] = (), window: int = 1024) -> LatencyHistogram:
+        """Get or create a latency histogram."""
+        return self._register(LatencyHistogram(name, documentation, label_names, window))
+
+    def counter(self, name: str, documentation: str, label_names: tuple[str, ...] = ()) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        label_names: tuple[str, ...] = (),
+        callback: Callable[[], dict[tuple[str, ...], float]] | None = None,
+    ) -> Gauge:
+        """Get or create a gauge, an optional callback is attached to the existing gauge as well."""
+        gauge = self._register(Gauge(name, documentation, label_names))
+        if callback is not None:
+            gauge.add_callback(callback)
+        return gauge
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.collect()) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+NODE_LATENCY = REGISTRY.histogram(
+    "calm_node_latency_seconds",
+    "Latency of LangGraph node executions.",
+    ("node",),
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "calm_llm_latency_seconds",
+    "Latency of LLM calls made by checkpoints.",
+    ("task", "model"),
+)
+VECTORSTORE_LATENCY = REGISTRY.histogram(
+    "calm_vectorstore_latency_seconds",
+    "Latency of vector store queries.",
+    ("collection", "operation"),
+)
@@ -0,0 +1,102 @@
+"""Compact embedding codes for the first pass of a similarity search.
+
+int8 scalar quantization keeps one signed byte per dimension (4x smaller than float32), binary
+quantization keeps one bit per dimension (32x smaller). Both only shortlist candidates, which are
+then re-scored exactly with the full vectors.
+"""
+
+from typing import Literal
+
+import numpy as np
+
+Quantization = Literal["none", "int8", "binary"]
+
+# Number of set bits of every byte value, for Hamming distances between packed bit codes
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+
+def quantize_int8(matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Quantize a matrix to int8 with a symmetric scale per dimension.
+
+    Args:
+        matrix: Float matrix, one vector per row.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: The int8 codes and the float32 scale of each dimension.
+
+    """
+    scale = np.abs(matrix).max(axis=0).astype(np.float32) / 127.0
+    scale[scale == 0] = 1.0
+    codes = np.clip(np.rint(matrix / scale), -127, 127).astype(np.int8)
+    return codes, scale
+
+
+def int8_similarities(codes: np.ndarray, scale: np.ndarray, queries: np.ndarray, chunk_size: int = 65536) -> np.ndarray:
+    """Approximate inner products of queries with int8 codes.
+
+    Codes are widened to float32 one chunk at a time, so the full-precision matrix is never materialized.
+
+    Args:
+        codes: int8 codes, one vector per row.
+        scale: Scale of each dimension.
+        queries: Float queries, one per row.
+        chunk_size: Number of code rows widened at a time.
+
+    Returns:
+        np.ndarray: Similarities, one row per query.
+
+    """
+    scaled_queries = (queries * scale).astype(np.float32)
+    similarities = np.empty((len(queries), len(codes)), dtype=np.float32)
+    for start in range(0, len(codes), chunk_size):
+        similarities[:, start : start + chunk_size] = scaled_queries @ np.asarray(codes[start : start + chunk_size], dtype=np.float32).T
+    return similarities
+
+
+def quantize_binary(matrix: np.ndarray) -> np.ndarray:
+    """Quantize a matrix to the sign bit of every dimension, packed 8 dimensions per byte.
+
+    Args:
+        matrix: Float matrix, one vector per row.
+
+    Returns:
+        np.ndarray: The packed uint8 codes.
+
+    """
+    return np.packbits(matrix > 0, axis=-1)
+
+
+def hamming_distances(codes: np.ndarray, queries: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+    """Hamming distances between the binary codes and the binary quantized queries.
+
+    Args:
+        codes: Packed binary codes, one vector per row.
+        queries: Float queries, one per row.
+        chunk_size: Number of code rows compared at a time.
+
+    Returns:
+        np.ndarray: Distances, one row per query.
+
+    """
+    query_codes = quantize_binary(queries)
+    distances = np.empty((len(queries), len(codes)), dtype=np.uint16)
+    for start in range(0, len(codes), chunk_size):
+        chunk = np.asarray(codes[start : start + chunk_size])
+        distances[:, start : start + chunk_size] = _POPCOUNT[chunk[np.newaxis] ^ query_codes[:, np.newaxis]].sum(axis=-1)
+    return distances
+
+
+def shortlist(scores: np.ndarray, n: int, *, largest: bool = True) -> np.ndarray:
+    """Indices of the `n` best scores of every row, unordered.
+
+    Args:
+        scores: Scores, one row per query.
+        n: Number of candidates per query.
+        largest: Whether higher scores are better.
+
+    Returns:
+        np.ndarray: Candidate indices, one row per query.
+
+    """
+    n = min(n, scores.shape[1])
+    return np.argpartition(-scores if largest else scores, n - 1, axis=1)[:, :n]
@@ -0,0 +1,129 @@
+"""Lazily created, health-checked service resources.
+
+Resources such as knowledge base connections or the compiled agent graph are registered with a
+factory and only created on first use or when the service warms them up at startup. Their state
+and warm-up latency back the readiness endpoint.
+"""
+
+import asyncio
+import threading
+import time
+from collections.abc import Callable
+from enum import Enum
+from typing import Generic, TypeVar
+
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+T = TypeVar("T")
+
+
+class ResourceState(str, Enum):
+    """Lifecycle state of a lazy resource."""
+
+    PENDING = "pending"
+    STARTING = "starting"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class LazyResource(Generic[T]):
+    """A resource created by its factory on first access, at most once even under concurrent access.
+
+    A failed creation is recorded and retried on the next access.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], T]) -> None:
+        self.name = name
+        self._factory = factory
+        self._value: T | None = None
+        self._lock = threading.Lock()
+        self.state = ResourceState.PENDING
+        self.warmup_seconds: float | None = None
+        self.error: str | None = None
+
+    def get(self) -> T:
+        """Return the resource, creating it on first use."""
+        if self.state is ResourceState.READY:
+            return self._value
+
+        with self._lock:
+            if self.state is not ResourceState.READY:
+                self.state = ResourceState.STARTING
+                start = time.perf_counter()
+                try:
+                    self._value = self._factory()
+                except Exception as e:
+                    self.state = ResourceState.FAILED
+                    self.error = str(e)
+                    raise
+                self.warmup_seconds = time.perf_counter() - start
+                self.error = None
+                self.state = ResourceState.READY
+                logger.info(f"Resource ready | {self.name} | {self.warmup_seconds:.3f}s")
+        return self._value
+
+    async def aget(self) -> T:
+        """Return the resource, creating it in a worker thread on first use so the event loop is not blocked."""
+        if self.state is ResourceState.READY:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+    async def awarm(self) -> bool:
+        """Create the resource in a worker thread, returns whether it is ready. Failures are logged, not raised."""
+        try:
+            await self.aget()
+        except Exception as e:
+            logger.error(f"Resource failed to start | {self.name} | {e!s}")
+            return False
+        return True
+
+    @property
+    def ready(self) -> bool:
+        """Whether the resource has been created."""
+        return self.state is ResourceState.READY
+
+    def peek(self) -> T | None:
+        """Return the resource if it has been created, without creating it."""
+        return self._value if self.ready else None
+
+    def status(self) -> dict:
+        """State, warm-up latency and last error of the resource."""
+        return {"state": self.state.value, "warmup_seconds": self.warmup_seconds, "error": self.error}
+
+
+class ResourceRegistry:
+    """Registry of the lazy resources of the service."""
+
+    def __init__(self) -> None:
+        self._resources: dict[str, LazyResource] = {}
+
+        REGISTRY.gauge(
+            "calm_resource_ready",
+            "Whether a service resource has been created, 1 when ready.",
+            ("resource",),
+            callback=lambda: {(name,): float(resource.ready) for name, resource in self._resources.items()},
+        )
+
+    def register(self, name: str, factory: Callable[[], T]) -> LazyResource[T]:
+        """Register a resource under a unique name."""
+        if name in self._resources:
+            raise ValueError(f"Resource {name} is already registered")
+        self._resources[name] = LazyResource(name, factory)
+        return self._resources[name]
+
+    async def awarm(self) -> bool:
+        """Create all resources concurrently, returns whether all of them are ready."""
+        return all(await asyncio.gather(*(resource.awarm() for resource in self._resources.values())))
+
+    @property
+    def ready(self) -> bool:
+        """Whether all resources have been created."""
+        return all(resource.ready for resource in self._resources.values())
+
+    def status(self) -> dict[str, dict]:
+        """Status of every resource by name."""
+        return {name: resource.status() for name, resource in self._resources.items()}
+
+
+RESOURCES = ResourceRegistry()
@@ -0,0 +1,217 @@
+"""Persistent cache of the structured outputs of intermediate LLM tasks.
+
+Routing decisions, document grades and query expansions at low temperature give the same output
+for the same input, so they are stored in SQLite keyed on (task, model, temperature, prompt
+fingerprint, inputs). Entries expire after a TTL, the least recently used are pruned beyond a
+size cap, and entries written by a previous version of a task prompt are dropped on first use.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+
+from utils.logger import logger
+from utils.metrics import REGISTRY
+
+RESPONSE_CACHE_STATS = REGISTRY.gauge(
+    "calm_response_cache",
+    "Response cache hit/miss counters per task and number of stored entries.",
+    ("task", "stat"),
+)
+
+
+def prompt_fingerprint(template: str, schema: type[BaseModel] | dict | None = None) -> str:
+    """Hash of a prompt template and its output schema, changing either invalidates cached responses.
+
+    Args:
+        template: The prompt template.
+        schema: [Optional] The structured output schema, a pydantic model or a JSON schema.
+
+    Returns:
+        str: The hex digest of the prompt.
+
+    """
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        schema = schema.model_json_schema()
+    payload = json.dumps({"template": template, "schema": schema}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResponseCache:
+    """SQLite backed cache of structured LLM outputs, stored as JSON.
+
+    Args:
+        path: Path of the SQLite file.
+        ttl_seconds: Seconds an entry is served after it was written.
+        max_entries: Maximum number of entries kept, the least recently used are pruned beyond it.
+        max_temperature: Responses sampled above this temperature are neither served nor stored.
+
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_entries: int = 100_000,
+        max_temperature: float = 0.5,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_temperature = max_temperature
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, task TEXT NOT NULL, prompt_hash TEXT NOT NULL, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)",
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_responses_accessed ON llm_responses (accessed_at)")
+        self._db.commit()
+
+        self._lock = threading.Lock()
+        self._validated: set[tuple[str, str]] = set()
+        self._writes = 0
+        self._counters: dict[tuple[str, str], int] = {}
+        self.prune()
+
+        RESPONSE_CACHE_STATS.add_callback(self._metric_values)
+
+    @staticmethod
+    def key(task: str, model: str, temperature: float, prompt_hash: str, inputs: dict[str, Any]) -> str:
+        """Cache key of a task call, the inputs are hashed in canonical JSON form."""
+        payload = json.dumps([task, model, round(float(temperature), 4), prompt_hash, inputs], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def cacheable(self, temperature: float) -> bool:
+        """Whether responses at this temperature are deterministic enough to cache."""
+        return temperature <= self.max_temperature
+
+    def get(self, task: str, model: str, temperature: float, prompt_hash: str, inputs: dict[str, Any]) -> Any | None:  # noqa: ANN401
+        """Get the cached response of a task call.
+
+        Args:
+            task: Name of the task, e.g. `adaptive_decision`.
+            model: The model name.
+            temperature: The sampling temperature.
+            prompt_hash: Fingerprint of the prompt, see `prompt_fingerprint`.
+            inputs: The prompt inputs.
+
+        Returns:
+            Any | None: The decoded JSON response, None on a miss or when the temperature is not cacheable.
+
+        """
+        if not self.cacheable(temperature):
+            return None
+
+        key = self.key(task, model, temperature, prompt_hash, inputs)
+        now = time.time()
+        with self._lock:
+            self._invalidate_stale(task, prompt_hash)
+            row = self._db.execute("SELECT value, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self._count(task, "misses")
+                return None
+            self._db.execute("UPDATE llm_responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self._count(task, "hits")
+        return json.loads(row[0])
+
+    def put(self, task: str, model: str, temperature: float, prompt_hash: str, inputs: dict[str, Any], value: Any) -> None:  # noqa: ANN401
+        """Store the response of a task call, pydantic models are stored as their JSON dump."""
+        if not self.cacheable(temperature):
+            return
+
+        if isinstance(value, BaseModel):
+            value = value.model_dump(mode="json")
+        key = self.key(task, model, temperature, prompt_hash, inputs)
+        now = time.time()
+        with self._lock:
+            self._invalidate_stale(task, prompt_hash)
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, task, prompt_hash, value, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, task, prompt_hash, json.dumps(value), now, now),
+            )
+            self._db.commit()
+            self._writes += 1
+            prune = self._writes % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> int:
+        """Drop expired entries and the least recently used ones beyond `max_entries`, returns how many were dropped."""
+        with self._lock:
+            dropped = self._db.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)).rowcount
+            dropped += self._db.execute(
+                "DELETE FROM llm_responses WHERE key IN (SELECT key FROM llm_responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self._db.commit()
+        if dropped:
+            logger.info(f"Response cache pruned | {dropped} entries")
+        return dropped
+
+    def clear(self, task: str | None = None) -> int:
+        """Drop the entries of a task, or all entries, returns how many were dropped."""
+        with self._lock:
+            if task is None:
+                dropped = self._db.execute("DELETE FROM llm_responses").rowcount
+            else:
+                dropped = self._db.execute("DELETE FROM llm_responses WHERE task = ?", (task,)).rowcount
+            self._db.commit()
+        return dropped
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Hit/miss counters and stored entries per task."""
+        with self._lock:
+            rows = self._db.execute("SELECT task, COUNT(*) FROM llm_responses GROUP BY task").fetchall()
+            stats: dict[str, dict[str, int]] = {task: {"hits": 0, "misses": 0, "entries": entries} for task, entries in rows}
+            for (task, stat), value in self._counters.items():
+                stats.setdefault(task, {"hits": 0, "misses": 0, "entries": 0})[stat] = value
+        return stats
+
+    def _metric_values(self) -> dict[tuple[str, str], float]:
+        return {(task, stat): value for task, task_stats in self.stats().items() for stat, value in task_stats.items()}
+
+    def _count(self, task: str, stat: str) -> None:
+        self._counters[(task, stat)] = self._counters.get((task, stat), 0) + 1
+
+    def _invalidate_stale(self, task: str, prompt_hash: str) -> None:
+        """Drop entries of a task written with another prompt, once per prompt and process."""
+        if (task, prompt_hash) in self._validated:
+            return
+        dropped = self._db.execute("DELETE FROM llm_responses WHERE task = ? AND prompt_hash != ?", (task, prompt_hash)).rowcount
+        self._db.commit()
+        self._validated.add((task, prompt_hash))
+        if dropped:
+            logger.info(f"Response cache invalidated | {task} | {dropped} entries of a previous prompt")
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> ResponseCache | None:
+    """Get the shared response cache, None unless `CALM_RESPONSE_CACHE_PATH` is set.
+
+    `CALM_RESPONSE_CACHE_TTL_SECONDS`, `CALM_RESPONSE_CACHE_MAX_ENTRIES` and `CALM_RESPONSE_CACHE_MAX_TEMPERATURE`
+    tune the TTL, size cap and the highest cached temperature.
+    """
+    path = os.environ.get("CALM_RESPONSE_CACHE_PATH")
+    if not path:
+        return None
+    return ResponseCache(
+        path,
+        ttl_seconds=float(os.environ.get("CALM_RESPONSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+        max_entries=int(os.environ.get("CALM_RESPONSE_CACHE_MAX_ENTRIES", "100000")),
+        max_temperature=float(os.environ.get("CALM_RESPONSE_CACHE_MAX_TEMPERATURE", "0.5")),
+    )
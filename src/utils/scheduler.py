@@ -0,0 +1,133 @@
+"""Bounded-concurrency scheduler for LLM calls.
+
+Each model backend gets a fixed number of concurrent slots. Calls beyond the limit wait in a
+priority queue, so a burst of grading calls can not starve answer generation for other users.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from enum import IntEnum
+
+from utils.metrics import REGISTRY
+
+
+class Priority(IntEnum):
+    """Scheduling priority of an LLM call, lower values are served first."""
+
+    GENERATION = 0
+    DECISION = 1
+    EXPANSION = 2
+    GRADING = 3
+
+
+QUEUE_WAIT = REGISTRY.histogram(
+    "calm_llm_queue_wait_seconds",
+    "Time LLM calls spend waiting for a backend slot.",
+    ("backend", "priority"),
+)
+
+
+class BackendQueue:
+    """Concurrency limit with a priority queue of waiting calls for a single backend."""
+
+    def __init__(self, name: str, limit: int) -> None:
+        if limit < 1:
+            raise ValueError("Concurrency limit must be positive")
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    def depth(self) -> dict[Priority, int]:
+        """Number of waiting calls per priority."""
+        depth = dict.fromkeys(Priority, 0)
+        for priority, _, future in self._waiters:
+            if not future.done():
+                depth[Priority(priority)] += 1
+        return depth
+
+    async def acquire(self, priority: Priority) -> None:
+        """Wait for a free slot."""
+        if self.active < self.limit and not any(not future.done() for _, _, future in self._waiters):
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # The slot may have been handed over right before the cancellation, pass it on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Hand the slot to the highest priority waiter, or free it."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Slot is transferred, the number of active calls is unchanged
+                future.set_result(None)
+                return
+        self.active -= 1
+
+
+class LLMScheduler:
+    """Shared scheduler limiting concurrent LLM calls per model backend.
+
+    Args:
+        backend_resolver: Maps a model name to the backend serving it.
+        default_limit: Concurrency limit of backends without an explicit limit.
+        limits: [Optional] Concurrency limit per backend name.
+
+    """
+
+    def __init__(self, backend_resolver: Callable[[str], str], default_limit: int = 4, limits: dict[str, int] | None = None) -> None:
+        self._backend_resolver = backend_resolver
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self._queues: dict[str, BackendQueue] = {}
+
+        REGISTRY.gauge(
+            "calm_llm_queue_depth",
+            "Number of LLM calls waiting for a backend slot.",
+            ("backend", "priority"),
+            callback=self._queue_depth,
+        )
+        REGISTRY.gauge(
+            "calm_llm_active_calls",
+            "Number of LLM calls holding a backend slot.",
+            ("backend",),
+            callback=lambda: {(name,): queue.active for name, queue in self._queues.items()},
+        )
+
+    def queue(self, backend: str) -> BackendQueue:
+        """Get the queue of a backend, created on first use."""
+        if backend not in self._queues:
+            self._queues[backend] = BackendQueue(backend, self.limits.get(backend, self.default_limit))
+        return self._queues[backend]
+
+    @asynccontextmanager
+    async def slot(self, model: str, priority: Priority) -> AsyncIterator[None]:
+        """Hold a slot on the backend serving `model` for the duration of the block."""
+        queue = self.queue(self._backend_resolver(model))
+        start = time.perf_counter()
+        await queue.acquire(priority)
+        QUEUE_WAIT.observe(time.perf_counter() - start, backend=queue.name, priority=priority.name.lower())
+        try:
+            yield
+        finally:
+            queue.release()
+
+    def _queue_depth(self) -> dict[tuple[str, ...], int]:
+        return {
+            (name, priority.name.lower()): depth
+            for name, queue in self._queues.items()
+            for priority, depth in queue.depth().items()
+        }
@@ -0,0 +1,320 @@
+"""Bounded execution of structured output chains.
+
+Every checkpoint asking an LLM for a structured output goes through the same executor: a fixed
+budget of attempts with jittered exponential backoff between them, a timeout per attempt and a
+last attempt on a fallback model. Attempts are counted per task, model and outcome.
+
+Attempts can be hedged: when a call has not answered by a percentile of the recent latency of its
+task and model, a duplicate is sent, to the same model (the endpoint pool routes it to the least
+busy host) or to a lighter hedge model. The first valid answer is kept and the other call cancelled.
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, NamedTuple
+
+from langchain_core.runnables import Runnable
+
+from utils.logger import logger
+from utils.metrics import LLM_LATENCY, REGISTRY
+from utils.Models import Priority, llm_scheduler
+
+STRUCTURED_ATTEMPTS = REGISTRY.counter(
+    "calm_structured_output_attempts_total",
+    "Structured output attempts per task, model and outcome: success, invalid, timeout or error.",
+    ("task", "model", "outcome"),
+)
+HEDGED_CALLS = REGISTRY.counter(
+    "calm_llm_hedged_calls_total",
+    "Structured output calls that sent a hedge request, per task, model and which request answered first.",
+    ("task", "model", "winner"),
+)
+
+
+class StructuredOutputError(RuntimeError):
+    """Raised when every attempt of a structured output call failed."""
+
+
+class StructuredOutput(NamedTuple):
+    """A valid structured response and the model that produced it, the fallback or hedge model included."""
+
+    value: Any
+    model: str
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Retry budget of a structured output call.
+
+    Args:
+        max_attempts: Attempts on the requested model.
+        timeout: [Optional] Seconds allowed per attempt, excluding the wait for a scheduler slot.
+        base_delay: Backoff before the second attempt, doubled for every further attempt.
+        max_delay: Upper bound of the backoff.
+        fallback_model: [Optional] Model tried once after the attempts on the requested model are spent.
+        hedge_quantile: [Optional] Latency quantile of the task and model after which a hedge request is sent, disabled when None.
+        hedge_model: [Optional] Model of the hedge request, defaults to the model of the attempt.
+        hedge_min_samples: Latency observations needed before calls of a task and model are hedged.
+
+    """
+
+    max_attempts: int = 3
+    timeout: float | None = 60.0
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    fallback_model: str | None = None
+    hedge_quantile: float | None = None
+    hedge_model: str | None = None
+    hedge_min_samples: int = 20
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        """Policy from the `CALM_STRUCTURED_*` environment variables."""
+        timeout = float(os.environ.get("CALM_STRUCTURED_TIMEOUT_SECONDS", "60"))
+        return cls(
+            max_attempts=int(os.environ.get("CALM_STRUCTURED_MAX_ATTEMPTS", "3")),
+            timeout=timeout if timeout > 0 else None,
+            base_delay=float(os.environ.get("CALM_STRUCTURED_BACKOFF_SECONDS", "0.5")),
+            max_delay=float(os.environ.get("CALM_STRUCTURED_MAX_BACKOFF_SECONDS", "8")),
+            fallback_model=os.environ.get("CALM_STRUCTURED_FALLBACK_MODEL") or None,
+            hedge_quantile=float(os.environ["CALM_HEDGE_QUANTILE"]) if os.environ.get("CALM_HEDGE_QUANTILE") else None,
+            hedge_model=os.environ.get("CALM_HEDGE_MODEL") or None,
+            hedge_min_samples=int(os.environ.get("CALM_HEDGE_MIN_SAMPLES", "20")),
+        )
+
+    def models(self, model: str) -> list[str]:
+        """Model of every attempt, in order."""
+        fallback = [self.fallback_model] if self.fallback_model and self.fallback_model != model else []
+        return [model] * max(self.max_attempts, 1) + fallback
+
+    def backoff(self, retry: int) -> float:
+        """Full jitter backoff before the given retry, 1 for the first retry."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (retry - 1)))  # noqa: S311
+
+
+@lru_cache(maxsize=1)
+def default_retry_policy() -> RetryPolicy:
+    """Retry policy of calls without an explicit one, read from the environment on first use."""
+    return RetryPolicy.from_env()
+
+
+def _record(task: str, model: str, attempt: int, outcome: str, detail: str) -> None:
+    STRUCTURED_ATTEMPTS.inc(task=task, model=model, outcome=outcome)
+    if outcome != "success":
+        logger.warning(f"Structured output | {task} | {model} | attempt {attempt} {outcome} | {detail}")
+
+
+async def _acall(
+    task: str,
+    chain: Runnable,
+    inputs: dict,
+    model: str,
+    priority: Priority,
+    timeout: float | None,
+    started: asyncio.Event | None = None,
+) -> Any:  # noqa: ANN401
+    """One LLM call within a scheduler slot, its latency is observed unless it was cancelled."""
+    async with llm_scheduler.slot(model, priority):
+        if started is not None:
+            started.set()
+        begin = time.perf_counter()
+        cancelled = False
+        try:
+            return await asyncio.wait_for(chain.ainvoke(inputs), timeout)
+        except asyncio.CancelledError:
+            # A call cancelled in favour of its hedge would record a truncated latency and drag the threshold down
+            cancelled = True
+            raise
+        finally:
+            if not cancelled:
+                LLM_LATENCY.observe(time.perf_counter() - begin, task=task, model=model)
+
+
+async def _acancel(tasks: list[asyncio.Task]) -> None:
+    """Cancel tasks and wait until they finished, so a losing request releases its slot before the caller moves on."""
+    for pending_task in tasks:
+        pending_task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _aanswered_within(call: asyncio.Task, started: asyncio.Event, threshold: float) -> bool:
+    """Whether the call finished within `threshold` seconds of getting its scheduler slot."""
+    # The hedge delay starts once the call holds a slot, waiting in the scheduler queue is not a stall
+    waiting = asyncio.create_task(started.wait())
+    try:
+        await asyncio.wait([call, waiting], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        await _acancel([waiting])
+    done, _ = await asyncio.wait([call], timeout=threshold)
+    return bool(done)
+
+
+async def _afirst_valid(
+    task: str,
+    model: str,
+    calls: list[tuple[asyncio.Task, str]],
+    is_valid: Callable[[Any], bool],
+) -> StructuredOutput:
+    """The first valid answer of the primary and hedge calls, an error or invalid answer waits for the other call."""
+    pending = {call for call, _ in calls}
+    fallback: StructuredOutput | None = None
+    error: BaseException | None = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for call, call_model in calls:
+            if call not in done:
+                continue
+            if call.exception() is not None:
+                error = error or call.exception()
+            elif is_valid(call.result()):
+                HEDGED_CALLS.inc(task=task, model=model, winner="primary" if call is calls[0][0] else "hedge")
+                return StructuredOutput(call.result(), call_model)
+            elif fallback is None:
+                fallback = StructuredOutput(call.result(), call_model)
+
+    HEDGED_CALLS.inc(task=task, model=model, winner="none")
+    if fallback is not None:
+        return fallback
+    raise error
+
+
+async def _ahedged(
+    task: str,
+    build_chain: Callable[[str], Runnable],
+    inputs: dict,
+    model: str,
+    is_valid: Callable[[Any], bool],
+    priority: Priority,
+    policy: RetryPolicy,
+) -> StructuredOutput:
+    """One attempt, hedged with a duplicate request once it is slower than the hedge quantile of its recent latency."""
+    threshold = None
+    if policy.hedge_quantile is not None:
+        threshold = LLM_LATENCY.quantile(policy.hedge_quantile, min_samples=policy.hedge_min_samples, task=task, model=model)
+    if threshold is None:
+        return StructuredOutput(await _acall(task, build_chain(model), inputs, model, priority, policy.timeout), model)
+
+    started = asyncio.Event()
+    calls = [(asyncio.create_task(_acall(task, build_chain(model), inputs, model, priority, policy.timeout, started)), model)]
+    try:
+        if await _aanswered_within(calls[0][0], started, threshold):
+            return StructuredOutput(calls[0][0].result(), model)
+
+        hedge_model = policy.hedge_model or model
+        logger.info(f"Hedging | {task} | {model} | no answer after {threshold:.2f}s | duplicate sent to {hedge_model}")
+        calls.append((asyncio.create_task(_acall(task, build_chain(hedge_model), inputs, hedge_model, priority, policy.timeout)), hedge_model))
+        return await _afirst_valid(task, model, calls, is_valid)
+    finally:
+        await _acancel([call for call, _ in calls])
+
+
+async def ainvoke_structured(
+    task: str,
+    build_chain: Callable[[str], Runnable],
+    inputs: dict,
+    model: str,
+    is_valid: Callable[[Any], bool],
+    priority: Priority,
+    policy: RetryPolicy | None = None,
+) -> StructuredOutput:
+    """Invoke a structured output chain within a retry budget.
+
+    Args:
+        task: Name of the task, used in metrics and logs.
+        build_chain: Builds the chain for a model name.
+        inputs: The prompt inputs.
+        model: The requested model.
+        is_valid: Whether a response has the expected structure, invalid responses are retried.
+        priority: Scheduling priority of the calls.
+        policy: [Optional] Retry policy, defaults to `default_retry_policy()`.
+
+    Returns:
+        StructuredOutput: The first valid response and the model that answered, callers caching the
+        response should only do so when it is the requested model.
+
+    Raises:
+        StructuredOutputError: If no attempt produced a valid response.
+
+    """
+    policy = policy or default_retry_policy()
+    models = policy.models(model)
+    last_error: BaseException | None = None
+
+    for attempt, attempt_model in enumerate(models, start=1):
+        if attempt > 1 and attempt_model == models[attempt - 2]:
+            await asyncio.sleep(policy.backoff(attempt - 1))
+
+        try:
+            output = await _ahedged(task, build_chain, inputs, attempt_model, is_valid, priority, policy)
+        except asyncio.TimeoutError as e:
+            last_error = e
+            _record(task, attempt_model, attempt, "timeout", f"no response within {policy.timeout}s")
+            continue
+        except Exception as e:
+            last_error = e
+            _record(task, attempt_model, attempt, "error", str(e))
+            continue
+
+        # Outcomes are counted against the model that answered, a hedge win is not a success of the primary model
+        if is_valid(output.value):
+            _record(task, output.model, attempt, "success", "")
+            return output
+        last_error = StructuredOutputError(f"Invalid response type: {type(output.value)}")
+        _record(task, output.model, attempt, "invalid", str(last_error))
+
+    raise StructuredOutputError(f"{task} failed after {len(models)} attempts") from last_error
+
+
+def invoke_structured(
+    task: str,
+    build_chain: Callable[[str], Runnable],
+    inputs: dict,
+    model: str,
+    is_valid: Callable[[Any], bool],
+    policy: RetryPolicy | None = None,
+) -> StructuredOutput:
+    """Synchronous version of ainvoke_structured, a blocking call can not be interrupted so attempts have no timeout.
+
+    Args:
+        task: Name of the task, used in metrics and logs.
+        build_chain: Builds the chain for a model name.
+        inputs: The prompt inputs.
+        model: The requested model.
+        is_valid: Whether a response has the expected structure, invalid responses are retried.
+        policy: [Optional] Retry policy, defaults to `default_retry_policy()`.
+
+    Returns:
+        StructuredOutput: The first valid response and the model that answered.
+
+    Raises:
+        StructuredOutputError: If no attempt produced a valid response.
+
+    """
+    policy = policy or default_retry_policy()
+    models = policy.models(model)
+    last_error: BaseException | None = None
+
+    for attempt, attempt_model in enumerate(models, start=1):
+        if attempt > 1 and attempt_model == models[attempt - 2]:
+            time.sleep(policy.backoff(attempt - 1))
+
+        try:
+            with LLM_LATENCY.time(task=task, model=attempt_model):
+                res = build_chain(attempt_model).invoke(inputs)
+        except Exception as e:
+            last_error = e
+            _record(task, attempt_model, attempt, "error", str(e))
+            continue
+
+        if is_valid(res):
+            _record(task, attempt_model, attempt, "success", "")
+            return StructuredOutput(res, attempt_model)
+        last_error = StructuredOutputError(f"Invalid response type: {type(res)}")
+        _record(task, attempt_model, attempt, "invalid", str(last_error))
+
+    raise StructuredOutputError(f"{task} failed after {len(models)} attempts") from last_error
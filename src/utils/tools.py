@@ -1,29 +1,299 @@
+import hashlib
 import os
+import threading
+from collections.abc import Collection
+from typing import TYPE_CHECKING
 
+from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
-from langchain_postgres import PGVector
 
+from utils.metrics import REGISTRY
 from utils.Models import get_nomic_embedding
 
+if TYPE_CHECKING:
+    from langchain_postgres import PGVector
+    from sqlalchemy import Engine
+    from sqlalchemy.ext.asyncio import AsyncEngine
 
-def get_connection(connection: str, embedding_model: Embeddings, collection_name: str) -> PGVector:
+# PGVector and SQLAlchemy are imported on first use of a database, the local vector store backend never loads them
+
+# Process-wide engines, one per connection string, shared by every VectorStore and collection
+_engines: dict[str, "Engine"] = {}
+_async_engines: dict[str, "AsyncEngine"] = {}
+_engines_lock = threading.Lock()
+
+
+def _pool_settings() -> dict:
+    """Connection pool settings, configurable through `PGVECTOR_POOL_*` environment variables."""
+    return {
+        "pool_size": int(os.environ.get("PGVECTOR_POOL_SIZE", "5")),
+        "max_overflow": int(os.environ.get("PGVECTOR_POOL_MAX_OVERFLOW", "10")),
+        "pool_timeout": float(os.environ.get("PGVECTOR_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.environ.get("PGVECTOR_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": os.environ.get("PGVECTOR_POOL_PRE_PING", "true").lower() != "false",
+    }
+
+
+def get_engine(connection: str) -> "Engine":
+    """Get the shared, pooled engine of a connection string.
+
+    Args:
+        connection: The connection string of the database.
+
+    Returns:
+        Engine: The engine, created on first use.
+
+    """
+    from sqlalchemy import create_engine
+
+    with _engines_lock:
+        if connection not in _engines:
+            _engines[connection] = create_engine(connection, **_pool_settings())
+        return _engines[connection]
+
+
+def get_async_engine(connection: str) -> "AsyncEngine":
+    """Get the shared, pooled async engine of a connection string.
+
+    Args:
+        connection: The connection string of the database.
+
+    Returns:
+        AsyncEngine: The async engine, created on first use.
+
+    """
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    with _engines_lock:
+        if connection not in _async_engines:
+            _async_engines[connection] = create_async_engine(connection, **_pool_settings())
+        return _async_engines[connection]
+
+
+async def dispose_engines() -> None:
+    """Close all pooled connections of the shared engines."""
+    with _engines_lock:
+        engines, async_engines = list(_engines.values()), list(_async_engines.values())
+        _engines.clear()
+        _async_engines.clear()
+    for engine in engines:
+        engine.dispose()
+    for engine in async_engines:
+        await engine.dispose()
+
+
+def _pool_utilization() -> dict[tuple[str, ...], float]:
+    with _engines_lock:
+        pools = [("sync", engine) for engine in _engines.values()] + [("async", engine.sync_engine) for engine in _async_engines.values()]
+    utilization = {}
+    for mode, engine in pools:
+        database = engine.url.render_as_string(hide_password=True)
+        pool = engine.pool
+        utilization.update({
+            (database, mode, "size"): pool.size(),
+            (database, mode, "checked_out"): pool.checkedout(),
+            (database, mode, "checked_in"): pool.checkedin(),
+            (database, mode, "overflow"): pool.overflow(),
+        })
+    return utilization
+
+
+REGISTRY.gauge(
+    "calm_db_pool_connections",
+    "Connection pool utilization of the shared database engines.",
+    ("database", "mode", "stat"),
+    callback=_pool_utilization,
+)
+
+
+def get_connection(connection: str, embedding_model: Embeddings, collection_name: str, *, async_mode: bool = False) -> "PGVector":
     """Get the PGVector connection.
 
     Args:
         connection: The connection string for the vector store.
         embedding_model: The embedding model to use.
         collection_name: The name of the collection to use.
+        async_mode: Whether to back the connection with an async engine, only the `a*` methods are usable then.
 
     Returns:
-        PGVector: The vector store connection.
+        PGVector: The vector store connection, backed by the shared engine of the connection string.
 
     """
+    from langchain_postgres import PGVector
+
     if not connection:
         connection = os.environ.get("PGVECTOR_CONN")
     if not embedding_model:
         embedding_model = get_nomic_embedding()
     return PGVector(
         embeddings=embedding_model,
-        connection=connection,
+        connection=get_async_engine(connection) if async_mode else get_engine(connection),
         collection_name=collection_name,
+        async_mode=async_mode,
     )
+
+
+def document_id(document: Document) -> str:
+    """Get a stable id of a document.
+
+    Uses the vector store id when the document was retrieved from a vector store, otherwise a hash of its source and content.
+
+    Args:
+        document: The document to identify.
+
+    Returns:
+        str: The document id.
+
+    """
+    if document.id:
+        return str(document.id)
+    source = document.metadata.get("url", "") or document.metadata.get("source", "")
+    return hashlib.sha256(f"{source}\n{document.page_content}".encode()).hexdigest()
+
+
+def exclude_documents(scored_docs: list[tuple[Document, float]], exclude_ids: Collection[str], k: int) -> list[tuple[Document, float]]:
+    """Drop documents whose id is in `exclude_ids` and keep the first `k` of the rest.
+
+    Args:
+        scored_docs: Documents with their similarity scores, ordered by relevance.
+        exclude_ids: Ids of documents to drop.
+        k: The number of documents to keep.
+
+    Returns:
+        list[tuple[Document, float]]: The remaining documents with their scores.
+
+    """
+    return [(doc, score) for doc, score in scored_docs if document_id(doc) not in exclude_ids][:k]
+
+
+def reciprocal_rank_fusion(rankings: list[list[tuple[Document, float]]], k: int, rrf_k: int = 60) -> list[tuple[Document, float]]:
+    """Merge several rankings of scored documents with reciprocal rank fusion.
+
+    Each document gets the sum of `1 / (rrf_k + rank)` over the rankings it appears in, so documents found by
+    several retrievers rise to the top while the raw scores of different retrievers never need to be comparable.
+
+    Args:
+        rankings: Rankings of documents with their scores, best first.
+        k: The number of documents to keep.
+        rrf_k: Rank offset damping the weight of the top ranks, 60 is the value from the original paper.
+
+    Returns:
+        list[tuple[Document, float]]: The fused ranking with the score each document had in the first ranking it appears in.
+
+    """
+    fused: dict[str, float] = {}
+    scored: dict[str, tuple[Document, float]] = {}
+    for ranking in rankings:
+        for rank, (doc, score) in enumerate(ranking, start=1):
+            doc_id = document_id(doc)
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+            scored.setdefault(doc_id, (doc, score))
+    return [scored[doc_id] for doc_id in sorted(fused, key=fused.__getitem__, reverse=True)[:k]]
+
+
+def source_domain(metadata: dict) -> str:
+    """Get the domain of the source URL of a document, `Unknown` when the source is not a URL.
+
+    Args:
+        metadata: The document metadata holding the source URL under `source` or `url`.
+
+    Returns:
+        str: The domain, e.g. www.nia.nih.gov.
+
+    """
+    split_url = (metadata.get("source") or metadata.get("url") or "").split("/")
+    if len(split_url) < 3 or not split_url[2]:
+        return "Unknown"
+    return split_url[2]
+
+
+def document_stats(documents: list[Document], embeddings: list[list[float]]) -> dict[str, dict[str, int]]:
+    """Count documents and their size in bytes per source domain.
+
+    Args:
+        documents: The documents to count.
+        embeddings: Embedding of each document, stored as 4 byte floats.
+
+    Returns:
+        dict[str, dict[str, int]]: `documents`, `content_bytes` and `embedding_bytes` by source domain.
+
+    """
+    stats: dict[str, dict[str, int]] = {}
+    for doc, embedding in zip(documents, embeddings):
+        domain = stats.setdefault(source_domain(doc.metadata), {"documents": 0, "content_bytes": 0, "embedding_bytes": 0})
+        domain["documents"] += 1
+        domain["content_bytes"] += len(doc.page_content.encode("utf-8"))
+        domain["embedding_bytes"] += 4 * len(embedding)
+    return stats
+
+
+def summarize_stats(collection_name: str, domains: dict[str, dict[str, int]]) -> dict:
+    """Build the collection statistics reported by the vector stores from the per-domain counters.
+
+    Args:
+        collection_name: The name of the collection.
+        domains: `documents`, `content_bytes` and `embedding_bytes` by source domain.
+
+    Returns:
+        dict: Collection totals plus the document count per source domain, largest first.
+
+    """
+    return {
+        "collection": collection_name,
+        "documents": sum(domain["documents"] for domain in domains.values()),
+        "content_bytes": sum(domain["content_bytes"] for domain in domains.values()),
+        "embedding_bytes": sum(domain["embedding_bytes"] for domain in domains.values()),
+        "sources": dict(sorted(((name, domain["documents"]) for name, domain in domains.items() if domain["documents"]), key=lambda x: -x[1])),
+    }
+
+
+def diversify_by_source(scored_docs: list[tuple[Document, float]], k: int) -> list[tuple[Document, float]]:
+    """Keep the best scored document of every source URL, up to `k` documents.
+
+    Args:
+        scored_docs: Documents with their scores, ordered by relevance.
+        k: The number of documents to keep.
+
+    Returns:
+        list[tuple[Document, float]]: At most one document per source, in the original order.
+
+    """
+    seen: set[str] = set()
+    diverse = []
+    for doc, score in scored_docs:
+        # Documents without a source can not be duplicates of each other
+        source = doc.metadata.get("source") or doc.metadata.get("url") or document_id(doc)
+        if source in seen:
+            continue
+        seen.add(source)
+        diverse.append((doc, score))
+        if len(diverse) == k:
+            break
+    return diverse
+
+
+def merge_weighted_results(rankings: list[tuple[list[tuple[Document, float]], float]], k: int) -> list[tuple[Document, float]]:
+    """Merge scored results of several knowledge bases into one ranking.
+
+    Every knowledge base is embedded with the same model and reports cosine similarity, so raw scores are already
+    comparable and are multiplied by the weight of the knowledge base as they are. Normalizing per knowledge base
+    would stretch a weak result list to the same range as a strong one, putting its best match on par with a far
+    closer document of the other knowledge base. Negative similarities are clamped to 0 before weighting, a weight
+    below 1 would otherwise raise them above unweighted ones. A document found more than once keeps its best weighted score.
+
+    Args:
+        rankings: Results of each knowledge base, documents with their cosine similarity, along with the weight of the knowledge base.
+        k: The number of documents to keep.
+
+    Returns:
+        list[tuple[Document, float]]: The merged ranking with the original score of each document.
+
+    """
+    merged: dict[str, tuple[float, Document, float]] = {}
+    for results, weight in rankings:
+        for doc, score in results:
+            weighted = weight * max(score, 0.0)
+            doc_id = document_id(doc)
+            if doc_id not in merged or weighted > merged[doc_id][0]:
+                merged[doc_id] = (weighted, doc, score)
+    return [(doc, score) for _, doc, score in sorted(merged.values(), key=lambda x: x[0], reverse=True)[:k]]